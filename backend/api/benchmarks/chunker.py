@@ -0,0 +1,196 @@
+"""
+Benchmark of the native chunker against the former llama_index SentenceSplitter path.
+
+The legacy path needs llama-index-core, which is no longer a dependency of
+the API, so install it to run this benchmark. Both chunkers run over a
+synthetic golden corpus, the native one configured equivalently (same
+tokenizer, sentence splitter and metadata-reduced chunk size) so that their
+outputs can be compared chunk by chunk.
+
+Usage:
+    python -m api.benchmarks.chunker --documents 200 --output chunker-benchmark.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import List
+
+from api.benchmarks.pipeline import _VOCABULARY, _git_commit
+from api.core.settings import WatsonSettings
+from api.models.internal import PDFConversionResult
+from api.worker.chunker import Chunker
+
+_ABBREVIATED = ["e.g. ", "et al. ", "Fig. ", "vs. ", "i.e. "]
+
+
+def build_golden_corpus(documents: int, seed: int = 0) -> List[PDFConversionResult]:
+    """Build markdown papers with front matter, sections, long sentences and references."""
+    rng = random.Random(seed)
+
+    def sentence(words: int) -> str:
+        text = " ".join(rng.choices(_VOCABULARY, k=words))
+        if rng.random() < 0.3:
+            position = rng.randrange(len(text))
+            text = text[:position] + rng.choice(_ABBREVIATED) + text[position:]
+        if rng.random() < 0.3:
+            text = text.replace(" ", ", ", 3)
+        return text[0].upper() + text[1:] + rng.choice([".", ".", "?", "!"])
+
+    corpus = []
+    for index in range(documents):
+        parts = [f"# Paper {index}\n\nAuthors\n\n**Keywords**: lipids; HDL\n"]
+        for section in range(rng.randint(2, 8)):
+            parts.append(f"## Section {section}\n")
+            for _ in range(rng.randint(1, 6)):
+                paragraph = " ".join(
+                    sentence(rng.choice([8, 20, 40, 700]))
+                    for _ in range(rng.randint(1, 12))
+                )
+                parts.append(paragraph + "\n\n\t")
+        parts.append("## References\n\n1. Doe J. et al. Lipids. 2020.\n")
+        corpus.append(
+            PDFConversionResult(
+                file_name=f"paper-{index}.pdf", content="\n".join(parts)
+            )
+        )
+    return corpus
+
+
+def legacy_chunks(documents: List[PDFConversionResult]) -> List[List[str]]:
+    """Chunk the documents exactly like the former llama_index based chunker."""
+    from llama_index.core import Document
+    from llama_index.core.node_parser import SentenceSplitter
+
+    splitter = SentenceSplitter(
+        chunk_size=WatsonSettings.chunk_size,
+        chunk_overlap=WatsonSettings.chunk_overlap,
+        paragraph_separator="## ",
+    )
+    text = []
+    for doc in documents:
+        content = doc.content
+        if "## references" in content.lower():
+            content = content[: content.lower().rindex("references")]
+        if "keywords" in content.lower():
+            content = content[content.lower().index("keywords") :]
+        content = content.replace("\n", " ").replace("\t", " ").replace("\r", " ")
+        text.append(" ".join(content.split()))
+    nodes = splitter.get_nodes_from_documents(
+        [
+            Document(text=t, metadata={"file_name": doc.file_name})
+            for t, doc in zip(text, documents)
+        ]
+    )
+    chunks = {doc.file_name: [] for doc in documents}
+    for node in nodes:
+        chunks[node.metadata["file_name"]].append(node.get_content())
+    return list(chunks.values())
+
+
+def equivalent_chunks(documents: List[PDFConversionResult]) -> List[List[str]]:
+    """Chunk with the native chunker configured like SentenceSplitter."""
+    from llama_index.core import Document
+    from llama_index.core.node_parser.text.utils import split_by_sentence_tokenizer
+    from llama_index.core.schema import MetadataMode
+    from llama_index.core.utils import get_tokenizer
+
+    tokenizer = get_tokenizer()
+    chunker = Chunker(
+        "benchmark",
+        count_tokens=lambda texts: [len(tokenizer(text)) for text in texts],
+        sentence_splitter=split_by_sentence_tokenizer(),
+    )
+    results = []
+    for doc in documents:
+        # SentenceSplitter reserves room for the metadata in every chunk.
+        metadata = Document(
+            text="", metadata={"file_name": doc.file_name}
+        ).get_metadata_str(mode=MetadataMode.LLM)
+        chunk_size = chunker.chunk_size - len(tokenizer(metadata))
+        results.append(
+            list(chunker.iter_chunks(chunker.normalize(doc.content), chunk_size))
+        )
+    return results
+
+
+def _import_seconds(module: str) -> float:
+    """Time a cold import of a module in a fresh interpreter."""
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - start)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return float(output.stdout.strip())
+
+
+def _time(run, repeat: int):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--model-tokenizer",
+        action="store_true",
+        help="Also time the native chunker with the tokenizer of WatsonSettings.llm_model",
+    )
+    parser.add_argument("--output", default="chunker-benchmark.json")
+    args = parser.parse_args()
+
+    corpus = build_golden_corpus(args.documents)
+    legacy_seconds, legacy = _time(lambda: legacy_chunks(corpus), args.repeat)
+    native_seconds, native = _time(lambda: equivalent_chunks(corpus), args.repeat)
+    matching = sum(a == b for a, b in zip(legacy, native))
+    print(f"Golden corpus: {matching}/{len(corpus)} documents chunked identically")
+    print(f"Legacy chunker:  {legacy_seconds * 1000:10.2f} ms")
+    print(f"Native chunker:  {native_seconds * 1000:10.2f} ms")
+
+    results = {
+        "documents": len(corpus),
+        "chunks": sum(len(chunks) for chunks in legacy),
+        "matching_documents": matching,
+        "legacy_seconds": legacy_seconds,
+        "native_seconds": native_seconds,
+        "legacy_import_seconds": _import_seconds("llama_index.core.node_parser"),
+        "native_import_seconds": _import_seconds("api.worker.chunker"),
+    }
+    if args.model_tokenizer:
+        chunker = Chunker("benchmark")
+        results["native_model_tokenizer_seconds"], _ = _time(
+            lambda: chunker.chunk_documents(corpus), args.repeat
+        )
+    print(
+        f"Import time: legacy {results['legacy_import_seconds'] * 1000:.0f} ms, "
+        f"native {results['native_import_seconds'] * 1000:.0f} ms"
+    )
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
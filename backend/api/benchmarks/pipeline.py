@@ -0,0 +1,325 @@
+"""
+Offline benchmark of the non-model overhead of the worker pipeline.
+
+Every stage runs against the deterministic stub inference backend, so no GPU
+or model download is needed. Results are written as JSON so that runs from
+different commits can be compared.
+
+Usage:
+    python -m api.benchmarks.pipeline --sizes 10 100 1000 10000 --output benchmark.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+from api.core.settings import TaskStage, WatsonSettings
+from api.models.internal import Chunk, ChunkingResult, make_chunk_id
+from api.worker.chunk_summarizer import ChunkSummarizer
+from api.worker.embeddings import EmbeddingsWorker
+from api.worker.evidence_finder import EvidenceFinder
+from api.worker.inference import ModelRole, StubBackend
+from api.worker.metrics import record_stage
+from api.worker.pn_generator import PNGenerator
+
+CHUNKS_PER_FILE = 50
+WORDS_PER_CHUNK = 350
+# vLLM caches prefixes in whole KV cache blocks of this many tokens.
+KV_BLOCK_SIZE = 16
+_VOCABULARY = (
+    "cholesterol HDL LDL macrophage ABCA1 efflux oxidation plaque artery endothelial "
+    "inflammation cytokine receptor binding uptake expression protein kinase signaling "
+    "increased decreased reduced induced inhibited mediated associated observed mice "
+    "patients cells levels activity pathway lipid transport apoptosis foam formation"
+).split()
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def build_corpus(size: int, seed: int = 0) -> List[ChunkingResult]:
+    """Build a synthetic chunked corpus of the given number of chunks."""
+    rng = random.Random(seed)
+    results = []
+    for start in range(0, size, CHUNKS_PER_FILE):
+        chunks = []
+        for index in range(start, min(start + CHUNKS_PER_FILE, size)):
+            text = " ".join(rng.choices(_VOCABULARY, k=WORDS_PER_CHUNK)) + "."
+            chunk_id = make_chunk_id("benchmark", str(seed), "synthetic", index, text)
+            chunks.append(Chunk(id=chunk_id, text=text))
+        results.append(
+            ChunkingResult(
+                file_name=f"paper-{start // CHUNKS_PER_FILE}.pdf", chunks=chunks
+            )
+        )
+    return results
+
+
+def _time(step: Callable[[], object], repeat: int) -> tuple[list[float], object]:
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = step()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def prefill_savings(
+    prompts: List[str], group_sizes: List[int], count_tokens: Callable[[str], int]
+) -> dict:
+    """
+    Estimate the prompt tokens an engine with prefix caching does not prefill.
+
+    Every prompt after the first of a group reuses the full KV cache blocks of
+    the prefix it shares with the first one.
+    """
+    prompt_tokens = 0
+    saved_tokens = 0
+    start = 0
+    for size in group_sizes:
+        group = prompts[start : start + size]
+        start += size
+        prompt_tokens += sum(count_tokens(prompt) for prompt in group)
+        shared = count_tokens(os.path.commonprefix(group)) if size > 1 else 0
+        saved_tokens += (size - 1) * (shared // KV_BLOCK_SIZE * KV_BLOCK_SIZE)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "prefill_tokens_saved": saved_tokens,
+        "prefill_saved_share": saved_tokens / prompt_tokens if prompt_tokens else 0.0,
+    }
+
+
+class PipelineBenchmark:
+    def __init__(self, repeat: int, postgres: bool):
+        self.repeat = repeat
+        self.postgres = postgres
+        self.results: List[dict] = []
+        self.pn_generator = PNGenerator(
+            "benchmark",
+            backend=StubBackend(
+                WatsonSettings.llm_model, ModelRole.relation_extraction
+            ),
+        )
+        self.evidence_finder = EvidenceFinder(
+            "benchmark",
+            backend=StubBackend(WatsonSettings.be_model, ModelRole.evidence),
+        )
+        self.batched_evidence_finder = EvidenceFinder(
+            "benchmark",
+            backend=StubBackend(WatsonSettings.be_model, ModelRole.evidence),
+            mode="batched",
+        )
+        self.summarizer = ChunkSummarizer(
+            "benchmark",
+            backend=StubBackend(WatsonSettings.cs_model, ModelRole.summarization),
+        )
+        self.embeddings_worker = EmbeddingsWorker(
+            "benchmark",
+            backend=StubBackend(WatsonSettings.embedding_model, ModelRole.embedding),
+        )
+
+    def _measure(self, size: int, step: str, items: int, run: Callable[[], object]):
+        timings, result = _time(run, self.repeat)
+        self.results.append(
+            {
+                "size": size,
+                "step": step,
+                "items": items,
+                "min_seconds": min(timings),
+                "mean_seconds": statistics.mean(timings),
+                "per_item_us": min(timings) / max(items, 1) * 1e6,
+            }
+        )
+        print(f"{size:>6} chunks  {step:<32} {min(timings) * 1000:10.2f} ms")
+        return result
+
+    def run_size(self, size: int) -> None:
+        nodes = self._measure(
+            size, "dataclass_construction", size, lambda: build_corpus(size)
+        )
+
+        prompts = self._measure(
+            size,
+            "pn_prompt_templating",
+            size,
+            lambda: self.pn_generator._prepare_prompts(nodes),
+        )
+        responses = self.pn_generator._run_llm(prompts)
+        pn_results = self._measure(
+            size,
+            "pn_response_parsing",
+            len(responses),
+            lambda: self.pn_generator._format_relations(responses, nodes),
+        )
+        relation_count = sum(
+            len(chunk.relations or [])
+            for node in pn_results
+            for chunk in node.annotated_chunks
+        )
+
+        evidence_prompts = self._measure(
+            size,
+            "evidence_prompt_templating",
+            relation_count,
+            lambda: self.evidence_finder._prepare_prompts(pn_results),
+        )
+        group_sizes = self.evidence_finder._group_sizes(pn_results)
+        savings = prefill_savings(
+            evidence_prompts, group_sizes, self.evidence_finder.backend.count_tokens
+        )
+        self.results.append({"size": size, "step": "evidence_prefix_cache", **savings})
+        print(
+            f"{size:>6} chunks  {'evidence_prefill_tokens_saved':<32} "
+            f"{savings['prefill_tokens_saved']:>10} "
+            f"({savings['prefill_saved_share']:.0%} of {savings['prompt_tokens']})"
+        )
+        evidence_responses = self.evidence_finder._run_inference(
+            evidence_prompts, group_sizes
+        )
+        evidence_results = self._measure(
+            size,
+            "evidence_response_matching",
+            relation_count,
+            lambda: self.evidence_finder._match_responses_to_relations(
+                pn_results, evidence_responses
+            ),
+        )
+
+        for finder in (self.evidence_finder, self.batched_evidence_finder):
+            self._compare_evidence_mode(size, finder, pn_results)
+
+        summary_prompts = self._measure(
+            size,
+            "summary_prompt_templating",
+            size,
+            lambda: self.summarizer._prepare_prompts(evidence_results),
+        )
+        summaries = self.summarizer._run_inference(summary_prompts)
+        self._measure(
+            size,
+            "summary_response_matching",
+            len(summaries),
+            lambda: self.summarizer._match_responses_to_chunks(
+                evidence_results, summaries
+            ),
+        )
+
+        relation_texts = self._measure(
+            size,
+            "embedding_text_extraction",
+            relation_count,
+            lambda: self.embeddings_worker._extract_relations(evidence_results),
+        )
+        embeddings = self.embeddings_worker._run_embedding(relation_texts)
+        self._measure(
+            size,
+            "embedding_matching",
+            relation_count,
+            lambda: self.embeddings_worker._match_embeddings_to_relations(
+                evidence_results, embeddings
+            ),
+        )
+
+        if self.postgres:
+            self._measure(
+                size,
+                "save_task_results",
+                relation_count,
+                lambda: _save_results_roundtrip(evidence_results),
+            )
+
+    def _compare_evidence_mode(
+        self, size: int, finder: EvidenceFinder, pn_results: list
+    ) -> None:
+        """Record the stub engine usage of a whole evidence stage in one mode."""
+        with record_stage(TaskStage.evidence_finding) as metrics:
+            finder.find_evidence(pn_results)
+        self.results.append(
+            {
+                "size": size,
+                "step": f"evidence_mode_{finder.mode}",
+                "prompts": metrics.prompts,
+                "prompt_tokens": metrics.prompt_tokens,
+                "completion_tokens": metrics.completion_tokens,
+                "seconds": metrics.wall_seconds,
+            }
+        )
+        print(
+            f"{size:>6} chunks  {'evidence_mode_' + finder.mode:<32} "
+            f"{metrics.wall_seconds * 1000:10.2f} ms, {metrics.prompts} prompts, "
+            f"{metrics.prompt_tokens} prompt tokens"
+        )
+
+
+def _save_results_roundtrip(results: list) -> None:
+    """Persist results under a throwaway task and delete it again."""
+    from api.database import models
+    from api.database.session import SessionLocal, init_db
+    from api.services.postgres_service import create_task, save_task_results
+
+    init_db()
+    task_id = f"benchmark-{uuid.uuid4()}"
+    create_task(
+        task_id,
+        {
+            "name": "benchmark",
+            "description": "pipeline benchmark",
+            "status": "completed",
+            "files": [
+                {"storage_path": f"{task_id}/{result.file_name}"} for result in results
+            ],
+        },
+    )
+    try:
+        save_task_results(task_id, results)
+    finally:
+        with SessionLocal() as db:
+            with db.begin():
+                db.delete(db.get(models.Task, task_id))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--postgres",
+        action="store_true",
+        help="Also benchmark save_task_results against the configured database",
+    )
+    parser.add_argument("--output", default="benchmark.json")
+    args = parser.parse_args()
+
+    benchmark = PipelineBenchmark(repeat=args.repeat, postgres=args.postgres)
+    for size in args.sizes:
+        benchmark.run_size(size)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+        "results": benchmark.results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
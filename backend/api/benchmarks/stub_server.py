@@ -0,0 +1,126 @@
+"""
+OpenAI-compatible HTTP server answering with the deterministic stub backend.
+
+Start one or more replicas and point the remote inference backend at them to
+exercise load balancing and retries without a GPU. Every replica answers
+the completions of one model role and embeddings; failing replicas can be
+simulated with --fail-every.
+
+Usage:
+    python -m api.benchmarks.stub_server --port 8101 --role relation_extraction
+    INFERENCE_BACKEND=remote REMOTE_ENDPOINTS='["http://localhost:8101/v1"]' ...
+"""
+
+import argparse
+import itertools
+from typing import List, Optional, Union
+
+from api.worker.inference import GenerationParams, ModelRole, StubBackend
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+
+class CompletionRequest(BaseModel):
+    model: str
+    prompt: Union[str, List[str]]
+    temperature: float = 0.0
+    max_tokens: int = 16
+    stop: Optional[Union[str, List[str]]] = None
+    seed: Optional[int] = None
+    structured_outputs: Optional[dict] = None
+
+
+class EmbeddingRequest(BaseModel):
+    model: str
+    input: Union[str, List[str]]
+
+
+def create_app(role: ModelRole, fail_every: int = 0) -> FastAPI:
+    """Build the server app; with fail_every, every n-th request fails with a 503."""
+    app = FastAPI()
+    backend = StubBackend("stub", role)
+    embedder = StubBackend("stub", ModelRole.embedding)
+    requests = itertools.count(1)
+    app.state.requests = 0
+
+    def count_request() -> None:
+        app.state.requests = next(requests)
+        if fail_every and app.state.requests % fail_every == 0:
+            raise HTTPException(status_code=503, detail="Simulated replica failure")
+
+    @app.get("/v1/models")
+    def models():
+        return {"object": "list", "data": [{"id": backend.model, "object": "model"}]}
+
+    @app.post("/v1/completions")
+    def completions(request: CompletionRequest):
+        count_request()
+        prompts = (
+            [request.prompt] if isinstance(request.prompt, str) else request.prompt
+        )
+        stop = [request.stop] if isinstance(request.stop, str) else request.stop
+        params = GenerationParams(
+            temperature=request.temperature,
+            max_tokens=request.max_tokens,
+            stop=tuple(stop or ()),
+            json_schema=(request.structured_outputs or {}).get("json"),
+            seed=request.seed,
+        )
+        outputs = backend.generate(prompts, params)
+        return {
+            "id": f"cmpl-{app.state.requests}",
+            "object": "text_completion",
+            "model": request.model,
+            "choices": [
+                {"index": i, "text": o.text, "finish_reason": o.finish_reason}
+                for i, o in enumerate(outputs)
+            ],
+            "usage": {
+                "prompt_tokens": sum(o.prompt_tokens for o in outputs),
+                "completion_tokens": sum(o.completion_tokens for o in outputs),
+                "total_tokens": sum(
+                    o.prompt_tokens + o.completion_tokens for o in outputs
+                ),
+            },
+        }
+
+    @app.post("/v1/embeddings")
+    def embeddings(request: EmbeddingRequest):
+        count_request()
+        texts = [request.input] if isinstance(request.input, str) else request.input
+        vectors = embedder.embed(texts)
+        tokens = sum(embedder.count_tokens(text) for text in texts)
+        return {
+            "object": "list",
+            "model": request.model,
+            "data": [
+                {"object": "embedding", "index": i, "embedding": vector}
+                for i, vector in enumerate(vectors)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument(
+        "--role",
+        choices=[role.value for role in ModelRole],
+        default=ModelRole.relation_extraction.value,
+    )
+    parser.add_argument("--fail-every", type=int, default=0)
+    args = parser.parse_args()
+
+    app = create_app(ModelRole(args.role), args.fail_every)
+    print(f"Stub {args.role} server listening on http://{args.host}:{args.port}/v1")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,14 +13,78 @@ class WatsonSettings(BaseSettings):
     temperature: float = 0.6
     max_tokens: int = 8096
     tensor_parallel_size: int = 1
-    gpu_memory_utilization: float = 0.7
+    # Fits the pool budget with the be, cs and embedding engines.
+    gpu_memory_utilization: float = 0.5
     max_model_len: int = 10000
+    pn_length_scheduling: bool = True
+    pn_min_max_tokens: int = 2048  # Smallest per-prompt output budget
+    pn_max_tokens_per_prompt_token: float = 8.0
+    pn_truncation_retries: int = 1
+    pn_retry_rounds: int = 2  # Regeneration rounds for unparsable responses
+    pn_retry_seed: int = 0
+    pn_retry_temperature: float = 0.0  # Greedy regeneration of failed responses
+    pn_max_extra_generations: int = 2  # Resubmissions plus retries per prompt
+    reasoning_mode: str = "full"  # Default ReasoningMode of new tasks
+    reasoning_budget_tokens: int = 1024  # Thinking cap in the "budget" mode
+    reasoning_answer_tokens: int = 1024  # Answer budget after a capped trace
+    pn_output_format: str = "text"  # "text" blocks or schema-guided "json"
     embedding_model: str = Field(..., alias="EMBEDDING_MODEL")
     vllm_container: str = Field(..., alias="VLLM_CONTAINER_NAME")
     vllm_port: int = Field(..., alias="VLLM_PORT")
     embedding_dim: int = 1024
     be_model: str = "daisd-ai/be-0.6B"
     cs_model: str = "Qwen/Qwen3-4B-Instruct-2507"
+    be_gpu_memory_utilization: float = 0.08
+    cs_gpu_memory_utilization: float = 0.18
+    embedding_gpu_memory_utilization: float = 0.08
+    be_enable_prefix_caching: bool = True
+    be_mode: str = "single"  # One prompt per relation, or "batched" per chunk
+    be_tokens_per_relation: int = 128  # Output budget per relation when batched
+    be_lexical_enabled: bool = False  # Resolve clear-cut evidence with BM25 first
+    be_lexical_margin: float = 0.5  # Relative lead of the best sentence
+    be_lexical_min_coverage: float = 0.6  # Share of query IDF in the best sentence
+    be_evidence_format: str = "text"  # Copied text, or "sentence_index" answers
+    be_index_tokens: int = 8  # Output budget per sentence index answer
+    be_alignment_min_ratio: float = 0.6  # Similarity for fuzzy evidence spans
+    model_pool_enabled: bool = True
+    model_pool_memory_budget: float = 0.85
+    fused_evidence_summary: bool = False  # Run both stages at once, co-resident
+    fused_gpu_memory_utilization: float = 0.26  # Split by the stages' own shares
+    batch_max_tasks: int = 8
+    batch_max_prompts: int = 2048
+    batch_wait_seconds: float = 2.0
+    checkpoints_enabled: bool = True
+    pipeline_mode: str = "batched"  # "batched" or "staged"
+    inference_backend: str = "vllm"  # "vllm", "remote" or "stub"
+    remote_endpoints: list[str] = []  # OpenAI-compatible base URLs of the replicas
+    remote_role_endpoints: dict[str, list[str]] = {}  # Per model role overrides
+    remote_api_key: str = "not-needed"
+    remote_max_concurrency: int = 64  # Outstanding requests per replica
+    remote_max_attempts: int = 3
+    remote_timeout_seconds: float = 600.0
+    remote_embedding_batch_size: int = 64
+    pdf_conversion_workers: int = 1  # More than one converts files in a process pool
+    conversion_cache: str = "local"  # "local", "minio" or "none"
+    conversion_cache_dir: str = "/artifacts/conversion-cache"
+    conversion_cache_max_bytes: int = 2 * 1024**3
+    pdf_page_batch_size: int = 50  # Larger documents are converted in page ranges
+    conversion_profile: str = "full"  # "full", "no_ocr" or "text_layer"
+    text_layer_probe: bool = True  # Pick "text_layer" for PDFs with a text layer
+    text_layer_probe_pages: int = 3
+    text_layer_min_chars_per_page: int = 500
+    deduplication_enabled: bool = True  # LLM stages run once per duplicate cluster
+    dedup_similarity_threshold: float = 0.9  # Jaccard similarity of word shingles
+    dedup_num_perm: int = 128
+    dedup_bands: int = 32
+    dedup_shingle_size: int = 5
+    model_revisions: dict[str, str] = {}  # Model name -> Hugging Face revision
+    llm_cache_enabled: bool = True
+    llm_cache_bypass: list[str] = []  # Model roles that never use the cache
+    llm_cache_stochastic: bool = False  # Also cache sampling with temperature > 0
+    llm_cache_max_entries: int = 1_000_000
+    summary_cache_enabled: bool = True  # Reuse chunk summaries across tasks
+    summary_cache_max_entries: int = 1_000_000
+    summary_cache_max_age_days: int = 180  # Unused summaries are evicted after
 
     model_config = {
         "env_file": ".env",
@@ -37,14 +101,21 @@ class TaskStatus(str, Enum):
     failed = "failed"
 
 
+class ReasoningMode(str, Enum):
+    full = "full"  # Let the model reason up to max_tokens
+    budget = "budget"  # Cap the reasoning, then close it and finish the answer
+
+
 class TaskStage(str, Enum):
     converting_pdfs = "converting_pdfs"
     chunking_documents = "chunking_documents"
+    deduplicating_chunks = "deduplicating_chunks"
     pn_generation = "pn_generation"
     entity_linking = "entity_linking"
     evidence_finding = "evidence_finding"
     summarization = "summarization"
     embedding = "embedding"
+    persisting = "persisting"
 
 
 class CelerySettings(BaseSettings):
@@ -54,9 +125,12 @@ class CelerySettings(BaseSettings):
     broker_host: str = Field(..., alias="RABBITMQ_CONTAINER_NAME")
     broker_port: int = Field(..., alias="RABBIT_PORT_1")
     broker_queue: str = "default"
+    cpu_queue: str = "cpu"
+    gpu_queue: str = "gpu"
     celery_task_always_eager: bool = False
     celery_worker_log_color: bool = False
     celery_worker_concurrency: int = 1
+    worker_prefetch_multiplier: int = 1  # Leave pending tasks in the queue for batching
 
     # Heartbeat and connection settings
     broker_heartbeat: int = 0  # Disable heartbeat
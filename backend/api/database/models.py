@@ -3,8 +3,10 @@ from datetime import datetime
 from api.core.settings import TaskStage, TaskStatus, WatsonSettings
 from pgvector.sqlalchemy import Vector
 from sqlalchemy import (
+    BigInteger,
     Column,
     DateTime,
+    Float,
     ForeignKey,
     Integer,
     String,
@@ -95,6 +97,83 @@ class Task(Base):
         default=TaskStage.converting_pdfs.value,
     )
     error: Mapped[str | None] = mapped_column(Text)
+    reasoning_mode: Mapped[str | None] = mapped_column(String)
+    stage_metrics: Mapped[list["TaskStageMetrics"]] = relationship(
+        back_populates="task",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by="TaskStageMetrics.created_at",
+    )
+
+
+class TaskStageMetrics(Base):
+    __tablename__ = "task_stage_metrics"
+
+    task_id: Mapped[str] = mapped_column(
+        ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True, index=True
+    )
+    stage: Mapped[str] = mapped_column(String, primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    wall_seconds: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    model_load_seconds: Mapped[float] = mapped_column(
+        Float, nullable=False, default=0.0
+    )
+    pages: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    chunks: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    prompts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    relations: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    prompt_tokens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    completion_tokens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    peak_rss_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    duplicate_chunks: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    prompts_saved: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    cache_hits: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    cache_misses: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    cached_prompt_tokens: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0
+    )
+    reasoning_capped: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    parse_errors: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    wasted_tokens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    retries: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    lexical_evidence: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    summary_cache_hits: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    task: Mapped[Task] = relationship(back_populates="stage_metrics")
+
+
+class LLMResponse(Base):
+    __tablename__ = "llm_response_cache"
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    model: Mapped[str] = mapped_column(String, nullable=False)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    prompt_tokens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    completion_tokens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    finish_reason: Mapped[str | None] = mapped_column(String)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    last_used_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now(), index=True
+    )
+
+
+class ChunkSummary(Base):
+    __tablename__ = "chunk_summary_cache"
+
+    model: Mapped[str] = mapped_column(String, primary_key=True)
+    prompt_version: Mapped[int] = mapped_column(Integer, primary_key=True)
+    text_hash: Mapped[str] = mapped_column(String, primary_key=True)
+    summary: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    last_used_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now(), index=True
+    )
 
 
 class File(Base):
@@ -106,6 +185,7 @@ class File(Base):
     )
     filename: Mapped[str] = mapped_column(String, nullable=False)
     storage_path: Mapped[str] = mapped_column(String, nullable=False)
+    conversion_profile: Mapped[str | None] = mapped_column(String)
 
     task: Mapped[Task] = relationship(back_populates="files")
     chunks: Mapped[list["Chunk"]] = relationship(
@@ -138,6 +218,8 @@ class Relation(Base):
     )
     text: Mapped[str] = mapped_column(String, nullable=False)
     evidence: Mapped[str | None] = mapped_column(Text)
+    evidence_start: Mapped[int | None] = mapped_column(Integer)
+    evidence_end: Mapped[int | None] = mapped_column(Integer)
     embedding: Mapped[list[float] | None] = mapped_column(
         Vector(WatsonSettings.embedding_dim)
     )
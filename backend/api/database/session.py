@@ -27,11 +27,38 @@ engine = create_engine(PostgresSettings.dsn, pool_pre_ping=True, future=True)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
 
 
+# Columns added to existing tables after their creation, create_all only creates tables.
+_ADDED_COLUMNS = [
+    ("task_stage_metrics", "peak_rss_bytes", "BIGINT NOT NULL DEFAULT 0"),
+    ("files", "conversion_profile", "VARCHAR"),
+    ("task_stage_metrics", "duplicate_chunks", "INTEGER NOT NULL DEFAULT 0"),
+    ("task_stage_metrics", "prompts_saved", "INTEGER NOT NULL DEFAULT 0"),
+    ("task_stage_metrics", "cache_hits", "INTEGER NOT NULL DEFAULT 0"),
+    ("task_stage_metrics", "cache_misses", "INTEGER NOT NULL DEFAULT 0"),
+    ("task_stage_metrics", "cached_prompt_tokens", "INTEGER NOT NULL DEFAULT 0"),
+    ("task_stage_metrics", "reasoning_capped", "INTEGER NOT NULL DEFAULT 0"),
+    ("tasks", "reasoning_mode", "VARCHAR"),
+    ("task_stage_metrics", "parse_errors", "INTEGER NOT NULL DEFAULT 0"),
+    ("task_stage_metrics", "wasted_tokens", "INTEGER NOT NULL DEFAULT 0"),
+    ("task_stage_metrics", "retries", "INTEGER NOT NULL DEFAULT 0"),
+    ("task_stage_metrics", "lexical_evidence", "INTEGER NOT NULL DEFAULT 0"),
+    ("relations", "evidence_start", "INTEGER"),
+    ("relations", "evidence_end", "INTEGER"),
+    ("task_stage_metrics", "summary_cache_hits", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+
 def init_db() -> None:
     _create_database_if_missing()
     with engine.begin() as conn:
         conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
         Base.metadata.create_all(bind=conn)
+        for table, column, definition in _ADDED_COLUMNS:
+            conn.execute(
+                text(
+                    f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition}"
+                )
+            )
 
 
 def get_db():
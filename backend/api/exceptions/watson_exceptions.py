@@ -214,3 +214,24 @@ class EmbeddingsException(WatsonException):
             details["error_type"] = type(original_error).__name__
 
         super().__init__(message=message, status_code=500, details=details)
+
+
+class ModelPoolException(WatsonException):
+    """Exception raised when the model pool cannot fit an engine in its budget."""
+
+    def __init__(
+        self,
+        message: str = "Model does not fit in the model pool",
+        models: Optional[list] = None,
+        required: Optional[float] = None,
+        budget: Optional[float] = None,
+    ):
+        details = {}
+        if models:
+            details["models"] = models
+        if required is not None:
+            details["required_gpu_memory_utilization"] = required
+        if budget is not None:
+            details["memory_budget"] = budget
+
+        super().__init__(message=message, status_code=500, details=details)
@@ -1,11 +1,45 @@
+import hashlib
+import uuid
 from dataclasses import dataclass
 from typing import List, Optional, Tuple
 
+# Namespace of the content-derived UUIDv5 identifiers of chunks and relations.
+ID_NAMESPACE = uuid.UUID("4bc7d374-a407-4bc6-9b02-bfef7cf6cfea")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def make_chunk_id(
+    scope: str, file_hash: str, chunking: str, index: int, text: str
+) -> str:
+    """
+    Derive a chunk ID from its source file, the chunking parameters and its content.
+
+    Chunk IDs are primary keys shared by all tasks, so the key is scoped by
+    the task and file name and the same paper uploaded twice gets separate rows.
+    """
+    key = f"chunk/{scope}/{file_hash}/{chunking}/{index}/{content_hash(text)}"
+    return str(uuid.uuid5(ID_NAMESPACE, key))
+
+
+def make_relation_id(chunk_id: str, index: int, relation: str) -> str:
+    """Derive a relation ID from its chunk, position and text."""
+    key = f"relation/{chunk_id}/{index}/{content_hash(relation)}"
+    return str(uuid.uuid5(ID_NAMESPACE, key))
+
 
 @dataclass
 class PDFConversionResult:
     file_name: str
     content: str
+    pages: Optional[int] = None
+    error: Optional[str] = None
+    cached: bool = False
+    peak_rss_bytes: Optional[int] = None
+    profile: Optional[str] = None
+    content_hash: Optional[str] = None  # SHA-256 of the source PDF
 
 
 @dataclass
@@ -51,6 +85,8 @@ class EvidencePNRelation:
     modifiers: Optional[List[Tuple[str, str]]] = None
     products: Optional[List[Tuple[str, str]]] = None
     embedding: Optional[List[float]] = None
+    evidence_start: Optional[int] = None
+    evidence_end: Optional[int] = None
 
 
 @dataclass
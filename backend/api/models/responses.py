@@ -14,6 +14,54 @@ class UploadedFile(BaseModel):
     file_url: Optional[str] = Field(None, description="Access URL for the file")
 
 
+class StageMetricsResponse(BaseModel):
+    """Response model for the metrics of a single processing stage."""
+
+    stage: str = Field(..., description="Processing stage")
+    wall_seconds: float = Field(..., description="Wall time spent in the stage")
+    model_load_seconds: float = Field(
+        ..., description="Time spent loading models during the stage"
+    )
+    pages: int = Field(..., description="Number of converted PDF pages")
+    chunks: int = Field(..., description="Number of chunks in the stage output")
+    prompts: int = Field(..., description="Number of prompts sent to models")
+    relations: int = Field(..., description="Number of relations in the stage output")
+    prompt_tokens: int = Field(..., description="Number of prompt tokens")
+    completion_tokens: int = Field(..., description="Number of generated tokens")
+    peak_rss_bytes: int = Field(
+        ..., description="Highest peak RSS of the worker while converting a file"
+    )
+    duplicate_chunks: int = Field(
+        ..., description="Number of chunks processed through a duplicate"
+    )
+    prompts_saved: int = Field(
+        ..., description="Number of model prompts saved by deduplication"
+    )
+    cache_hits: int = Field(..., description="Number of responses served from cache")
+    cache_misses: int = Field(
+        ..., description="Number of cacheable prompts sent to the model"
+    )
+    summary_cache_hits: int = Field(
+        ..., description="Number of chunk summaries served from the summary cache"
+    )
+    cached_prompt_tokens: int = Field(
+        ..., description="Number of prompt tokens served from the prefix cache"
+    )
+    reasoning_capped: int = Field(
+        ..., description="Number of prompts whose reasoning was cut at the budget"
+    )
+    parse_errors: int = Field(
+        ..., description="Number of generated relations discarded as malformed"
+    )
+    wasted_tokens: int = Field(
+        ..., description="Number of generated tokens in discarded relations"
+    )
+    retries: int = Field(..., description="Number of prompts resubmitted to models")
+    lexical_evidence: int = Field(
+        ..., description="Number of relations whose evidence was found without a model"
+    )
+
+
 class FullTaskResponse(BaseModel):
     """Response model for task information."""
 
@@ -21,11 +69,17 @@ class FullTaskResponse(BaseModel):
     task_name: str = Field(None, description="Name of the task")
     stage: Optional[str] = Field(None, description="Current task stage")
     task_description: str = Field(None, description="Description of the task")
+    reasoning_mode: Optional[str] = Field(
+        None, description="Reasoning mode of relation extraction"
+    )
     status: str = Field(..., description="Current task status")
     files: list[str] = Field(..., description="List of uploaded files")
     error: Optional[str] = Field(None, description="Error message if failed")
     created_at: Optional[datetime] = Field(None, description="Task creation time")
     updated_at: Optional[datetime] = Field(None, description="Last update time")
+    metrics: List[StageMetricsResponse] = Field(
+        default_factory=list, description="Per-stage processing metrics"
+    )
 
 
 class SimpleTaskResponse(BaseModel):
@@ -75,6 +129,9 @@ class FileChunkResponse(BaseModel):
 
     file_name: str = Field(..., description="Name of the file")
     chunks: List[str] = Field(..., description="List of text chunks")
+    conversion_profile: Optional[str] = Field(
+        None, description="PDF conversion profile used for the file"
+    )
 
 
 class ResultResponse(BaseModel):
@@ -90,6 +147,12 @@ class RelationResponse(BaseModel):
     id: str = Field(..., description="Unique relation identifier")
     text: str = Field(..., description="Relation text")
     evidence: str = Field(..., description="Evidence supporting the relation")
+    evidence_start: Optional[int] = Field(
+        None, description="Offset of the evidence start in the chunk content"
+    )
+    evidence_end: Optional[int] = Field(
+        None, description="Offset of the evidence end in the chunk content"
+    )
     substrates: List[str] = Field(..., description="List of substrate compounds")
     modifiers: List[str] = Field(..., description="List of modifier compounds")
     products: List[str] = Field(..., description="List of product compounds")
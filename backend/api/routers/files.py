@@ -1,5 +1,7 @@
+from typing import Optional
+
 from api.core.logging import logger
-from api.core.settings import TaskStatus
+from api.core.settings import ReasoningMode, TaskStatus, WatsonSettings
 from api.exceptions.watson_exceptions import (
     FileUploadException,
     StorageException,
@@ -10,7 +12,7 @@ from api.models.responses import FileUploadResponse
 from api.services.files_service import upload_files, validate_files
 from api.services.minio_service import minio_service
 from api.services.postgres_service import create_task
-from api.worker.tasks import create_pn_from_pdfs_task
+from api.worker.tasks import start_pipeline
 from fastapi import APIRouter, Form, UploadFile, status
 from fastapi.responses import Response
 
@@ -31,10 +33,14 @@ async def upload_file(
     task_name: str = Form(...),
     task_description: str = Form(...),
     files: list[UploadFile] = ...,
+    reasoning_mode: Optional[ReasoningMode] = Form(None),
 ):
     """
     Upload a PDF file for processing.
 
+    The reasoning mode of relation extraction defaults to
+    WatsonSettings.reasoning_mode.
+
     Returns:
         FileUploadResponse: Contains task ID and file information
 
@@ -47,17 +53,19 @@ async def upload_file(
 
         task_id, uploaded_files = await upload_files(files)
 
+        reasoning_mode = ReasoningMode(reasoning_mode or WatsonSettings.reasoning_mode)
         task_data = {
             "name": task_name,
             "description": task_description,
             "files": [file.dict() for file in uploaded_files],
             "status": TaskStatus.created.value,
+            "reasoning_mode": reasoning_mode.value,
         }
 
         create_task(task_id=task_id, task_data=task_data)
 
-        create_pn_from_pdfs_task.delay(
-            task_id, [file.dict() for file in uploaded_files]
+        start_pipeline(
+            task_id, [file.dict() for file in uploaded_files], reasoning_mode.value
         )
 
         logger.info(
@@ -31,7 +31,11 @@ async def get_task_results(task_id: str):
     file_responses = []
     for file in files:
         chunk_ids = [chunk.id for chunk in file.chunks]
-        file_response = FileChunkResponse(file_name=file.filename, chunks=chunk_ids)
+        file_response = FileChunkResponse(
+            file_name=file.filename,
+            chunks=chunk_ids,
+            conversion_profile=file.conversion_profile,
+        )
         file_responses.append(file_response)
 
     return ResultResponse(task_id=task_id, files=file_responses)
@@ -63,6 +67,8 @@ async def chunks(task_id: str, chunk_id: str):
             id=rel.id,
             text=rel.text,
             evidence=rel.evidence,
+            evidence_start=rel.evidence_start,
+            evidence_end=rel.evidence_end,
             substrates=[compound.name for compound in rel.substrates],
             modifiers=[compound.name for compound in rel.modifiers],
             products=[compound.name for compound in rel.products],
@@ -1,4 +1,5 @@
 import io
+from typing import BinaryIO
 
 from api.core.logging import logger
 from api.core.settings import MinioSettings
@@ -109,5 +110,84 @@ class MinIOService:
                     operation="download",
                 ) from e
 
+    def download_file_to_sync(
+        self, object_name: str, file_obj: BinaryIO, chunk_size: int = 1024 * 1024
+    ) -> int:
+        """Stream a file from MinIO into a file object without holding it in memory."""
+        try:
+            response = self.client.get_object(self.bucket, object_name)
+            size = 0
+            try:
+                for data in response.stream(chunk_size):
+                    file_obj.write(data)
+                    size += len(data)
+            finally:
+                response.close()
+                response.release_conn()
+            file_obj.flush()
+            return size
+
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                logger.warning(f"File not found: {object_name}")
+                raise FileNotFoundException(f"File not found: {object_name}")
+            else:
+                logger.error(f"Error downloading file {object_name}: {str(e)}")
+                raise StorageException(
+                    message=f"Failed to download file: {str(e)}",
+                    storage_type="minio",
+                    operation="download",
+                ) from e
+
+    def upload_file_sync(
+        self, object_name: str, file_content: bytes, content_type: str
+    ) -> None:
+        """Upload file to MinIO synchronously."""
+        try:
+            self.client.put_object(
+                bucket_name=self.bucket,
+                object_name=object_name,
+                data=io.BytesIO(file_content),
+                length=len(file_content),
+                content_type=content_type,
+            )
+        except S3Error as e:
+            logger.error(f"Error uploading file {object_name}: {str(e)}")
+            raise StorageException(
+                message=f"Failed to upload file: {str(e)}",
+                storage_type="minio",
+                operation="upload",
+            ) from e
+
+    def file_exists_sync(self, object_name: str) -> bool:
+        """Check whether a file exists in MinIO."""
+        try:
+            self.client.stat_object(self.bucket, object_name)
+            return True
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject"):
+                return False
+            logger.error(f"Error checking file {object_name}: {str(e)}")
+            raise StorageException(
+                message=f"Failed to check file: {str(e)}",
+                storage_type="minio",
+                operation="stat",
+            ) from e
+
+    def delete_prefix_sync(self, prefix: str) -> None:
+        """Delete every file stored under the given prefix."""
+        try:
+            for obj in self.client.list_objects(
+                self.bucket, prefix=prefix, recursive=True
+            ):
+                self.client.remove_object(self.bucket, obj.object_name)
+        except S3Error as e:
+            logger.error(f"Error deleting files under {prefix}: {str(e)}")
+            raise StorageException(
+                message=f"Failed to delete files: {str(e)}",
+                storage_type="minio",
+                operation="delete",
+            ) from e
+
 
 minio_service = MinIOService()
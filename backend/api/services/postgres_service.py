@@ -1,11 +1,13 @@
 import uuid
+from datetime import timedelta
 from typing import List
 
 from api.database import models
 from api.database.session import SessionLocal
 from api.exceptions.watson_exceptions import PostgresException
 from api.models.internal import EvidencePNGenerationResult
-from sqlalchemy import exists, func, or_, select
+from sqlalchemy import delete, exists, func, or_, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, selectinload
 
@@ -39,7 +41,12 @@ def _get_or_create_compound_cache(db: Session):
 
 
 def save_task_results(task_id: str, results: List[EvidencePNGenerationResult]) -> None:
-    """Persist processed task outputs into Postgres (task, files, chunks, relations, compounds)."""
+    """
+    Persist processed task outputs into Postgres (task, files, chunks, relations, compounds).
+
+    Chunks and relations are upserted by ID and relations no longer produced
+    for a chunk are removed, so saving the same results twice is a no-op.
+    """
     with SessionLocal() as db:
         with db.begin():
             task = db.get(models.Task, task_id)
@@ -57,6 +64,13 @@ def save_task_results(task_id: str, results: List[EvidencePNGenerationResult]) -
 
             get_compound = _get_or_create_compound_cache(db)
 
+            chunk_rows = []
+            relation_rows = []
+            role_rows = {
+                models.relation_substrates: [],
+                models.relation_modifiers: [],
+                models.relation_products: [],
+            }
             for file_result in results:
                 file_row = existing_files.get(file_result.file_name)
                 if file_row is None:
@@ -65,52 +79,86 @@ def save_task_results(task_id: str, results: List[EvidencePNGenerationResult]) -
                     )
 
                 for pn_chunk in file_result.annotated_chunks:
-                    chunk_row = models.Chunk(
-                        id=pn_chunk.chunk.id,
-                        file_id=file_row.id,
-                        content=pn_chunk.chunk.text,
-                        summary=pn_chunk.chunk.summary,
+                    chunk_rows.append(
+                        {
+                            "id": pn_chunk.chunk.id,
+                            "file_id": file_row.id,
+                            "content": pn_chunk.chunk.text,
+                            "summary": pn_chunk.chunk.summary,
+                        }
                     )
-                    db.add(chunk_row)
-                    db.flush()
-
-                    if not pn_chunk.annotated_relations:
-                        continue
-
-                    for rel in pn_chunk.annotated_relations:
-                        relation_row = models.Relation(
-                            id=rel.id,
-                            chunk_id=chunk_row.id,
-                            text=rel.relation,
-                            evidence=rel.evidence,
-                            embedding=rel.embedding,
+
+                    for rel in pn_chunk.annotated_relations or []:
+                        relation_rows.append(
+                            {
+                                "id": rel.id,
+                                "chunk_id": pn_chunk.chunk.id,
+                                "text": rel.relation,
+                                "evidence": rel.evidence,
+                                "evidence_start": rel.evidence_start,
+                                "evidence_end": rel.evidence_end,
+                                "embedding": rel.embedding,
+                            }
                         )
-                        db.add(relation_row)
-
-                        substrate_ids: set[int] = set()
-                        modifier_ids: set[int] = set()
-                        product_ids: set[int] = set()
-
-                        for substrate in rel.substrates or []:
-                            compound = get_compound(substrate)
-                            if compound.id in substrate_ids:
-                                continue
-                            substrate_ids.add(compound.id)
-                            relation_row.substrates.append(compound)
-
-                        for modifier in rel.modifiers or []:
-                            compound = get_compound(modifier)
-                            if compound.id in modifier_ids:
-                                continue
-                            modifier_ids.add(compound.id)
-                            relation_row.modifiers.append(compound)
-
-                        for product in rel.products or []:
-                            compound = get_compound(product)
-                            if compound.id in product_ids:
-                                continue
-                            product_ids.add(compound.id)
-                            relation_row.products.append(compound)
+                        for table, compounds in (
+                            (models.relation_substrates, rel.substrates),
+                            (models.relation_modifiers, rel.modifiers),
+                            (models.relation_products, rel.products),
+                        ):
+                            compound_ids = {
+                                get_compound(compound).id
+                                for compound in compounds or []
+                            }
+                            role_rows[table].extend(
+                                {"relation_id": rel.id, "compound_id": compound_id}
+                                for compound_id in compound_ids
+                            )
+
+            # IDs are derived from content, so re-running a task updates its rows in place.
+            chunk_ids = [row["id"] for row in chunk_rows]
+            relation_ids = [row["id"] for row in relation_rows]
+            if chunk_rows:
+                stmt = insert(models.Chunk)
+                db.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[models.Chunk.id],
+                        set_={
+                            "file_id": stmt.excluded.file_id,
+                            "content": stmt.excluded.content,
+                            "summary": stmt.excluded.summary,
+                        },
+                    ),
+                    chunk_rows,
+                )
+                db.execute(
+                    delete(models.Relation).where(
+                        models.Relation.chunk_id.in_(chunk_ids),
+                        models.Relation.id.not_in(relation_ids),
+                    )
+                )
+            if relation_rows:
+                stmt = insert(models.Relation)
+                db.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[models.Relation.id],
+                        set_={
+                            "chunk_id": stmt.excluded.chunk_id,
+                            "text": stmt.excluded.text,
+                            "evidence": stmt.excluded.evidence,
+                            "evidence_start": stmt.excluded.evidence_start,
+                            "evidence_end": stmt.excluded.evidence_end,
+                            "embedding": stmt.excluded.embedding,
+                        },
+                    ),
+                    relation_rows,
+                )
+            for table, rows in role_rows.items():
+                if relation_ids:
+                    db.execute(
+                        delete(table).where(table.c.relation_id.in_(relation_ids))
+                    )
+                if rows:
+                    db.execute(insert(table), rows)
 
 
 def find_chunk_with_relations(task_id: str, chunk_id: str):
@@ -205,6 +253,7 @@ def create_task(task_id: str, task_data: dict) -> None:
                 name=task_data.get("name"),
                 description=task_data.get("description"),
                 status=task_data.get("status"),
+                reasoning_mode=task_data.get("reasoning_mode"),
                 files=files,
             )
             db.add(task)
@@ -237,6 +286,156 @@ def update_task_stage(task_id: str, stage: str) -> None:
             )
 
 
+def save_conversion_profiles(task_id: str, profiles: dict) -> None:
+    """Record the conversion profile used for each file of a task, by file name."""
+    with SessionLocal() as db:
+        with db.begin():
+            for file_name, profile in profiles.items():
+                db.query(models.File).filter(
+                    models.File.task_id == task_id, models.File.filename == file_name
+                ).update({"conversion_profile": profile})
+
+
+def save_stage_metrics(task_id: str, metrics: dict) -> None:
+    """Insert or replace the metrics of one stage of a task."""
+    with SessionLocal() as db:
+        with db.begin():
+            db.merge(models.TaskStageMetrics(task_id=task_id, **metrics))
+
+
+def get_cached_responses(keys: List[str]) -> dict[str, models.LLMResponse]:
+    """Look up cached model responses by key and mark them as recently used."""
+    if not keys:
+        return {}
+    with SessionLocal() as db:
+        with db.begin():
+            rows = db.scalars(
+                select(models.LLMResponse).where(models.LLMResponse.key.in_(keys))
+            ).all()
+            if rows:
+                db.execute(
+                    update(models.LLMResponse)
+                    .where(models.LLMResponse.key.in_([row.key for row in rows]))
+                    .values(last_used_at=func.now())
+                )
+            return {row.key: row for row in rows}
+
+
+# Share of max_entries freed by an eviction, so evictions happen in batches.
+_CACHE_EVICTION_BATCH = 0.1
+
+
+def _evict_least_recently_used(
+    db: Session, model, key_columns: list, incoming: int, max_entries: int
+) -> None:
+    """
+    Evict the least recently used rows of a cache table once it exceeds max_entries.
+
+    The planner's row estimate plus the incoming rows is checked first, so a
+    cache below its cap is not counted on every save. The estimate lags behind
+    until the table is analyzed again, which can let the cache run over its
+    cap by the rows inserted in between. Once over, the table is cut down to
+    (1 - _CACHE_EVICTION_BATCH) * max_entries.
+    """
+    estimate = db.scalar(
+        text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": model.__tablename__},
+    )
+    # A table that was never analyzed has no estimate (-1).
+    if estimate is not None and estimate >= 0 and estimate + incoming <= max_entries:
+        return
+    count = db.scalar(select(func.count()).select_from(model))
+    if count <= max_entries:
+        return
+    excess = count - int(max_entries * (1 - _CACHE_EVICTION_BATCH))
+    oldest = select(*key_columns).order_by(model.last_used_at).limit(excess)
+    db.execute(delete(model).where(tuple_(*key_columns).in_(oldest)))
+
+
+def save_cached_responses(rows: List[dict], max_entries: int) -> None:
+    """Store model responses and evict the least recently used beyond max_entries."""
+    if not rows:
+        return
+    with SessionLocal() as db:
+        with db.begin():
+            db.execute(
+                insert(models.LLMResponse).on_conflict_do_nothing(
+                    index_elements=[models.LLMResponse.key]
+                ),
+                rows,
+            )
+            _evict_least_recently_used(
+                db, models.LLMResponse, [models.LLMResponse.key], len(rows), max_entries
+            )
+
+
+def get_cached_summaries(
+    model: str, prompt_version: int, text_hashes: List[str]
+) -> dict[str, str]:
+    """Look up cached chunk summaries by text hash and mark them as recently used."""
+    if not text_hashes:
+        return {}
+    key = (
+        models.ChunkSummary.model == model,
+        models.ChunkSummary.prompt_version == prompt_version,
+        models.ChunkSummary.text_hash.in_(text_hashes),
+    )
+    with SessionLocal() as db:
+        with db.begin():
+            rows = db.scalars(select(models.ChunkSummary).where(*key)).all()
+            if rows:
+                db.execute(
+                    update(models.ChunkSummary)
+                    .where(*key)
+                    .values(last_used_at=func.now())
+                )
+            return {row.text_hash: row.summary for row in rows}
+
+
+def save_cached_summaries(
+    rows: List[dict], max_entries: int, max_age_days: int
+) -> None:
+    """
+    Store chunk summaries and evict the stale ones.
+
+    Summaries unused for more than max_age_days are removed, then the least
+    recently used once the cache exceeds max_entries.
+    """
+    if not rows:
+        return
+    with SessionLocal() as db:
+        with db.begin():
+            stmt = insert(models.ChunkSummary)
+            db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[
+                        models.ChunkSummary.model,
+                        models.ChunkSummary.prompt_version,
+                        models.ChunkSummary.text_hash,
+                    ],
+                    set_={"summary": stmt.excluded.summary, "last_used_at": func.now()},
+                ),
+                rows,
+            )
+            db.execute(
+                delete(models.ChunkSummary).where(
+                    models.ChunkSummary.last_used_at
+                    < func.now() - timedelta(days=max_age_days)
+                )
+            )
+            _evict_least_recently_used(
+                db,
+                models.ChunkSummary,
+                [
+                    models.ChunkSummary.model,
+                    models.ChunkSummary.prompt_version,
+                    models.ChunkSummary.text_hash,
+                ],
+                len(rows),
+                max_entries,
+            )
+
+
 def get_simple_task(task_id: str) -> dict | None:
     """Get a simple representation of a task by its ID."""
     with SessionLocal() as db:
@@ -250,9 +449,36 @@ def get_simple_task(task_id: str) -> dict | None:
             "error": task.error,
             "task_name": task.name,
             "task_description": task.description,
+            "reasoning_mode": task.reasoning_mode,
             "files": [f.storage_path for f in task.files],
             "created_at": task.created_at,
             "updated_at": task.updated_at,
+            "metrics": [
+                {
+                    "stage": m.stage,
+                    "wall_seconds": m.wall_seconds,
+                    "model_load_seconds": m.model_load_seconds,
+                    "pages": m.pages,
+                    "chunks": m.chunks,
+                    "prompts": m.prompts,
+                    "relations": m.relations,
+                    "prompt_tokens": m.prompt_tokens,
+                    "completion_tokens": m.completion_tokens,
+                    "peak_rss_bytes": m.peak_rss_bytes,
+                    "duplicate_chunks": m.duplicate_chunks,
+                    "prompts_saved": m.prompts_saved,
+                    "cache_hits": m.cache_hits,
+                    "cache_misses": m.cache_misses,
+                    "summary_cache_hits": m.summary_cache_hits,
+                    "cached_prompt_tokens": m.cached_prompt_tokens,
+                    "reasoning_capped": m.reasoning_capped,
+                    "parse_errors": m.parse_errors,
+                    "wasted_tokens": m.wasted_tokens,
+                    "retries": m.retries,
+                    "lexical_evidence": m.lexical_evidence,
+                }
+                for m in task.stage_metrics
+            ],
         }
 
 
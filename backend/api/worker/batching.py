@@ -0,0 +1,166 @@
+import queue
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator, List, Optional
+
+from api.core.logging import logger
+from api.core.settings import TaskStage
+from api.models.responses import UploadedFile
+from api.worker.celery_app import celery_app
+from api.worker.checkpoints import CheckpointStore, stage_index
+from api.worker.deduplication import ChunkClusters
+from api.worker.metrics import StageMetrics
+
+
+@dataclass
+class BatchJob:
+    """A single task processed as part of a cross-task batch."""
+
+    task_id: str
+    uploaded_files: List[UploadedFile]
+    results: list = field(default_factory=list)
+    error: Optional[Exception] = None
+    message: Optional[Any] = None
+    checkpointed: Optional[TaskStage] = None
+    completed: bool = False
+    reasoning_mode: Optional[str] = None
+    # Full chunking and its duplicate clusters, to fan results out before persisting.
+    chunking: list = field(default_factory=list)
+    clusters: Optional[ChunkClusters] = None
+    dedup_metrics: Optional[StageMetrics] = None
+
+    @property
+    def prompt_count(self) -> int:
+        return sum(
+            len(node.chunks if hasattr(node, "chunks") else node.annotated_chunks)
+            for node in self.results
+        )
+
+    @property
+    def checkpoints(self) -> CheckpointStore:
+        return CheckpointStore(self.task_id)
+
+    def resume(self) -> None:
+        """Restore the output of the most advanced checkpointed stage, if any."""
+        latest = self.checkpoints.latest()
+        if latest is not None:
+            self.checkpointed, self.results = latest
+
+    def needs(self, stage: TaskStage) -> bool:
+        """Whether the stage still has to run for this job."""
+        if self.error is not None:
+            return False
+        if self.checkpointed is None:
+            return True
+        return stage_index(stage) > stage_index(self.checkpointed)
+
+    def complete_stage(self, stage: TaskStage, results: list) -> None:
+        self.results = results
+        self.checkpointed = stage
+        self.checkpoints.save(stage, results)
+
+    def requeue(self) -> None:
+        """Hand a drained job back to the broker, to resume from its checkpoints."""
+        logger.warning(f"Requeueing unfinished task {self.task_id}")
+        self.message.requeue()
+
+
+@contextmanager
+def drain_pending_jobs(
+    task_name: str, max_jobs: int, wait_seconds: float
+) -> Iterator[List[BatchJob]]:
+    """
+    Pull up to max_jobs pending task messages from the broker so they can be batched.
+
+    Drained messages are acknowledged when the context exits unless they were
+    requeued, so a worker lost mid-batch leaves them to be redelivered just
+    like the task being executed.
+
+    Args:
+        task_name: Name of the Celery task whose messages can be batched
+        max_jobs: Maximum number of messages to drain
+        wait_seconds: How long to wait for more messages to arrive
+
+    Yields:
+        List of BatchJob objects built from the drained messages
+    """
+    if max_jobs <= 0 or celery_app.conf.task_always_eager:
+        yield []
+        return
+
+    try:
+        connection = celery_app.connection_for_read()
+        connection.ensure_connection(max_retries=1)
+        pending = connection.SimpleQueue(celery_app.conf.task_default_queue)
+    except Exception as e:
+        logger.warning(f"Could not drain pending tasks for batching: {str(e)}")
+        yield []
+        return
+
+    jobs = []
+    try:
+        deadline = time.monotonic() + wait_seconds
+        while len(jobs) < max_jobs:
+            remaining = deadline - time.monotonic()
+            try:
+                message = pending.get(block=remaining > 0, timeout=max(remaining, 0))
+            except queue.Empty:
+                break
+
+            if message.headers.get("task") != task_name:
+                message.requeue()
+                break
+
+            args, _, _ = message.decode()
+            task_id, uploaded_files, *options = args
+            jobs.append(
+                BatchJob(
+                    task_id=task_id,
+                    uploaded_files=[UploadedFile(**file) for file in uploaded_files],
+                    message=message,
+                    reasoning_mode=options[0] if options else None,
+                )
+            )
+
+        if jobs:
+            logger.info(
+                f"Drained {len(jobs)} pending tasks for batching: {[job.task_id for job in jobs]}"
+            )
+        yield jobs
+    finally:
+        for job in jobs:
+            if not job.message.acknowledged:
+                job.message.ack()
+        pending.close()
+        connection.release()
+
+
+def plan_batches(jobs: List[BatchJob], max_prompts: int) -> List[List[BatchJob]]:
+    """
+    Group consecutive jobs so that each group stays within the prompt budget.
+
+    A job larger than the budget on its own still forms a group of one.
+
+    Args:
+        jobs: Chunked jobs in queue order
+        max_prompts: Maximum number of prompts sent in one generate call
+
+    Returns:
+        List of job groups processed together
+    """
+    batches = []
+    current = []
+    current_prompts = 0
+    for job in jobs:
+        if current and current_prompts + job.prompt_count > max_prompts:
+            batches.append(current)
+            current = []
+            current_prompts = 0
+        current.append(job)
+        current_prompts += job.prompt_count
+
+    if current:
+        batches.append(current)
+
+    return batches
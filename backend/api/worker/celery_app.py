@@ -13,5 +13,19 @@ celery_app = Celery("service")
 
 celery_app.config_from_object(CelerySettings)
 
-celery_app.conf.update(worker_hijack_root_logger=False)
+celery_app.conf.update(
+    worker_hijack_root_logger=False,
+    task_routes={
+        "api.worker.tasks.convert_stage_task": {"queue": CelerySettings.cpu_queue},
+        "api.worker.tasks.chunk_stage_task": {"queue": CelerySettings.cpu_queue},
+        "api.worker.tasks.persist_stage_task": {"queue": CelerySettings.cpu_queue},
+        "api.worker.tasks.generate_stage_task": {"queue": CelerySettings.gpu_queue},
+        "api.worker.tasks.evidence_stage_task": {"queue": CelerySettings.gpu_queue},
+        "api.worker.tasks.summarize_stage_task": {"queue": CelerySettings.gpu_queue},
+        "api.worker.tasks.evidence_summary_stage_task": {
+            "queue": CelerySettings.gpu_queue
+        },
+        "api.worker.tasks.embed_stage_task": {"queue": CelerySettings.gpu_queue},
+    },
+)
 celery_app.autodiscover_tasks(["api.worker.tasks"])
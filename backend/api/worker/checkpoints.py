@@ -0,0 +1,169 @@
+import gzip
+import json
+from dataclasses import asdict, fields, is_dataclass
+from typing import (
+    Any,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    get_args,
+    get_origin,
+    get_type_hints,
+)
+
+from api.core.logging import logger
+from api.core.settings import TaskStage, WatsonSettings
+from api.models.internal import (
+    ChunkingResult,
+    EvidencePNGenerationResult,
+    PDFConversionResult,
+    PNGenerationResult,
+)
+from api.services.minio_service import minio_service
+
+# Pipeline stages in execution order with the type of their per-file output.
+PIPELINE_STAGES = [
+    (TaskStage.converting_pdfs, PDFConversionResult),
+    (TaskStage.chunking_documents, ChunkingResult),
+    (TaskStage.pn_generation, PNGenerationResult),
+    (TaskStage.evidence_finding, EvidencePNGenerationResult),
+    (TaskStage.summarization, EvidencePNGenerationResult),
+    (TaskStage.embedding, EvidencePNGenerationResult),
+]
+_RESULT_TYPES = dict(PIPELINE_STAGES)
+
+
+def stage_index(stage: TaskStage) -> int:
+    return [pipeline_stage for pipeline_stage, _ in PIPELINE_STAGES].index(stage)
+
+
+def _from_value(hint: Any, value: Any) -> Any:
+    if value is None:
+        return None
+
+    origin = get_origin(hint)
+    if origin is Union:
+        hint = next(arg for arg in get_args(hint) if arg is not type(None))
+        origin = get_origin(hint)
+
+    if origin in (list, List):
+        (item_hint,) = get_args(hint)
+        return [_from_value(item_hint, item) for item in value]
+
+    # JSON has no tuples, they come back as lists.
+    if origin in (tuple, Tuple):
+        item_hints = get_args(hint)
+        if len(item_hints) == 2 and item_hints[1] is Ellipsis:
+            item_hints = (item_hints[0],) * len(value)
+        return tuple(
+            _from_value(item_hint, item) for item_hint, item in zip(item_hints, value)
+        )
+
+    if is_dataclass(hint):
+        return _from_dict(hint, value)
+
+    return value
+
+
+def _from_dict(cls: type, data: dict) -> Any:
+    hints = get_type_hints(cls)
+    return cls(
+        **{
+            field.name: _from_value(hints[field.name], data[field.name])
+            for field in fields(cls)
+            if field.name in data
+        }
+    )
+
+
+def serialize_results(results: list) -> bytes:
+    """Serialize a list of stage results into a compact gzip-compressed JSON payload."""
+    payload = json.dumps([asdict(result) for result in results], separators=(",", ":"))
+    return gzip.compress(payload.encode("utf-8"))
+
+
+def deserialize_results(stage: TaskStage, payload: bytes) -> list:
+    """Rebuild the list of stage results serialized by serialize_results."""
+    data = json.loads(gzip.decompress(payload).decode("utf-8"))
+    return [_from_dict(_RESULT_TYPES[stage], item) for item in data]
+
+
+class CheckpointStore:
+    """Persists the output of every pipeline stage under the task's MinIO prefix."""
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.prefix = f"{task_id}/checkpoints/"
+
+    def _object_name(self, stage: TaskStage) -> str:
+        return f"{self.prefix}{stage.value}.json.gz"
+
+    def write(self, stage: TaskStage, results: list) -> str:
+        """
+        Store a stage's output.
+
+        Returns:
+            Object name the output was stored under
+        """
+        object_name = self._object_name(stage)
+        minio_service.upload_file_sync(
+            object_name,
+            serialize_results(results),
+            content_type="application/gzip",
+        )
+        return object_name
+
+    def save(self, stage: TaskStage, results: list) -> None:
+        """Save a stage's output, logging instead of failing when storage is unavailable."""
+        if not WatsonSettings.checkpoints_enabled:
+            return
+        try:
+            self.write(stage, results)
+        except Exception as e:
+            logger.warning(
+                f"Failed to save {stage.value} checkpoint for task {self.task_id}: {str(e)}"
+            )
+
+    def read(self, stage: TaskStage, object_name: str) -> list:
+        """Load a stage output stored under the given object name."""
+        return deserialize_results(stage, minio_service.download_file_sync(object_name))
+
+    def load(self, stage: TaskStage) -> list:
+        """Load a previously saved stage output."""
+        return self.read(stage, self._object_name(stage))
+
+    def latest(self) -> Optional[Tuple[TaskStage, list]]:
+        """
+        Find the most advanced checkpointed stage of the task.
+
+        Returns:
+            Tuple of the stage and its output, or None if nothing was checkpointed
+        """
+        if not WatsonSettings.checkpoints_enabled:
+            return None
+
+        for stage, _ in reversed(PIPELINE_STAGES):
+            try:
+                if not minio_service.file_exists_sync(self._object_name(stage)):
+                    continue
+                results = self.load(stage)
+            except Exception as e:
+                logger.warning(
+                    f"Failed to load {stage.value} checkpoint for task {self.task_id}: {str(e)}"
+                )
+                continue
+
+            logger.info(f"Resuming task {self.task_id} after stage {stage.value}")
+            return stage, results
+
+        return None
+
+    def clear(self) -> None:
+        """Remove every checkpoint of the task."""
+        try:
+            minio_service.delete_prefix_sync(self.prefix)
+        except Exception as e:
+            logger.warning(
+                f"Failed to clear checkpoints for task {self.task_id}: {str(e)}"
+            )
@@ -1,59 +1,145 @@
-import gc
-from typing import List
+import hashlib
+from typing import List, Optional
 
-import torch
 from api.core.logging import logger
 from api.core.settings import WatsonSettings
 from api.exceptions.watson_exceptions import ProcessingException
-from api.models.internal import EvidencePNGenerationResult
+from api.models.internal import Chunk, EvidencePNGenerationResult
+from api.services.postgres_service import get_cached_summaries, save_cached_summaries
+from api.worker.inference import (
+    GenerationParams,
+    InferenceBackend,
+    ModelRole,
+    get_backend,
+)
+from api.worker.metrics import record_summary_cache
 
+# Version of the summary prompt and sampling, bump it when changing either so
+# that cached summaries are not reused.
+SUMMARY_PROMPT_VERSION = 1
+
+
+def summary_text_hash(text: str) -> str:
+    """Hash of a chunk text with whitespace normalized."""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def _summary_cache_model() -> str:
+    model = WatsonSettings.cs_model
+    revision = WatsonSettings.model_revisions.get(model)
+    return f"{model}@{revision}" if revision else model
 
-class ChunkSummarizer:
-    def __init__(self, task_id: str):
-        from transformers import AutoTokenizer
-        from vllm import LLM, SamplingParams
 
+class ChunkSummarizer:
+    def __init__(self, task_id: str, backend: Optional[InferenceBackend] = None):
         logger.info("Initializing ChunkSummarizer")
         self.task_id = task_id
-        self.sampling_params = SamplingParams(
+        self.sampling_params = GenerationParams(
             temperature=0,
             max_tokens=128,
         )
-        self.llm = LLM(
-            model=WatsonSettings.cs_model,
-            tensor_parallel_size=WatsonSettings.tensor_parallel_size,
-            gpu_memory_utilization=WatsonSettings.gpu_memory_utilization,
-            enforce_eager=True,
-        )
-        self.tokenizer = AutoTokenizer.from_pretrained(WatsonSettings.cs_model)
-
-    def __del__(self):
-        if hasattr(self, "llm"):
-            self.llm.llm_engine.engine_core.shutdown()
-            del self.llm
-        gc.collect()
-        torch.cuda.empty_cache()
-        torch.cuda.synchronize()
-
-    def _prepare_prompts(self, nodes: List[EvidencePNGenerationResult]) -> list[str]:
-        prompts = []
-        for node in nodes:
-            for chunk in node.annotated_chunks:
-                messages = [
-                    {
-                        "role": "user",
-                        "content": f"""
+        self._backend = backend
+
+    @property
+    def backend(self) -> InferenceBackend:
+        # Loaded on first use, so a task served from the summary cache never loads it.
+        if self._backend is None:
+            self._backend = get_backend(ModelRole.summarization)
+        return self._backend
+
+    def _prompt(self, text: str) -> str:
+        messages = [
+            {
+                "role": "user",
+                "content": f"""
                         Summarize the following biomedical text in one sentence, focusing on the main finding or claim, while preserving scientific accuracy and avoiding unnecessary details.
-                        Text: {chunk.chunk.text}
+                        Text: {text}
                         """,
-                    },
-                ]
-                prompt = self.tokenizer.apply_chat_template(
-                    messages, tokenize=False, add_generation_prompt=True
-                )
-                prompts.append(prompt)
+            },
+        ]
+        return self.backend.render_chat(messages)
 
-        return prompts
+    def _prepare_prompts(self, nodes: List[EvidencePNGenerationResult]) -> list[str]:
+        return [
+            self._prompt(chunk.chunk.text)
+            for node in nodes
+            for chunk in node.annotated_chunks
+        ]
+
+    @staticmethod
+    def cached_summaries(text_hashes: List[str]) -> dict[str, str]:
+        """Cached summaries of the chunk texts with the given summary_text_hash."""
+        if not WatsonSettings.summary_cache_enabled:
+            return {}
+        try:
+            return get_cached_summaries(
+                _summary_cache_model(), SUMMARY_PROMPT_VERSION, list(set(text_hashes))
+            )
+        except Exception as e:
+            logger.warning(f"Summary cache lookup failed: {str(e)}")
+            return {}
+
+    @staticmethod
+    def _store_summaries(summaries: dict[str, str]) -> None:
+        if not WatsonSettings.summary_cache_enabled:
+            return
+        rows = [
+            {
+                "model": _summary_cache_model(),
+                "prompt_version": SUMMARY_PROMPT_VERSION,
+                "text_hash": text_hash,
+                "summary": summary,
+            }
+            for text_hash, summary in summaries.items()
+        ]
+        try:
+            save_cached_summaries(
+                rows,
+                WatsonSettings.summary_cache_max_entries,
+                WatsonSettings.summary_cache_max_age_days,
+            )
+        except Exception as e:
+            logger.warning(f"Summary cache store failed: {str(e)}")
+
+    def summarize(
+        self, chunks: List[Chunk], cached: Optional[dict[str, str]] = None
+    ) -> list[str]:
+        """
+        Summarize chunks, serving repeated texts from the summary cache.
+
+        Summaries are cached by summarization model, SUMMARY_PROMPT_VERSION and
+        hash of the whitespace-normalized chunk text. Only the chunks missing
+        from the cache are sent to the model, once per distinct text.
+
+        Args:
+            chunks: Chunks to summarize.
+            cached: Result of cached_summaries for the chunks, if already looked up.
+
+        Returns:
+            List of summaries, one per chunk.
+        """
+        text_hashes = [summary_text_hash(chunk.text) for chunk in chunks]
+        summaries = dict(
+            cached if cached is not None else self.cached_summaries(text_hashes)
+        )
+        hits = sum(1 for text_hash in text_hashes if text_hash in summaries)
+        record_summary_cache(hits)
+        logger.info(
+            f"Summary cache for task {self.task_id}: {hits} hits, {len(chunks) - hits} misses"
+        )
+
+        missing = {}
+        for chunk, text_hash in zip(chunks, text_hashes):
+            if text_hash not in summaries:
+                missing.setdefault(text_hash, chunk.text)
+        if missing:
+            prompts = [self._prompt(text) for text in missing.values()]
+            logger.info(f"Prepared {len(prompts)} prompts for chunks summarization")
+            generated = dict(zip(missing, self._run_inference(prompts)))
+            self._store_summaries(generated)
+            summaries.update(generated)
+
+        return [summaries[text_hash] for text_hash in text_hashes]
 
     def _run_inference(self, prompts: list[str]) -> list[str]:
         """
@@ -65,8 +151,8 @@ class ChunkSummarizer:
         Returns:
             List of generated responses from the LLM.
         """
-        outputs = self.llm.generate(prompts, self.sampling_params)
-        responses = [output.outputs[0].text for output in outputs]
+        outputs = self.backend.generate(prompts, self.sampling_params)
+        responses = [output.text for output in outputs]
         return responses
 
     def _match_responses_to_chunks(
@@ -93,11 +179,10 @@ class ChunkSummarizer:
             List of EvidencePNGenerationResult objects with chunks summarized.
         """
         try:
-            prompts = self._prepare_prompts(evidences)
-            logger.info(f"Prepared {len(prompts)} prompts for chunks summarization")
-
-            responses = self._run_inference(prompts)
-            logger.info(f"Received {len(responses)} responses from LLM")
+            responses = self.summarize(
+                [chunk.chunk for node in evidences for chunk in node.annotated_chunks]
+            )
+            logger.info(f"Received {len(responses)} summaries")
 
             evidence_results = self._match_responses_to_chunks(evidences, responses)
             logger.info("Matched responses to chunks successfully")
@@ -1,69 +1,222 @@
-import uuid
+import re
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Tuple
 
 from api.core.logging import logger
 from api.core.settings import WatsonSettings
 from api.exceptions.watson_exceptions import ChunkerException
-from api.models.internal import Chunk, ChunkingResult, PDFConversionResult
+from api.models.internal import (
+    Chunk,
+    ChunkingResult,
+    PDFConversionResult,
+    content_hash,
+    make_chunk_id,
+)
+
+PARAGRAPH_SEPARATOR = "## "
+# Phrases ending with a clause or sentence delimiter, or a lone delimiter.
+_PHRASE_REGEX = re.compile(r"[^,.;。？！]+[,.;。？！]?|[,.;。？！]")
+# Sentence end followed by whitespace; the whitespace stays with the sentence.
+_SENTENCE_END_REGEX = re.compile(r"[.!?][\"')\]]*\s+")
+_ABBREVIATIONS = frozenset(
+    ["al", "approx", "ca", "cf", "dr", "e.g", "eq", "fig", "figs", "i.e", "no"]
+    + ["ref", "refs", "resp", "sp", "spp", "tab", "vs", "vol"]
+)
+
+TokenCounter = Callable[[List[str]], List[int]]
+SentenceSplitter = Callable[[str], List[str]]
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Split text into sentences, keeping the whitespace after each sentence.
+
+    Sentence ends followed by a lowercase letter or preceded by a common
+    abbreviation are not treated as boundaries.
+    """
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END_REGEX.finditer(text):
+        end = match.end()
+        if end < len(text) and text[end].islower():
+            continue
+        words = text[start : match.start()].rsplit(None, 1)
+        if words and words[-1].lower().lstrip("([") in _ABBREVIATIONS:
+            continue
+        sentences.append(text[start:end])
+        start = end
+    if start < len(text):
+        sentences.append(text[start:])
+    return sentences
+
+
+def _split_keep_separator(text: str, separator: str) -> List[str]:
+    parts = text.split(separator)
+    return [s for s in [parts[0]] + [separator + s for s in parts[1:]] if s]
+
+
+def model_token_counter(model: str) -> TokenCounter:
+    """Count tokens with the tokenizer of the given model, a batch at a time."""
+    from api.worker.inference import load_tokenizer
+
+    tokenizer = load_tokenizer(model, WatsonSettings.model_revisions.get(model))
+
+    def count_tokens(texts: List[str]) -> List[int]:
+        encoded = tokenizer(texts, add_special_tokens=False)["input_ids"]
+        return [len(ids) for ids in encoded]
+
+    return count_tokens
+
+
+@dataclass
+class _Split:
+    text: str
+    token_size: int
+    is_sentence: bool
 
 
 class Chunker:
-    def __init__(self, task_id: str):
+    """
+    Token-aware chunker that packs sentences into chunks of at most chunk_size tokens.
+
+    Text is split by markdown section, then sentence, then phrase, word and
+    character until every piece fits, and the pieces are merged greedily
+    with a preference for whole sentences.
+    """
+
+    def __init__(
+        self,
+        task_id: str,
+        count_tokens: Optional[TokenCounter] = None,
+        sentence_splitter: SentenceSplitter = split_sentences,
+        chunk_size: int = WatsonSettings.chunk_size,
+        chunk_overlap: int = WatsonSettings.chunk_overlap,
+    ):
         self.task_id = task_id
+        self._count_tokens = count_tokens
+        self.sentence_splitter = sentence_splitter
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
 
-    @staticmethod
-    def _remove_white_characters(text: str) -> str:
-        """Removes all white characters from a text string."""
-        return text.replace("\n", " ").replace("\t", " ").replace("\r", " ")
+    @property
+    def count_tokens(self) -> TokenCounter:
+        if self._count_tokens is None:
+            self._count_tokens = model_token_counter(WatsonSettings.llm_model)
+        return self._count_tokens
 
     @staticmethod
-    def _remove_multiple_whitespaces(text: str) -> str:
-        """Removes multiple whitespaces from a text string."""
-        return " ".join(text.split())
+    def normalize(text: str) -> str:
+        """
+        Drop the references and everything before the keywords, then collapse whitespace.
 
-    @staticmethod
-    def _remove_references(text: str) -> str:
-        """Removes references from a text string."""
-        if "## references" in text.lower():
-            return text[: text.lower().rindex("references")]
-        return text
+        The references are cut at the last "references" if the text has a
+        "## References" section, the front matter up to the first "keywords".
+        """
+        lower = text.lower()
+        end = len(text)
+        if "## references" in lower:
+            end = lower.rindex("references")
+        start = lower.find("keywords", 0, end)
+        return " ".join(text[max(start, 0) : end].split())
+
+    def _split_once(self, text: str) -> Tuple[List[str], bool]:
+        for split in (
+            lambda t: _split_keep_separator(t, PARAGRAPH_SEPARATOR),
+            self.sentence_splitter,
+        ):
+            pieces = split(text)
+            if len(pieces) > 1:
+                return pieces, True
+
+        for split in (
+            _PHRASE_REGEX.findall,
+            lambda t: _split_keep_separator(t, " "),
+            list,
+        ):
+            pieces = split(text)
+            if len(pieces) > 1:
+                break
+        return pieces, False
+
+    def _split(self, text: str, token_size: int, chunk_size: int) -> Iterator[_Split]:
+        if token_size <= chunk_size:
+            yield _Split(text, token_size, is_sentence=True)
+            return
+
+        pieces, is_sentence = self._split_once(text)
+        if len(pieces) == 1:
+            raise ValueError("Single token exceeded chunk size")
+        for piece, size in zip(pieces, self.count_tokens(pieces)):
+            if size <= chunk_size:
+                yield _Split(piece, size, is_sentence)
+            else:
+                yield from self._split(piece, size, chunk_size)
+
+    def _merge(self, splits: Iterator[_Split], chunk_size: int) -> Iterator[str]:
+        chunk: List[_Split] = []
+        chunk_len = 0
+        new_chunk = True
+
+        for split in splits:
+            while True:
+                if chunk_len + split.token_size > chunk_size and not new_chunk:
+                    yield "".join(s.text for s in chunk)
+                    # Start the next chunk with the tail of this one as overlap.
+                    overlap = []
+                    chunk_len = 0
+                    for previous in reversed(chunk):
+                        if chunk_len + previous.token_size > self.chunk_overlap:
+                            break
+                        chunk_len += previous.token_size
+                        overlap.insert(0, previous)
+                    chunk = overlap
+                    new_chunk = True
+                    continue
+
+                if new_chunk:
+                    # Drop overlap until the split fits.
+                    while chunk and chunk_len + split.token_size > chunk_size:
+                        chunk_len -= chunk.pop(0).token_size
+                chunk.append(split)
+                chunk_len += split.token_size
+                new_chunk = False
+                break
+
+        if not new_chunk:
+            yield "".join(s.text for s in chunk)
+
+    def iter_chunks(self, text: str, chunk_size: Optional[int] = None) -> Iterator[str]:
+        """
+        Lazily chunk one normalized document.
 
-    @staticmethod
-    def _remove_keywords(text: str) -> str:
-        """Removes text up to keywords from a text string."""
-        if "keywords" in text.lower():
-            return text[text.lower().index("keywords") :]
-        return text
+        Args:
+            text: Normalized document text
+            chunk_size: Maximum chunk size in tokens, defaults to the chunker's
 
-    def _sentence_chunking(self, documents: list[PDFConversionResult]) -> list:
+        Returns:
+            Iterator over the stripped, non-empty chunk texts
         """
-        Perform sentence chunking on the documents using a sentence splitter.
-        This method splits documents into sentences based on the specified chunk size.
-        """
-        from llama_index.core import Document
-        from llama_index.core.node_parser import SentenceSplitter
-
-        logger.info("Starting sentence chunking for documents")
-        splitter = SentenceSplitter(
-            chunk_size=WatsonSettings.chunk_size,
-            chunk_overlap=WatsonSettings.chunk_overlap,
-            paragraph_separator="## ",
-        )
-
-        clean_documents = [self._remove_references(i.content) for i in documents]
-        clean_documents = [self._remove_keywords(i) for i in clean_documents]
-        clean_documents = [self._remove_white_characters(i) for i in clean_documents]
-        clean_documents = [
-            self._remove_multiple_whitespaces(i) for i in clean_documents
-        ]
-        documents = [
-            Document(text=text, metadata={"file_name": doc.file_name})
-            for text, doc in zip(clean_documents, documents)
-        ]
-
-        nodes = splitter.get_nodes_from_documents(documents)
-        logger.info(f"Generated {len(nodes)} nodes from documents")
-
-        return nodes
+        chunk_size = chunk_size or self.chunk_size
+        if not text:
+            return
+        splits = self._split(text, self.count_tokens([text])[0], chunk_size)
+        for chunk in self._merge(splits, chunk_size):
+            chunk = chunk.strip()
+            if chunk:
+                yield chunk
+
+    def iter_document_chunks(self, document: PDFConversionResult) -> Iterator[Chunk]:
+        """Lazily yield the chunks of a converted document, with content-derived IDs."""
+        scope = f"{self.task_id}/{document.file_name}"
+        file_hash = document.content_hash or content_hash(document.content)
+        chunking = f"{self.chunk_size}/{self.chunk_overlap}/{WatsonSettings.llm_model}"
+        for index, text in enumerate(
+            self.iter_chunks(self.normalize(document.content))
+        ):
+            yield Chunk(
+                id=make_chunk_id(scope, file_hash, chunking, index, text),
+                text=text,
+            )
 
     def chunk_documents(
         self, documents: list[PDFConversionResult]
@@ -72,19 +225,17 @@ class Chunker:
         Chunk the documents into smaller pieces for processing.
         """
         try:
-            nodes = self._sentence_chunking(documents)
-
+            logger.info("Starting sentence chunking for documents")
             result = {}
-            for node in nodes:
-                content = node.get_content()
-                content_id = str(uuid.uuid4())
-                file_name = node.metadata["file_name"]
-
-                if file_name not in result:
-                    result[file_name] = []
-
-                result[file_name].append(Chunk(id=content_id, text=content))
-
+            for document in documents:
+                if document.error:
+                    continue
+                for chunk in self.iter_document_chunks(document):
+                    result.setdefault(document.file_name, []).append(chunk)
+
+            logger.info(
+                f"Generated {sum(len(chunks) for chunks in result.values())} nodes from documents"
+            )
             return [
                 ChunkingResult(file_name=file_name, chunks=chunks)
                 for file_name, chunks in result.items()
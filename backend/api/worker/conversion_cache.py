@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import tempfile
+from importlib.metadata import PackageNotFoundError, version
+from typing import Optional, Protocol
+
+from api.core.logging import logger
+from api.core.settings import WatsonSettings
+from api.models.internal import PDFConversionResult
+
+
+def _docling_version() -> str:
+    try:
+        return version("docling")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def pipeline_fingerprint(converter, profile: str = "default") -> str:
+    """
+    Describe everything besides the PDF bytes that affects the converted markdown.
+
+    Args:
+        converter: DocumentConverter used for conversion
+        profile: Name of the conversion profile
+
+    Returns:
+        Fingerprint string of docling version and pipeline options
+    """
+    options = []
+    for input_format, format_option in sorted(
+        getattr(converter, "format_to_options", {}).items(), key=lambda x: str(x[0])
+    ):
+        pipeline_options = getattr(format_option, "pipeline_options", None)
+        if hasattr(pipeline_options, "model_dump_json"):
+            options.append(f"{input_format}={pipeline_options.model_dump_json()}")
+        else:
+            options.append(f"{input_format}={pipeline_options!r}")
+    return (
+        f"docling={_docling_version()};profile={profile};"
+        f"page_batch={WatsonSettings.pdf_page_batch_size};{';'.join(options)}"
+    )
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Hash a file in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(chunk_size), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def conversion_cache_key(pdf_hash: str, fingerprint: str) -> str:
+    """Content address of a conversion: hash of the PDF bytes and pipeline fingerprint."""
+    options_hash = hashlib.blake2b(
+        fingerprint.encode("utf-8"), digest_size=8
+    ).hexdigest()
+    return f"{pdf_hash}-{options_hash}"
+
+
+def _serialize(result: PDFConversionResult) -> bytes:
+    return json.dumps({"content": result.content, "pages": result.pages}).encode(
+        "utf-8"
+    )
+
+
+def _deserialize(file_name: str, payload: bytes) -> PDFConversionResult:
+    data = json.loads(payload.decode("utf-8"))
+    return PDFConversionResult(
+        file_name=file_name, content=data["content"], pages=data["pages"], cached=True
+    )
+
+
+class ConversionCache(Protocol):
+    def get(self, key: str, file_name: str) -> Optional[PDFConversionResult]: ...
+
+    def put(self, key: str, result: PDFConversionResult) -> None: ...
+
+
+class LocalConversionCache:
+    """
+    On-disk conversion cache with a size cap and least-recently-used eviction.
+
+    Access time is tracked through the files' modification time, which is
+    refreshed on every hit. Writes are atomic so several converter processes
+    can share the directory.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str, file_name: str) -> Optional[PDFConversionResult]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                payload = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return _deserialize(file_name, payload)
+
+    def put(self, key: str, result: PDFConversionResult) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(_serialize(result))
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class MinIOConversionCache:
+    """
+    Conversion cache shared by all workers through MinIO.
+
+    Object storage does not track reads, so entries beyond the size cap are
+    evicted oldest-written first.
+    """
+
+    def __init__(self, prefix: str, max_bytes: int):
+        from api.services.minio_service import minio_service
+
+        self.minio = minio_service
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+
+    def _object_name(self, key: str) -> str:
+        return f"{self.prefix}{key}.json"
+
+    def get(self, key: str, file_name: str) -> Optional[PDFConversionResult]:
+        object_name = self._object_name(key)
+        if not self.minio.file_exists_sync(object_name):
+            return None
+        return _deserialize(file_name, self.minio.download_file_sync(object_name))
+
+    def put(self, key: str, result: PDFConversionResult) -> None:
+        self.minio.upload_file_sync(
+            self._object_name(key), _serialize(result), content_type="application/json"
+        )
+        objects = sorted(
+            self.minio.client.list_objects(
+                self.minio.bucket, prefix=self.prefix, recursive=True
+            ),
+            key=lambda obj: obj.last_modified,
+        )
+        total = sum(obj.size for obj in objects)
+        for obj in objects:
+            if total <= self.max_bytes:
+                break
+            self.minio.client.remove_object(self.minio.bucket, obj.object_name)
+            total -= obj.size
+
+
+def get_conversion_cache() -> Optional[ConversionCache]:
+    """Build the conversion cache configured by WatsonSettings.conversion_cache."""
+    try:
+        if WatsonSettings.conversion_cache == "local":
+            return LocalConversionCache(
+                WatsonSettings.conversion_cache_dir,
+                WatsonSettings.conversion_cache_max_bytes,
+            )
+        if WatsonSettings.conversion_cache == "minio":
+            return MinIOConversionCache(
+                "conversion-cache/", WatsonSettings.conversion_cache_max_bytes
+            )
+    except Exception as e:
+        logger.warning(f"Conversion cache unavailable: {str(e)}")
+    return None
@@ -0,0 +1,225 @@
+import hashlib
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from api.core.settings import WatsonSettings
+from api.models.internal import (
+    Chunk,
+    ChunkingResult,
+    EvidencePNChunk,
+    EvidencePNGenerationResult,
+    make_relation_id,
+)
+from api.worker.evidence_alignment import align_evidence
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+@dataclass
+class ChunkClusters:
+    """Chunks of a task grouped with the representative chunk they duplicate."""
+
+    representatives: List[ChunkingResult]
+    # Duplicate chunk id -> id of its representative chunk.
+    duplicates: Dict[str, str] = field(default_factory=dict)
+    chunks: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+
+    @property
+    def duplicate_rate(self) -> float:
+        return len(self.duplicates) / self.chunks if self.chunks else 0.0
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _shingle_hashes(text: str, size: int) -> np.ndarray:
+    words = text.split()
+    shingles = {
+        " ".join(words[i : i + size]) for i in range(max(len(words) - size + 1, 0))
+    }
+    return np.array(
+        [
+            int.from_bytes(
+                hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "big"
+            )
+            for s in shingles
+        ],
+        dtype=np.uint64,
+    )
+
+
+class ChunkDeduplicator:
+    """
+    Find exact and near-duplicate chunks with content hashes and MinHash LSH.
+
+    Chunks are visited in order and each one is compared only against earlier
+    representatives, so every duplicate maps directly to a chunk that is
+    processed and similarity does not chain through intermediate chunks.
+    """
+
+    def __init__(
+        self,
+        threshold: float = WatsonSettings.dedup_similarity_threshold,
+        num_perm: int = WatsonSettings.dedup_num_perm,
+        bands: int = WatsonSettings.dedup_bands,
+        shingle_size: int = WatsonSettings.dedup_shingle_size,
+    ):
+        if num_perm % bands:
+            raise ValueError("dedup_num_perm must be a multiple of dedup_bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(1)
+        self._a = rng.integers(1, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+
+    def _minhash(self, text: str) -> Optional[np.ndarray]:
+        hashes = _shingle_hashes(text, self.shingle_size)
+        if hashes.size == 0:
+            return None
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME
+        return (permuted & _MAX_HASH).min(axis=0)
+
+    def deduplicate(self, results: List[ChunkingResult]) -> ChunkClusters:
+        """
+        Group the chunks of a task into clusters of duplicates.
+
+        Args:
+            results: Chunked documents of one task
+
+        Returns:
+            ChunkClusters with the representative chunks in their original
+            order; files left without representatives are dropped
+        """
+        clusters = ChunkClusters(representatives=[])
+        exact: Dict[str, str] = {}
+        signatures: Dict[str, np.ndarray] = {}
+        buckets: Dict[Tuple[int, bytes], List[str]] = {}
+
+        for result in results:
+            representatives = []
+            for chunk in result.chunks:
+                clusters.chunks += 1
+                text = _normalize(chunk.text)
+                digest = hashlib.blake2b(text.encode("utf-8")).hexdigest()
+                if digest in exact:
+                    clusters.duplicates[chunk.id] = exact[digest]
+                    clusters.exact_duplicates += 1
+                    continue
+
+                signature = self._minhash(text)
+                bands = []
+                if signature is not None:
+                    bands = [
+                        (band, signature[band * self.rows : (band + 1) * self.rows])
+                        for band in range(self.bands)
+                    ]
+                    match = self._find_similar(signature, bands, buckets, signatures)
+                    if match is not None:
+                        clusters.duplicates[chunk.id] = match
+                        clusters.near_duplicates += 1
+                        continue
+                    signatures[chunk.id] = signature
+                    for band, rows in bands:
+                        buckets.setdefault((band, rows.tobytes()), []).append(chunk.id)
+
+                exact[digest] = chunk.id
+                representatives.append(chunk)
+
+            if representatives:
+                clusters.representatives.append(
+                    ChunkingResult(file_name=result.file_name, chunks=representatives)
+                )
+
+        return clusters
+
+    def _find_similar(self, signature, bands, buckets, signatures) -> Optional[str]:
+        seen = set()
+        for band, rows in bands:
+            for candidate in buckets.get((band, rows.tobytes()), []):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                similarity = np.mean(signatures[candidate] == signature)
+                if similarity >= self.threshold:
+                    return candidate
+        return None
+
+
+def fan_out(
+    chunking: List[ChunkingResult],
+    results: List[EvidencePNGenerationResult],
+    clusters: ChunkClusters,
+) -> Tuple[List[EvidencePNGenerationResult], int]:
+    """
+    Copy the results of every representative chunk to its duplicates.
+
+    Copied relations get IDs derived from the duplicate chunk they belong to.
+
+    Args:
+        chunking: Chunked documents of the task, including duplicates
+        results: Processed representative chunks
+        clusters: Clusters the representatives were selected from
+
+    Returns:
+        Tuple of results for every chunk of every file, in chunking order, and
+        the number of model prompts saved by not processing the duplicates
+    """
+    processed: Dict[str, EvidencePNChunk] = {
+        annotated.chunk.id: annotated
+        for result in results
+        for annotated in result.annotated_chunks
+    }
+
+    prompts_saved = 0
+    fanned_out = []
+    for result in chunking:
+        annotated_chunks = []
+        for chunk in result.chunks:
+            source = processed.get(clusters.duplicates.get(chunk.id, chunk.id))
+            if chunk.id not in clusters.duplicates:
+                if source is not None:
+                    annotated_chunks.append(source)
+                continue
+
+            # Relation extraction is saved for every duplicate; chunks without
+            # relations are dropped by the evidence stage and never summarized.
+            prompts_saved += 1
+            if source is None:
+                continue
+            relations = []
+            for position, relation in enumerate(source.annotated_relations or []):
+                # Near duplicates differ in places, so spans are found in their own text.
+                span = align_evidence(chunk.text, relation.evidence) or (None, None)
+                relations.append(
+                    replace(
+                        relation,
+                        id=make_relation_id(chunk.id, position, relation.relation),
+                        evidence_start=span[0],
+                        evidence_end=span[1],
+                    )
+                )
+            annotated_chunks.append(
+                EvidencePNChunk(
+                    chunk=Chunk(
+                        id=chunk.id, text=chunk.text, summary=source.chunk.summary
+                    ),
+                    annotated_relations=relations,
+                )
+            )
+            # Summary per chunk, evidence and embedding per relation.
+            prompts_saved += 1 + 2 * len(relations)
+
+        fanned_out.append(
+            EvidencePNGenerationResult(
+                file_name=result.file_name, annotated_chunks=annotated_chunks
+            )
+        )
+
+    return fanned_out, prompts_saved
@@ -1,36 +1,20 @@
-import gc
-from typing import List
+from typing import List, Optional
 
-import torch
 from api.core.logging import logger
-from api.core.settings import WatsonSettings
 from api.exceptions.watson_exceptions import ProcessingException
 from api.models.internal import EvidencePNGenerationResult
+from api.worker.inference import InferenceBackend, ModelRole, get_backend
 
 
 class EmbeddingsWorker:
-    def __init__(self, task_id: str):
-        from vllm import LLM
-
+    def __init__(self, task_id: str, backend: Optional[InferenceBackend] = None):
         self.task_id = task_id
-        self.embedding_model = LLM(
-            model=WatsonSettings.embedding_model,
-            enforce_eager=True,
-            gpu_memory_utilization=WatsonSettings.gpu_memory_utilization,
-        )
+        self.backend = backend or get_backend(ModelRole.embedding)
 
         self.embedding_instruction = (
             "Given a relation retrieve relevant relations that match the query"
         )
 
-    def __del__(self):
-        if hasattr(self, "embedding_model"):
-            self.embedding_model.llm_engine.engine_core.shutdown()
-            del self.embedding_model
-        gc.collect()
-        torch.cuda.empty_cache()
-        torch.cuda.synchronize()
-
     def _extract_relations(
         self, annotated_data: List[EvidencePNGenerationResult]
     ) -> List[str]:
@@ -52,10 +36,7 @@ class EmbeddingsWorker:
         detailed_relations = [
             self._get_detailed_instruct(relation) for relation in relations
         ]
-        outputs = self.embedding_model.embed(detailed_relations)
-        embeddings = [output.outputs.embedding for output in outputs]
-
-        return embeddings
+        return self.backend.embed(detailed_relations)
 
     def _match_embeddings_to_relations(
         self,
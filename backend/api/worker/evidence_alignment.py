@@ -0,0 +1,133 @@
+import re
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import FrozenSet, List, Optional, Tuple
+
+from api.core.settings import WatsonSettings
+from api.worker.chunker import split_sentences
+
+Span = Tuple[int, int]
+
+# Quotes and ellipses models wrap around text copied from the source.
+_WRAPPING = "\"'“”‘’…. "
+
+_WORD = re.compile(r"\w+")
+_NON_SPACE = re.compile(r"\S+")
+
+
+def sentence_spans(text: str) -> List[Span]:
+    """Character spans of the sentences of a text, without surrounding whitespace."""
+    spans = []
+    start = 0
+    for sentence in split_sentences(text):
+        stripped = sentence.strip()
+        if stripped:
+            offset = start + len(sentence) - len(sentence.lstrip())
+            spans.append((offset, offset + len(stripped)))
+        start += len(sentence)
+    return spans
+
+
+def _normalize(text: str) -> Tuple[str, List[int]]:
+    """Lowercase text with whitespace runs collapsed, and the source index of each character."""
+    words = []
+    positions: List[int] = []
+    for match in _NON_SPACE.finditer(text):
+        if words:
+            # The collapsed space stands for the first character of the run.
+            positions.append(positions[-1] + 1)
+        words.append(match.group().lower())
+        positions.extend(range(match.start(), match.end()))
+    return " ".join(words), positions
+
+
+@lru_cache(maxsize=1024)
+def _index(text: str) -> Tuple[str, List[int], List[Span], List[FrozenSet[str]]]:
+    """
+    Normalized chunk text and its sentences, shared by the relations of a chunk.
+
+    Returns:
+        Tuple of (normalized text, source index of each of its characters,
+        sentence spans, lowercase words of each sentence)
+    """
+    haystack, positions = _normalize(text)
+    spans = sentence_spans(text)
+    words = [frozenset(_WORD.findall(text[start:end].lower())) for start, end in spans]
+    return haystack, positions, spans, words
+
+
+def align_evidence(
+    text: str,
+    evidence: Optional[str],
+    min_ratio: float = WatsonSettings.be_alignment_min_ratio,
+    max_sentences: int = 3,
+) -> Optional[Span]:
+    """
+    Find the span of a chunk text that generated evidence was taken from.
+
+    Exact matches are tried first, then matches ignoring case and whitespace.
+    Otherwise the evidence is compared with the runs of up to max_sentences
+    consecutive sentences around the sentences sharing the most words with
+    it, and the most similar run is taken when its similarity ratio is at
+    least min_ratio.
+
+    Args:
+        text: Chunk text
+        evidence: Evidence generated for a relation of the chunk
+
+    Returns:
+        Start and end character offsets into text, or None if nothing matches
+    """
+    if not evidence or not evidence.strip():
+        return None
+
+    stripped = evidence.strip()
+    start = text.find(stripped)
+    if start >= 0:
+        return start, start + len(stripped)
+
+    haystack, positions, spans, sentence_words = _index(text)
+    for candidate in (stripped, stripped.strip(_WRAPPING)):
+        needle, _ = _normalize(candidate)
+        start = haystack.find(needle) if needle else -1
+        if start >= 0:
+            return positions[start], positions[start + len(needle) - 1] + 1
+    if not needle:
+        return None
+
+    words = set(_WORD.findall(needle))
+    overlaps = [len(words & candidate) for candidate in sentence_words]
+    most = max(overlaps, default=0)
+    if not most:
+        return None
+
+    # Only runs containing a sentence with the most shared words are compared.
+    anchors = {anchor for anchor, overlap in enumerate(overlaps) if overlap == most}
+    firsts = sorted(
+        {
+            first
+            for anchor in anchors
+            for first in range(max(0, anchor - max_sentences + 1), anchor + 1)
+        }
+    )
+
+    # The matcher indexes the evidence once and is compared with every run.
+    matcher = SequenceMatcher(None, b=needle, autojunk=False)
+    best: Optional[Span] = None
+    best_ratio = 0.0
+    for first in firsts:
+        for last in range(first, min(first + max_sentences, len(spans))):
+            if not anchors.intersection(range(first, last + 1)):
+                continue
+            span = (spans[first][0], spans[last][1])
+            matcher.set_seq1(_normalize(text[span[0] : span[1]])[0])
+            threshold = max(best_ratio, min_ratio)
+            if (
+                matcher.real_quick_ratio() < threshold
+                or matcher.quick_ratio() < threshold
+            ):
+                continue
+            ratio = matcher.ratio()
+            if ratio >= threshold and (best is None or ratio > best_ratio):
+                best, best_ratio = span, ratio
+    return best
@@ -1,7 +1,7 @@
-import gc
-from typing import List
+import re
+from dataclasses import replace
+from typing import List, Optional
 
-import torch
 from api.core.logging import logger
 from api.core.settings import WatsonSettings
 from api.exceptions.watson_exceptions import ProcessingException
@@ -11,76 +11,274 @@ from api.models.internal import (
     EvidencePNRelation,
     PNGenerationResult,
 )
+from api.worker.evidence_alignment import align_evidence, sentence_spans
+from api.worker.inference import (
+    GenerationParams,
+    InferenceBackend,
+    ModelRole,
+    get_backend,
+)
+from api.worker.lexical_evidence import LexicalEvidenceMatcher
+from api.worker.metrics import record_lexical_evidence
 
+# Placeholder for the question when rendering the chunk's shared prompt prefix.
+_QUESTION_SLOT = "\x00question\x00"
+# Start of an answer in the numbered format of the batched mode, e.g. "3. ...".
+_NUMBERED_ANSWER = re.compile(r"^\s*(\d+)[.):]\s*(.*)$")
+_SENTENCE_INDEX = re.compile(r"\d+")
+
+EVIDENCE_MODES = ("single", "batched")
+EVIDENCE_FORMATS = ("text", "sentence_index")
 
-class EvidenceFinder:
-    def __init__(self, task_id: str):
-        from transformers import AutoTokenizer
-        from vllm import LLM, SamplingParams
 
+class EvidenceFinder:
+    def __init__(
+        self,
+        task_id: str,
+        backend: Optional[InferenceBackend] = None,
+        mode: Optional[str] = None,
+        evidence_format: Optional[str] = None,
+    ):
         logger.info("Initializing EvidenceFinder")
         self.task_id = task_id
-        self.sampling_params = SamplingParams(
-            temperature=0,
-            max_tokens=WatsonSettings.chunk_size,
+        self.mode = mode or WatsonSettings.be_mode
+        if self.mode not in EVIDENCE_MODES:
+            raise ValueError(f"Unknown evidence mode {self.mode}")
+        self.evidence_format = evidence_format or WatsonSettings.be_evidence_format
+        if self.evidence_format not in EVIDENCE_FORMATS:
+            raise ValueError(f"Unknown evidence format {self.evidence_format}")
+        self.indexed = self.evidence_format == "sentence_index"
+        self.answer_tokens = (
+            WatsonSettings.be_index_tokens
+            if self.indexed
+            else WatsonSettings.be_tokens_per_relation
         )
-        self.llm = LLM(
-            model=WatsonSettings.be_model,
-            tensor_parallel_size=WatsonSettings.tensor_parallel_size,
-            gpu_memory_utilization=WatsonSettings.gpu_memory_utilization,
-            enforce_eager=True,
+        self.sampling_params = GenerationParams(
+            temperature=0,
+            max_tokens=WatsonSettings.be_index_tokens
+            if self.indexed
+            else WatsonSettings.chunk_size,
         )
-        self.tokenizer = AutoTokenizer.from_pretrained(WatsonSettings.be_model)
+        self.backend = backend or get_backend(ModelRole.evidence)
 
-    def __del__(self):
-        if hasattr(self, "llm"):
-            self.llm.llm_engine.engine_core.shutdown()
-            del self.llm
-        gc.collect()
-        torch.cuda.empty_cache()
-        torch.cuda.synchronize()
+    def _render_template(self, text: str) -> tuple[str, str]:
+        """Render the conversation about a chunk once, split around the question."""
+        if self.indexed:
+            text = "\n".join(
+                f"[{number}] {text[start:end]}"
+                for number, (start, end) in enumerate(sentence_spans(text), 1)
+            )
+        messages = [
+            {
+                "role": "user",
+                "content": text,
+            },
+            {
+                "role": "assistant",
+                "content": "I read the text.",
+            },
+            {
+                "role": "user",
+                "content": _QUESTION_SLOT,
+            },
+        ]
+        prefix, suffix = self.backend.render_chat(messages).split(_QUESTION_SLOT)
+        return prefix, suffix
+
+    def _question(self, relation: str) -> str:
+        if self.indexed:
+            return (
+                f"Which numbered sentence of the text supports {relation}? "
+                "Answer with the sentence number only."
+            )
+        return f"Which part of the text supports {relation}?"
 
     def _prepare_prompts(self, nodes: List[PNGenerationResult]) -> list[str]:
+        """
+        Build one prompt per relation, grouped by chunk.
+
+        All prompts of a chunk start with the same rendered chunk prefix, byte
+        for byte, so the engine's prefix cache computes it once.
+        """
         prompts = []
         for node in nodes:
             for chunk in node.annotated_chunks:
                 if not chunk.relations:
                     continue
 
+                prefix, suffix = self._render_template(chunk.chunk.text)
                 for relation in chunk.relations:
-                    messages = [
-                        {
-                            "role": "user",
-                            "content": chunk.chunk.text,
-                        },
-                        {
-                            "role": "assistant",
-                            "content": "I read the text.",
-                        },
-                        {
-                            "role": "user",
-                            "content": f"Which part of the text supports {relation.relation}?",
-                        },
-                    ]
-                    prompt = self.tokenizer.apply_chat_template(
-                        messages, tokenize=False, add_generation_prompt=True
+                    prompts.append(
+                        f"{prefix}{self._question(relation.relation)}{suffix}"
                     )
-                    prompts.append(prompt)
 
         return prompts
 
-    def _run_inference(self, prompts: list[str]) -> list[str]:
+    def _batched_question(self, relations: List[str]) -> str:
+        numbered = "\n".join(
+            f"{number}. {relation}" for number, relation in enumerate(relations, 1)
+        )
+        if self.indexed:
+            return (
+                "Which numbered sentence of the text supports each of the following "
+                "relations? Answer with one line per relation, starting with its "
+                "number followed by the sentence number only.\n"
+                f"{numbered}"
+            )
+        return (
+            "Which part of the text supports each of the following relations? "
+            "Answer with one line per relation, starting with its number.\n"
+            f"{numbered}"
+        )
+
+    def _prepare_batched_prompts(self, nodes: List[PNGenerationResult]) -> list[str]:
+        """Build one prompt per chunk asking for the evidence of all its relations."""
+        prompts = []
+        for node in nodes:
+            for chunk in node.annotated_chunks:
+                if not chunk.relations:
+                    continue
+
+                prefix, suffix = self._render_template(chunk.chunk.text)
+                question = self._batched_question(
+                    [relation.relation for relation in chunk.relations]
+                )
+                prompts.append(f"{prefix}{question}{suffix}")
+
+        return prompts
+
+    @staticmethod
+    def _parse_numbered_answers(response: str, count: int) -> list[Optional[str]]:
+        """
+        Split a numbered answer into the answers for relations 1 to count.
+
+        Lines without a number continue the previous answer. Missing, empty or
+        out of range answers are None.
+        """
+        answers: list[Optional[str]] = [None] * count
+        current = None
+        for line in response.splitlines():
+            match = _NUMBERED_ANSWER.match(line)
+            if match:
+                number = int(match.group(1))
+                current = number - 1 if 0 < number <= count else None
+                if current is not None:
+                    answers[current] = match.group(2).strip()
+            elif current is not None and line.strip():
+                answers[current] = f"{answers[current]} {line.strip()}".strip()
+        return [answer or None for answer in answers]
+
+    def _run_batched(self, nodes: List[PNGenerationResult]) -> list[str]:
+        """
+        Find evidence with one prompt per chunk, in the order of _prepare_prompts.
+
+        Relations whose answer is missing or unparseable, including the last
+        answer of a truncated response, are asked again with single-relation
+        prompts.
+
+        Returns:
+            List of responses, one per relation
+        """
+        chunks = [
+            chunk
+            for node in nodes
+            for chunk in node.annotated_chunks
+            if chunk.relations
+        ]
+        prompts = self._prepare_batched_prompts(nodes)
+        outputs = self.backend.generate(
+            prompts,
+            [
+                replace(
+                    self.sampling_params,
+                    max_tokens=self.answer_tokens * len(chunk.relations),
+                )
+                for chunk in chunks
+            ],
+        )
+
+        responses: list[Optional[str]] = []
+        fallback_prompts = []
+        fallback_indices = []
+        fallback_groups = []
+        for chunk, output in zip(chunks, outputs):
+            answers = self._parse_numbered_answers(output.text, len(chunk.relations))
+            if output.finish_reason == "length":
+                answered = [i for i, answer in enumerate(answers) if answer]
+                if answered:
+                    answers[answered[-1]] = None
+
+            missing = [i for i, answer in enumerate(answers) if answer is None]
+            if missing:
+                prefix, suffix = self._render_template(chunk.chunk.text)
+                for i in missing:
+                    fallback_indices.append(len(responses) + i)
+                    fallback_prompts.append(
+                        f"{prefix}{self._question(chunk.relations[i].relation)}{suffix}"
+                    )
+                fallback_groups.append(len(missing))
+            responses.extend(answers)
+
+        if fallback_prompts:
+            logger.info(
+                f"Falling back to single-relation prompts for {len(fallback_prompts)} of {len(responses)} relations"
+            )
+            fallback = self._run_inference(fallback_prompts, fallback_groups)
+            for i, response in zip(fallback_indices, fallback):
+                responses[i] = response
+
+        return responses
+
+    @staticmethod
+    def _group_sizes(nodes: List[PNGenerationResult]) -> list[int]:
+        """Number of consecutive prompts sharing each chunk's prefix."""
+        return [
+            len(chunk.relations)
+            for node in nodes
+            for chunk in node.annotated_chunks
+            if chunk.relations
+        ]
+
+    def _run_inference(
+        self, prompts: list[str], group_sizes: Optional[list[int]] = None
+    ) -> list[str]:
         """
         Run inference on the LLM with the provided prompts.
 
+        With prefix caching, the first prompt of every chunk group is submitted
+        before the others, so the rest of the group hits the cached chunk prefix
+        instead of prefilling it concurrently in the same scheduling step.
+
         Args:
             prompts: List of prompts to process.
+            group_sizes: Sizes of the groups of consecutive prompts sharing a prefix.
 
         Returns:
             List of generated responses from the LLM.
         """
-        outputs = self.llm.generate(prompts, self.sampling_params)
-        responses = [output.outputs[0].text for output in outputs]
+        if (
+            not WatsonSettings.be_enable_prefix_caching
+            or not group_sizes
+            or max(group_sizes) <= 1
+        ):
+            outputs = self.backend.generate(prompts, self.sampling_params)
+            return [output.text for output in outputs]
+
+        leaders = []
+        start = 0
+        for size in group_sizes:
+            leaders.append(start)
+            start += size
+        leader_set = set(leaders)
+        followers = [i for i in range(len(prompts)) if i not in leader_set]
+
+        responses = [""] * len(prompts)
+        for wave in (leaders, followers):
+            outputs = self.backend.generate(
+                [prompts[i] for i in wave], self.sampling_params
+            )
+            for i, output in zip(wave, outputs):
+                responses[i] = output.text
         return responses
 
     def _match_responses_to_relations(
@@ -98,13 +296,17 @@ class EvidenceFinder:
                 for relation in chunk.relations:
                     response = responses[response_idx]
                     response_idx += 1
+                    evidence = response.strip() if response.strip() else None
+                    span = align_evidence(chunk.chunk.text, evidence) or (None, None)
                     evidence_relation = EvidencePNRelation(
                         id=relation.id,
                         relation=relation.relation,
                         substrates=relation.substrates,
                         modifiers=relation.modifiers,
                         products=relation.products,
-                        evidence=response.strip() if response.strip() else None,
+                        evidence=evidence,
+                        evidence_start=span[0],
+                        evidence_end=span[1],
                     )
 
                     annotated_relations.append(evidence_relation)
@@ -122,6 +324,88 @@ class EvidenceFinder:
             )
         return results_with_evidence
 
+    @staticmethod
+    def _unresolved(
+        nodes: List[PNGenerationResult], evidence: List[Optional[str]]
+    ) -> List[PNGenerationResult]:
+        """Copy the nodes keeping only the relations without evidence."""
+        index = 0
+        unresolved = []
+        for node in nodes:
+            annotated_chunks = []
+            for chunk in node.annotated_chunks:
+                relations = []
+                for relation in chunk.relations or []:
+                    if evidence[index] is None:
+                        relations.append(relation)
+                    index += 1
+                annotated_chunks.append(replace(chunk, relations=relations))
+            unresolved.append(replace(node, annotated_chunks=annotated_chunks))
+        return unresolved
+
+    @staticmethod
+    def _indexed_sentences(
+        nodes: List[PNGenerationResult], responses: List[str]
+    ) -> List[str]:
+        """Replace sentence number answers with the sentences, empty if invalid."""
+        sentences = []
+        answers = iter(responses)
+        for node in nodes:
+            for chunk in node.annotated_chunks:
+                if not chunk.relations:
+                    continue
+
+                spans = sentence_spans(chunk.chunk.text)
+                for _ in chunk.relations:
+                    match = _SENTENCE_INDEX.search(next(answers) or "")
+                    number = int(match.group()) if match else 0
+                    if 0 < number <= len(spans):
+                        start, end = spans[number - 1]
+                        sentences.append(chunk.chunk.text[start:end])
+                    else:
+                        sentences.append("")
+        return sentences
+
+    def _run_model(self, nodes: List[PNGenerationResult]) -> List[str]:
+        """Ask the model for the evidence of every relation of the nodes."""
+        if self.mode == "batched":
+            responses = self._run_batched(nodes)
+        else:
+            prompts = self._prepare_prompts(nodes)
+            logger.info(f"Prepared {len(prompts)} prompts for evidence finding")
+            responses = self._run_inference(prompts, self._group_sizes(nodes))
+
+        if self.indexed:
+            return self._indexed_sentences(nodes, responses)
+        return responses
+
+    def _find_responses(self, nodes: List[PNGenerationResult]) -> List[str]:
+        """
+        Find the evidence of every relation, in chunk and relation order.
+
+        With WatsonSettings.be_lexical_enabled, relations with an unambiguous
+        BM25 match in their chunk take that sentence and only the rest are sent
+        to the model.
+        """
+        if not WatsonSettings.be_lexical_enabled:
+            return self._run_model(nodes)
+
+        evidence = LexicalEvidenceMatcher().resolve(nodes)
+        resolved = sum(1 for sentence in evidence if sentence is not None)
+        record_lexical_evidence(resolved)
+        logger.info(
+            f"Resolved {resolved} of {len(evidence)} relations of task {self.task_id} "
+            f"({resolved / max(len(evidence), 1):.1%}) without the model"
+        )
+        if resolved == len(evidence):
+            return evidence
+
+        responses = iter(self._run_model(self._unresolved(nodes, evidence)))
+        return [
+            sentence if sentence is not None else next(responses)
+            for sentence in evidence
+        ]
+
     def find_evidence(
         self, pn_generation_results: List[PNGenerationResult]
     ) -> List[EvidencePNGenerationResult]:
@@ -135,10 +419,7 @@ class EvidenceFinder:
             List of EvidencePNGenerationResult objects with evidence annotations.
         """
         try:
-            prompts = self._prepare_prompts(pn_generation_results)
-            logger.info(f"Prepared {len(prompts)} prompts for evidence finding")
-
-            responses = self._run_inference(prompts)
+            responses = self._find_responses(pn_generation_results)
             logger.info(f"Received {len(responses)} responses from LLM")
 
             evidence_results = self._match_responses_to_relations(
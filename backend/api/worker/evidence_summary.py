@@ -0,0 +1,118 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from api.core.logging import logger
+from api.exceptions.watson_exceptions import ProcessingException
+from api.models.internal import EvidencePNGenerationResult, PNGenerationResult
+from api.worker.chunk_summarizer import ChunkSummarizer, summary_text_hash
+from api.worker.evidence_finder import EvidenceFinder
+from api.worker.inference import (
+    InferenceBackend,
+    ModelRole,
+    get_coresident_backends,
+)
+from api.worker.metrics import collect_usage, merge_usage
+
+
+class EvidenceSummaryStage:
+    """
+    Evidence finding and chunk summarization run as one stage.
+
+    Both only need the relation extraction output: evidence is found for every
+    relation and the chunks with relations are summarized. Their engines are
+    loaded side by side, sharing WatsonSettings.fused_gpu_memory_utilization,
+    and the requests of both are submitted concurrently from two threads.
+    When every summary is cached, only the evidence engine is loaded, still
+    with its share of the split.
+    """
+
+    def __init__(
+        self,
+        task_id: str,
+        evidence_backend: Optional[InferenceBackend] = None,
+        summary_backend: Optional[InferenceBackend] = None,
+    ):
+        logger.info("Initializing EvidenceSummaryStage")
+        self.task_id = task_id
+        self.evidence_backend = evidence_backend
+        self.summary_backend = summary_backend
+
+    def _backends(self, summarize: bool) -> tuple[InferenceBackend, InferenceBackend]:
+        roles = []
+        if self.evidence_backend is None:
+            roles.append(ModelRole.evidence)
+        if summarize and self.summary_backend is None:
+            roles.append(ModelRole.summarization)
+
+        # The split is the same whichever engines are missing, so an engine
+        # loaded for an earlier task is found in the pool with its share.
+        backends = (
+            get_coresident_backends(
+                roles, sharing=[ModelRole.evidence, ModelRole.summarization]
+            )
+            if roles
+            else {}
+        )
+        return (
+            self.evidence_backend or backends[ModelRole.evidence],
+            self.summary_backend or backends.get(ModelRole.summarization),
+        )
+
+    def run(
+        self, pn_generation_results: List[PNGenerationResult]
+    ) -> List[EvidencePNGenerationResult]:
+        """
+        Find evidence for the relations and summarize the chunks with relations.
+
+        Args:
+            pn_generation_results: List of PNGenerationResult objects.
+
+        Returns:
+            List of EvidencePNGenerationResult objects with evidence annotations
+            and chunk summaries.
+        """
+        try:
+            chunks = [
+                chunk.chunk
+                for node in pn_generation_results
+                for chunk in node.annotated_chunks
+                if chunk.relations
+            ]
+            text_hashes = [summary_text_hash(chunk.text) for chunk in chunks]
+            cached = ChunkSummarizer.cached_summaries(text_hashes)
+            summarize = any(text_hash not in cached for text_hash in text_hashes)
+
+            evidence_backend, summary_backend = self._backends(summarize)
+            finder = EvidenceFinder(self.task_id, backend=evidence_backend)
+            summarizer = ChunkSummarizer(self.task_id, backend=summary_backend)
+
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                evidence = executor.submit(
+                    collect_usage, lambda: finder.find_evidence(pn_generation_results)
+                )
+                summaries = executor.submit(
+                    collect_usage, lambda: summarizer.summarize(chunks, cached)
+                )
+                results, evidence_usage = evidence.result()
+                texts, summary_usage = summaries.result()
+            merge_usage(evidence_usage)
+            merge_usage(summary_usage)
+
+            # Matched by text, like the summary cache, not by position.
+            summaries = dict(zip(text_hashes, texts, strict=True))
+            summarized = [chunk for node in results for chunk in node.annotated_chunks]
+            for chunk in summarized:
+                chunk.chunk.summary = summaries[summary_text_hash(chunk.chunk.text)]
+            logger.info(
+                f"Found evidence for {sum(len(c.annotated_relations or []) for c in summarized)} relations "
+                f"and summarized {len(texts)} chunks concurrently"
+            )
+
+            return results
+        except Exception as e:
+            logger.error(
+                f"Error during evidence finding and summarization for task {self.task_id}: {str(e)}"
+            )
+            raise ProcessingException(
+                f"Error during evidence finding and summarization: {str(e)}"
+            ) from e
@@ -0,0 +1,397 @@
+import hashlib
+import json
+import random
+import re
+from dataclasses import dataclass
+from enum import Enum
+from functools import lru_cache
+from typing import Any, List, Optional, Protocol, Sequence, Tuple, Union
+
+from api.core.settings import WatsonSettings
+from api.worker.metrics import record_usage
+from api.worker.model_pool import ModelSpec, model_pool, split_memory_budget
+
+
+class ModelRole(str, Enum):
+    relation_extraction = "relation_extraction"
+    evidence = "evidence"
+    summarization = "summarization"
+    embedding = "embedding"
+
+
+@dataclass(frozen=True)
+class GenerationParams:
+    temperature: float = 0.0
+    max_tokens: int = 128
+    stop: Tuple[str, ...] = ()  # Stop strings, left out of the output
+    json_schema: Optional[str] = None  # Guide the output to match this JSON schema
+    seed: Optional[int] = None  # Makes sampling reproducible
+
+
+# One set of parameters for all prompts, or one per prompt.
+ParamsArg = Union[GenerationParams, Sequence[GenerationParams]]
+
+
+def per_prompt_params(params: ParamsArg, count: int) -> List[GenerationParams]:
+    """Expand the params argument of generate to one entry per prompt."""
+    if isinstance(params, GenerationParams):
+        return [params] * count
+    if len(params) != count:
+        raise ValueError(f"Expected {count} generation params, got {len(params)}")
+    return list(params)
+
+
+@dataclass
+class Completion:
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    finish_reason: Optional[str] = None
+    cached_tokens: int = 0  # Prompt tokens served from the engine's prefix cache
+
+
+class InferenceBackend(Protocol):
+    """Interface of the engines used by the worker stages."""
+
+    model: str
+
+    def render_chat(self, messages: List[dict]) -> str:
+        """Render chat messages into a prompt ending with the generation prompt."""
+        ...
+
+    def prompt_lengths(self, prompts: List[str]) -> List[int]:
+        """Count the tokens of every rendered prompt."""
+        ...
+
+    def generate(self, prompts: List[str], params: ParamsArg) -> List[Completion]:
+        """Generate one completion per prompt, in prompt order."""
+        ...
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed every text, in input order."""
+        ...
+
+
+@lru_cache(maxsize=None)
+def load_tokenizer(model: str, revision: Optional[str] = None):
+    """Load the tokenizer of a model revision, once per process."""
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(model, revision=revision)
+
+
+class VLLMBackend:
+    """In-process vLLM engine shared through the worker's model pool."""
+
+    def __init__(self, spec: ModelSpec):
+        self.model = spec.model
+        self.revision = spec.revision
+        self.llm = model_pool.acquire(spec)
+
+    @property
+    def tokenizer(self):
+        return load_tokenizer(self.model, self.revision)
+
+    def render_chat(self, messages: List[dict]) -> str:
+        return self.tokenizer.apply_chat_template(
+            messages, tokenize=False, add_generation_prompt=True
+        )
+
+    def prompt_lengths(self, prompts: List[str]) -> List[int]:
+        encoded = self.tokenizer(prompts, add_special_tokens=False)["input_ids"]
+        return [len(ids) for ids in encoded]
+
+    @staticmethod
+    def _sampling_params(params: GenerationParams) -> Any:
+        from vllm import SamplingParams
+
+        kwargs = {}
+        if params.json_schema:
+            from vllm.sampling_params import StructuredOutputsParams
+
+            kwargs["structured_outputs"] = StructuredOutputsParams(
+                json=params.json_schema
+            )
+        return SamplingParams(
+            temperature=params.temperature,
+            max_tokens=params.max_tokens,
+            stop=list(params.stop) or None,
+            seed=params.seed,
+            **kwargs,
+        )
+
+    def generate(self, prompts: List[str], params: ParamsArg) -> List[Completion]:
+        sampling_params = {
+            p: self._sampling_params(p)
+            for p in set(per_prompt_params(params, len(prompts)))
+        }
+        if isinstance(params, GenerationParams):
+            vllm_params = sampling_params[params]
+        else:
+            vllm_params = [sampling_params[p] for p in params]
+        outputs = self.llm.generate(prompts, vllm_params)
+        completions = [
+            Completion(
+                text=output.outputs[0].text,
+                prompt_tokens=len(output.prompt_token_ids or []),
+                completion_tokens=len(output.outputs[0].token_ids or []),
+                finish_reason=output.outputs[0].finish_reason,
+                cached_tokens=getattr(output, "num_cached_tokens", None) or 0,
+            )
+            for output in outputs
+        ]
+        record_usage(
+            prompts=len(completions),
+            prompt_tokens=sum(c.prompt_tokens for c in completions),
+            completion_tokens=sum(c.completion_tokens for c in completions),
+            cached_prompt_tokens=sum(c.cached_tokens for c in completions),
+        )
+        return completions
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        outputs = self.llm.embed(texts)
+        record_usage(
+            prompts=len(outputs),
+            prompt_tokens=sum(len(output.prompt_token_ids or []) for output in outputs),
+        )
+        return [output.outputs.embedding for output in outputs]
+
+
+_STUB_RELATIONS = [
+    "Relation: phosphorylation of AKT\nSubstrates: AKT; ATP\nModifiers: PDK1\nProducts: phospho-AKT; ADP",
+    "Relation: cholesterol efflux to HDL\nSubstrates: cholesterol; HDL\nModifiers: ABCA1\nProducts: HDL-cholesterol",
+    "Relation: LDL oxidation\nSubstrates: LDL\nModifiers: reactive oxygen species\nProducts: oxidized LDL",
+    "Relation: macrophage foam cell formation\nSubstrates: macrophage; oxidized LDL\nModifiers: None\nProducts: foam cell",
+]
+
+
+def _stub_relation_json(block: str) -> dict:
+    fields = dict(line.split(": ", 1) for line in block.split("\n"))
+    return {
+        "relation": fields["Relation"],
+        "substrates": fields["Substrates"].split("; "),
+        "modifiers": []
+        if fields["Modifiers"] == "None"
+        else fields["Modifiers"].split("; "),
+        "products": fields["Products"].split("; "),
+    }
+
+
+def _stub_seed(text: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+class StubBackend:
+    """
+    Deterministic CPU backend returning canned outputs.
+
+    Outputs depend only on the role and the prompt, so runs are reproducible
+    and can be used to measure the non-model overhead of the stages. A prompt
+    that already continues a closed reasoning trace gets only the answer.
+    Issued prompts are kept in prompts.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        role: ModelRole,
+        embedding_dim: int = WatsonSettings.embedding_dim,
+    ):
+        self.model = model
+        self.revision = "stub"
+        self.role = role
+        self.embedding_dim = embedding_dim
+        self.prompts: List[str] = []
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        return len(text.split())
+
+    def render_chat(self, messages: List[dict]) -> str:
+        rendered = "".join(
+            f"<|{message['role']}|>\n{message['content']}\n" for message in messages
+        )
+        return f"{rendered}<|assistant|>\n"
+
+    def prompt_lengths(self, prompts: List[str]) -> List[int]:
+        return [self.count_tokens(prompt) for prompt in prompts]
+
+    def _respond(self, prompt: str, params: GenerationParams) -> str:
+        seed = _stub_seed(prompt)
+        if self.role == ModelRole.relation_extraction:
+            count = 1 + seed % len(_STUB_RELATIONS)
+            blocks = [
+                _STUB_RELATIONS[(seed + i) % len(_STUB_RELATIONS)] for i in range(count)
+            ]
+            if params.json_schema:
+                return json.dumps(
+                    {"relations": [_stub_relation_json(block) for block in blocks]}
+                )
+            relations = "\n\n".join(blocks)
+            if "</think>" in prompt.rsplit("<|assistant|>\n", 1)[-1]:
+                return relations
+            return f"<think>\nThe text describes {count} relations.\n</think>\n\n{relations}"
+        if self.role == ModelRole.evidence:
+            question = prompt.rsplit("<|user|>\n", 1)[-1]
+            numbered = len(re.findall(r"^\d+\. ", question, re.MULTILINE))
+            sentences = len(re.findall(r"^\[\d+\] ", prompt, re.MULTILINE))
+            answer = "The relation is supported by the measured effect described in the text."
+            if sentences:
+                # Sentence index answers, varying with the question.
+                answer = str(1 + _stub_seed(question) % sentences)
+            if numbered:
+                return "\n".join(
+                    f"{number}. {answer}" for number in range(1, numbered + 1)
+                )
+            return answer
+        return "The text reports a biomedical finding."
+
+    def generate(self, prompts: List[str], params: ParamsArg) -> List[Completion]:
+        self.prompts.extend(prompts)
+        completions = []
+        for prompt, params in zip(prompts, per_prompt_params(params, len(prompts))):
+            text = self._respond(prompt, params)
+            finish_reason = "stop"
+            for stop in params.stop:
+                if stop in text:
+                    text = text[: text.index(stop)]
+            completion_tokens = self.count_tokens(text)
+            if completion_tokens > params.max_tokens:
+                text = " ".join(text.split(" ")[: params.max_tokens])
+                completion_tokens = params.max_tokens
+                finish_reason = "length"
+            completions.append(
+                Completion(
+                    text=text,
+                    prompt_tokens=self.count_tokens(prompt),
+                    completion_tokens=completion_tokens,
+                    finish_reason=finish_reason,
+                )
+            )
+        record_usage(
+            prompts=len(completions),
+            prompt_tokens=sum(c.prompt_tokens for c in completions),
+            completion_tokens=sum(c.completion_tokens for c in completions),
+        )
+        return completions
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        embeddings = []
+        for text in texts:
+            rng = random.Random(_stub_seed(text))
+            embeddings.append(
+                [rng.uniform(-1.0, 1.0) for _ in range(self.embedding_dim)]
+            )
+        record_usage(
+            prompts=len(texts),
+            prompt_tokens=sum(self.count_tokens(text) for text in texts),
+        )
+        return embeddings
+
+
+def _model_spec(role: ModelRole) -> ModelSpec:
+    if role == ModelRole.relation_extraction:
+        model = WatsonSettings.llm_model
+        return ModelSpec(
+            model=model,
+            gpu_memory_utilization=WatsonSettings.gpu_memory_utilization,
+            max_model_len=WatsonSettings.max_model_len,
+            revision=WatsonSettings.model_revisions.get(model),
+        )
+    if role == ModelRole.evidence:
+        model = WatsonSettings.be_model
+        return ModelSpec(
+            model=model,
+            gpu_memory_utilization=WatsonSettings.be_gpu_memory_utilization,
+            revision=WatsonSettings.model_revisions.get(model),
+            enable_prefix_caching=WatsonSettings.be_enable_prefix_caching,
+        )
+    if role == ModelRole.summarization:
+        model = WatsonSettings.cs_model
+        return ModelSpec(
+            model=model,
+            gpu_memory_utilization=WatsonSettings.cs_gpu_memory_utilization,
+            revision=WatsonSettings.model_revisions.get(model),
+        )
+    model = WatsonSettings.embedding_model
+    return ModelSpec(
+        model=model,
+        gpu_memory_utilization=WatsonSettings.embedding_gpu_memory_utilization,
+        revision=WatsonSettings.model_revisions.get(model),
+    )
+
+
+def remote_endpoints(role: ModelRole) -> List[str]:
+    """Endpoints serving a role, defaulting to the API's vLLM server."""
+    endpoints = WatsonSettings.remote_role_endpoints.get(role.value)
+    if endpoints:
+        return endpoints
+    if WatsonSettings.remote_endpoints:
+        return WatsonSettings.remote_endpoints
+    return [f"http://{WatsonSettings.vllm_container}:{WatsonSettings.vllm_port}/v1"]
+
+
+def get_backend(role: ModelRole, spec: Optional[ModelSpec] = None) -> InferenceBackend:
+    """
+    Build the inference backend configured for a model role.
+
+    Args:
+        role: Role of the model in the pipeline
+        spec: Engine specification, defaults to the configured one of the role
+
+    Returns:
+        Backend selected by WatsonSettings.inference_backend, behind the
+        response cache for generative roles when it is enabled
+    """
+    spec = spec or _model_spec(role)
+    if WatsonSettings.inference_backend == "stub":
+        backend = StubBackend(spec.model, role)
+    elif WatsonSettings.inference_backend == "remote":
+        from api.worker.remote_backend import RemoteBackend
+
+        backend = RemoteBackend(spec.model, remote_endpoints(role), spec.revision)
+    else:
+        backend = VLLMBackend(spec)
+
+    if WatsonSettings.llm_cache_enabled and role != ModelRole.embedding:
+        from api.worker.response_cache import CachedBackend
+
+        return CachedBackend(backend, role.value)
+    return backend
+
+
+def coresident_model_specs(
+    roles: List[ModelRole], budget: float
+) -> dict[ModelRole, ModelSpec]:
+    """Engine specifications of roles sharing a memory budget, see split_memory_budget."""
+    specs = split_memory_budget([_model_spec(role) for role in roles], budget)
+    return dict(zip(roles, specs))
+
+
+def get_coresident_backends(
+    roles: List[ModelRole],
+    budget: float = WatsonSettings.fused_gpu_memory_utilization,
+    sharing: Optional[List[ModelRole]] = None,
+) -> dict[ModelRole, InferenceBackend]:
+    """
+    Build backends for roles whose engines are resident at the same time.
+
+    The memory budget is split between the engines, which are loaded
+    together into the model pool so that neither evicts the other.
+
+    Args:
+        roles: Roles of the models in the pipeline
+        budget: Fraction of GPU memory shared by their engines
+        sharing: Roles the budget is split between, defaults to roles. Roles
+            not in roles keep their share but are not loaded.
+
+    Returns:
+        Backend of every role in roles
+    """
+    shares = coresident_model_specs(sharing or roles, budget)
+    specs = {role: shares[role] for role in roles}
+    if WatsonSettings.inference_backend == "vllm":
+        model_pool.acquire_all(list(specs.values()))
+    return {role: get_backend(role, spec) for role, spec in specs.items()}
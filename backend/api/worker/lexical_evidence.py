@@ -0,0 +1,158 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+from api.core.settings import WatsonSettings
+from api.models.internal import PNGenerationResult, PNRelation
+from api.worker.chunker import split_sentences
+
+_TOKEN_REGEX = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in into is it its of on or that "
+    "the their this to was were which with relation none".split()
+)
+
+
+def _tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_REGEX.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def _query_text(relation: PNRelation) -> str:
+    entities = [
+        *(relation.substrates or []),
+        *(relation.modifiers or []),
+        *(relation.products or []),
+    ]
+    return " ".join([relation.relation, *entities])
+
+
+class LexicalEvidenceMatcher:
+    """
+    Pick evidence sentences for relations by BM25 without a model.
+
+    Every sentence of a task's chunks is a BM25 document over the task
+    vocabulary. A relation, queried with its text and entities, is resolved
+    to the best sentence of its chunk when that sentence covers enough of the
+    query and beats the runner-up by a clear margin; other relations are left
+    to the model.
+    """
+
+    def __init__(
+        self,
+        margin: float = WatsonSettings.be_lexical_margin,
+        min_coverage: float = WatsonSettings.be_lexical_min_coverage,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.margin = margin
+        self.min_coverage = min_coverage
+        self.k1 = k1
+        self.b = b
+
+    def resolve(self, nodes: List[PNGenerationResult]) -> List[Optional[str]]:
+        """
+        Find unambiguous evidence sentences for the relations of a task.
+
+        Args:
+            nodes: Relation extraction results of the task
+
+        Returns:
+            Evidence sentence or None for every relation, in chunk and relation order
+        """
+        chunks = [
+            chunk
+            for node in nodes
+            for chunk in node.annotated_chunks
+            if chunk.relations
+        ]
+        sentences = [split_sentences(chunk.chunk.text) for chunk in chunks]
+        tokens = [
+            [_tokenize(s) for s in chunk_sentences] for chunk_sentences in sentences
+        ]
+
+        document_frequency = Counter(
+            term
+            for chunk_tokens in tokens
+            for sentence in chunk_tokens
+            for term in set(sentence)
+        )
+        documents = sum(len(chunk_tokens) for chunk_tokens in tokens)
+        if documents == 0:
+            return [None] * sum(len(chunk.relations) for chunk in chunks)
+        average_length = (
+            sum(len(sentence) for chunk_tokens in tokens for sentence in chunk_tokens)
+            / documents
+        ) or 1.0
+        idf = {
+            term: math.log(1 + (documents - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+        evidence: List[Optional[str]] = []
+        for chunk, chunk_sentences, chunk_tokens in zip(chunks, sentences, tokens):
+            evidence.extend(
+                self._resolve_chunk(
+                    chunk.relations, chunk_sentences, chunk_tokens, idf, average_length
+                )
+            )
+        return evidence
+
+    def _resolve_chunk(
+        self,
+        relations: List[PNRelation],
+        sentences: List[str],
+        tokens: List[List[str]],
+        idf: Dict[str, float],
+        average_length: float,
+    ) -> List[Optional[str]]:
+        vocabulary = {
+            term: i
+            for i, term in enumerate(dict.fromkeys(t for s in tokens for t in s))
+        }
+        if not vocabulary:
+            return [None] * len(relations)
+
+        # BM25 weight of every chunk term in every sentence.
+        frequencies = np.zeros((len(sentences), len(vocabulary)))
+        for row, sentence in enumerate(tokens):
+            for term, count in Counter(sentence).items():
+                frequencies[row, vocabulary[term]] = count
+        lengths = frequencies.sum(axis=1, keepdims=True)
+        weights = (
+            frequencies
+            * (self.k1 + 1)
+            / (frequencies + self.k1 * (1 - self.b + self.b * lengths / average_length))
+        )
+        weights *= np.array([idf[term] for term in vocabulary])
+
+        # IDF of the query terms found in the chunk, one row per relation.
+        queries = np.zeros((len(relations), len(vocabulary)))
+        query_mass = np.zeros(len(relations))
+        for row, relation in enumerate(relations):
+            for term in set(_tokenize(_query_text(relation))):
+                term_idf = idf.get(term, 0.0)
+                query_mass[row] += term_idf
+                if term in vocabulary:
+                    queries[row, vocabulary[term]] = term_idf
+
+        scores = (queries > 0) @ weights.T
+        coverage = (queries @ (frequencies > 0).T) / np.maximum(query_mass, 1e-9)[
+            :, None
+        ]
+
+        order = np.argsort(-scores, axis=1)
+        best = order[:, 0]
+        rows = np.arange(len(relations))
+        top = scores[rows, best]
+        runner_up = scores[rows, order[:, 1]] if len(sentences) > 1 else 0.0
+        accepted = (
+            (top > 0)
+            & ((top - runner_up) >= self.margin * top)
+            & (coverage[rows, best] >= self.min_coverage)
+        )
+        return [
+            sentences[best[row]].strip() if accepted[row] else None
+            for row in range(len(relations))
+        ]
@@ -0,0 +1,224 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, fields
+from typing import Callable, Iterator, List, Optional, Tuple, TypeVar
+
+from api.core.settings import TaskStage
+from api.worker.model_pool import model_pool
+
+T = TypeVar("T")
+
+# Stage totals that are not engine usage, and are therefore not merged.
+_NOT_USAGE = frozenset(
+    [
+        "stage",
+        "wall_seconds",
+        "model_load_seconds",
+        "pages",
+        "chunks",
+        "relations",
+        "peak_rss_bytes",
+    ]
+)
+
+
+@dataclass
+class StageMetrics:
+    """Timing, item and token accounting of one pipeline stage."""
+
+    stage: str
+    wall_seconds: float = 0.0
+    model_load_seconds: float = 0.0
+    pages: int = 0
+    chunks: int = 0
+    prompts: int = 0
+    relations: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    peak_rss_bytes: int = 0
+    duplicate_chunks: int = 0
+    prompts_saved: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    cached_prompt_tokens: int = 0
+    reasoning_capped: int = 0
+    parse_errors: int = 0
+    wasted_tokens: int = 0
+    retries: int = 0
+    lexical_evidence: int = 0
+    summary_cache_hits: int = 0
+
+    def count_items(self, results: list) -> None:
+        """Count pages, chunks and relations in a stage's per-file output."""
+        self.pages = 0
+        self.chunks = 0
+        self.relations = 0
+        for result in results:
+            self.pages += getattr(result, "pages", None) or 0
+            self.peak_rss_bytes = max(
+                self.peak_rss_bytes, getattr(result, "peak_rss_bytes", None) or 0
+            )
+            if hasattr(result, "chunks"):
+                self.chunks += len(result.chunks)
+            for chunk in getattr(result, "annotated_chunks", None) or []:
+                self.chunks += 1
+                relations = getattr(chunk, "relations", None)
+                if relations is None:
+                    relations = getattr(chunk, "annotated_relations", None)
+                self.relations += len(relations or [])
+
+    def share(self, fraction: float) -> "StageMetrics":
+        """Return a copy with the shared costs scaled to the given fraction."""
+        return StageMetrics(
+            stage=self.stage,
+            wall_seconds=self.wall_seconds * fraction,
+            model_load_seconds=self.model_load_seconds * fraction,
+            prompts=round(self.prompts * fraction),
+            prompt_tokens=round(self.prompt_tokens * fraction),
+            completion_tokens=round(self.completion_tokens * fraction),
+            cache_hits=round(self.cache_hits * fraction),
+            cache_misses=round(self.cache_misses * fraction),
+            cached_prompt_tokens=round(self.cached_prompt_tokens * fraction),
+            reasoning_capped=round(self.reasoning_capped * fraction),
+            parse_errors=round(self.parse_errors * fraction),
+            wasted_tokens=round(self.wasted_tokens * fraction),
+            retries=round(self.retries * fraction),
+            lexical_evidence=round(self.lexical_evidence * fraction),
+            summary_cache_hits=round(self.summary_cache_hits * fraction),
+        )
+
+    def to_dict(self) -> dict:
+        return {field.name: getattr(self, field.name) for field in fields(self)}
+
+
+_current_metrics: ContextVar[Optional[StageMetrics]] = ContextVar(
+    "current_stage_metrics", default=None
+)
+
+
+def record_usage(
+    prompts: int,
+    prompt_tokens: int,
+    completion_tokens: int = 0,
+    cached_prompt_tokens: int = 0,
+) -> None:
+    """Add engine usage to the running stage, if any."""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return
+
+    metrics.prompts += prompts
+    metrics.prompt_tokens += prompt_tokens
+    metrics.completion_tokens += completion_tokens
+    metrics.cached_prompt_tokens += cached_prompt_tokens
+
+
+def record_cache(hits: int, misses: int) -> None:
+    """Add response cache lookups to the running stage, if any."""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return
+
+    metrics.cache_hits += hits
+    metrics.cache_misses += misses
+
+
+def record_reasoning_capped(count: int) -> None:
+    """Add prompts whose reasoning was cut at the budget to the running stage."""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return
+
+    metrics.reasoning_capped += count
+
+
+def record_parse_errors(errors: int, wasted_tokens: int) -> None:
+    """Add discarded model output to the running stage, if any."""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return
+
+    metrics.parse_errors += errors
+    metrics.wasted_tokens += wasted_tokens
+
+
+def record_retries(count: int) -> None:
+    """Add resubmitted prompts to the running stage, if any."""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return
+
+    metrics.retries += count
+
+
+def record_lexical_evidence(count: int) -> None:
+    """Add relations resolved without a model to the running stage, if any."""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return
+
+    metrics.lexical_evidence += count
+
+
+def record_summary_cache(hits: int) -> None:
+    """Add chunk summaries served from the summary cache to the running stage, if any."""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return
+
+    metrics.summary_cache_hits += hits
+
+
+def collect_usage(run: Callable[[], T]) -> Tuple[T, StageMetrics]:
+    """
+    Run a callable with usage counters of its own, e.g. in a worker thread.
+
+    Threads do not share the running stage, and concurrent updates of one
+    StageMetrics could be lost, so their usage is merged with merge_usage
+    once they are done.
+    """
+    metrics = StageMetrics(stage="")
+    token = _current_metrics.set(metrics)
+    try:
+        return run(), metrics
+    finally:
+        _current_metrics.reset(token)
+
+
+def merge_usage(usage: StageMetrics) -> None:
+    """Add usage collected by collect_usage to the running stage, if any."""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return
+
+    for field in fields(usage):
+        if field.name not in _NOT_USAGE:
+            setattr(
+                metrics,
+                field.name,
+                getattr(metrics, field.name) + getattr(usage, field.name),
+            )
+
+
+@contextmanager
+def record_stage(stage: TaskStage) -> Iterator[StageMetrics]:
+    """Measure wall time, model load time and engine usage of the enclosed stage."""
+    metrics = StageMetrics(stage=stage.value)
+    token = _current_metrics.set(metrics)
+    load_seconds = model_pool.load_seconds
+    start = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        metrics.wall_seconds = time.perf_counter() - start
+        metrics.model_load_seconds = model_pool.load_seconds - load_seconds
+        _current_metrics.reset(token)
+
+
+def split_metrics(metrics: StageMetrics, weights: List[int]) -> List[StageMetrics]:
+    """Apportion the shared costs of a batched stage by per-task weights."""
+    total = sum(weights)
+    if total == 0:
+        return [metrics.share(1 / len(weights)) for _ in weights]
+    return [metrics.share(weight / total) for weight in weights]
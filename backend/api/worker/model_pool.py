@@ -0,0 +1,306 @@
+import gc
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Collection, List, Optional
+
+from api.core.logging import logger
+from api.core.settings import WatsonSettings
+from api.exceptions.watson_exceptions import ModelPoolException
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """Everything needed to build an engine."""
+
+    model: str
+    gpu_memory_utilization: float
+    max_model_len: Optional[int] = None
+    revision: Optional[str] = None
+    enable_prefix_caching: bool = False
+
+    @property
+    def key(self) -> tuple:
+        """Pool key; engines loaded with another memory fraction are interchangeable."""
+        return (
+            self.model,
+            self.revision,
+            self.max_model_len,
+            self.enable_prefix_caching,
+        )
+
+
+@dataclass
+class ResidentEngine:
+    engine: Any
+    gpu_memory_utilization: float  # Fraction the engine was loaded with
+    load_seconds: float = 0.0
+
+
+@dataclass
+class PoolEvent:
+    kind: str  # "load", "hit" or "evict"
+    model: str
+    seconds: float = 0.0
+
+
+@dataclass
+class PoolReport:
+    task_id: Optional[str]
+    loads: int = 0
+    hits: int = 0
+    evictions: int = 0
+    load_seconds: float = 0.0
+    load_seconds_saved: float = 0.0
+    events: List[PoolEvent] = field(default_factory=list)
+
+
+def split_memory_budget(specs: List[ModelSpec], budget: float) -> List[ModelSpec]:
+    """
+    Share a memory budget between engines that are loaded together.
+
+    Every engine gets a part of the budget proportional to its own
+    gpu_memory_utilization, rounded down so that the parts never exceed it.
+
+    Args:
+        specs: Model specifications of the engines
+        budget: Fraction of GPU memory available to all of them
+
+    Returns:
+        Specifications with their gpu_memory_utilization scaled to the budget
+    """
+    total = sum(spec.gpu_memory_utilization for spec in specs)
+    if total <= 0:
+        raise ValueError("Cannot split a memory budget between engines without memory")
+    return [
+        replace(
+            spec,
+            gpu_memory_utilization=math.floor(
+                budget * spec.gpu_memory_utilization / total * 1e4
+            )
+            / 1e4,
+        )
+        for spec in specs
+    ]
+
+
+def _vllm_engine_factory(spec: ModelSpec) -> Any:
+    from vllm import LLM
+
+    kwargs = {}
+    if spec.max_model_len is not None:
+        kwargs["max_model_len"] = spec.max_model_len
+    if spec.revision is not None:
+        kwargs["revision"] = spec.revision
+
+    return LLM(
+        model=spec.model,
+        tensor_parallel_size=WatsonSettings.tensor_parallel_size,
+        gpu_memory_utilization=spec.gpu_memory_utilization,
+        enforce_eager=True,
+        enable_prefix_caching=spec.enable_prefix_caching,
+        **kwargs,
+    )
+
+
+def _vllm_engine_shutdown(engine: Any) -> None:
+    import torch
+
+    engine.llm_engine.engine_core.shutdown()
+    del engine
+    gc.collect()
+    torch.cuda.empty_cache()
+    torch.cuda.synchronize()
+
+
+class ModelPool:
+    """
+    Worker-level registry keeping inference engines resident between stages and tasks.
+
+    Engines are keyed by ModelSpec.key and accounted for by the
+    gpu_memory_utilization they were loaded with, so a resident engine is
+    reused whatever fraction it is requested with. Least-recently-used engines
+    are evicted only when loading a new one would exceed the memory budget.
+    An engine that does not fit even after evicting everything else is never
+    loaded over the budget.
+    """
+
+    def __init__(
+        self,
+        memory_budget: float,
+        engine_factory: Callable[[ModelSpec], Any] = _vllm_engine_factory,
+        engine_shutdown: Callable[[Any], None] = _vllm_engine_shutdown,
+    ):
+        self.memory_budget = memory_budget
+        self._engine_factory = engine_factory
+        self._engine_shutdown = engine_shutdown
+        self._engines: OrderedDict[tuple, ResidentEngine] = OrderedDict()
+        self._report = PoolReport(task_id=None)
+
+    @property
+    def resident(self) -> List[tuple]:
+        """Keys of the resident engines, least recently used first."""
+        return list(self._engines.keys())
+
+    @property
+    def load_seconds(self) -> float:
+        """Time spent loading engines for the current task so far."""
+        return self._report.load_seconds
+
+    @property
+    def used_memory(self) -> float:
+        return sum(
+            resident.gpu_memory_utilization for resident in self._engines.values()
+        )
+
+    def memory_of(self, spec: ModelSpec) -> Optional[float]:
+        """Memory fraction of the resident engine of a spec, or None if not resident."""
+        resident = self._engines.get(spec.key)
+        return resident.gpu_memory_utilization if resident is not None else None
+
+    def _record(self, event: PoolEvent) -> None:
+        self._report.events.append(event)
+
+    def _evict(self, key: tuple) -> None:
+        resident = self._engines.pop(key)
+        logger.info(f"Evicting {key[0]} from model pool")
+        self._engine_shutdown(resident.engine)
+        self._report.evictions += 1
+        self._record(PoolEvent(kind="evict", model=key[0]))
+
+    def _make_room(self, specs: List[ModelSpec], keep: Collection[tuple] = ()) -> None:
+        """
+        Evict least recently used engines, except those keyed in keep, until specs fit.
+
+        Raises:
+            ModelPoolException: If specs do not fit next to the kept engines
+        """
+        required = sum(spec.gpu_memory_utilization for spec in specs)
+        kept = sum(
+            resident.gpu_memory_utilization
+            for key, resident in self._engines.items()
+            if key in keep
+        )
+        if kept + required > self.memory_budget:
+            models = [spec.model for spec in specs]
+            raise ModelPoolException(
+                f"{', '.join(models)} require {required} of GPU memory which does not fit in the pool budget of {self.memory_budget}",
+                models=models,
+                required=required,
+                budget=self.memory_budget,
+            )
+        while self.used_memory + required > self.memory_budget:
+            self._evict(next(key for key in self._engines if key not in keep))
+
+    def _load(self, spec: ModelSpec) -> Any:
+        logger.info(f"Loading {spec.model} into model pool")
+        start = time.perf_counter()
+        engine = self._engine_factory(spec)
+        elapsed = time.perf_counter() - start
+
+        self._engines[spec.key] = ResidentEngine(
+            engine=engine,
+            gpu_memory_utilization=spec.gpu_memory_utilization,
+            load_seconds=elapsed,
+        )
+        self._report.loads += 1
+        self._report.load_seconds += elapsed
+        self._record(PoolEvent(kind="load", model=spec.model, seconds=elapsed))
+        return engine
+
+    def _hit(self, spec: ModelSpec) -> Any:
+        self._engines.move_to_end(spec.key)
+        resident = self._engines[spec.key]
+        self._report.hits += 1
+        self._report.load_seconds_saved += resident.load_seconds
+        self._record(
+            PoolEvent(kind="hit", model=spec.model, seconds=resident.load_seconds)
+        )
+        logger.info(
+            f"Reusing resident {spec.model}, saved {resident.load_seconds:.1f}s of loading"
+        )
+        return resident.engine
+
+    def acquire(self, spec: ModelSpec) -> Any:
+        """
+        Return a shared engine for the given spec, loading it if necessary.
+
+        A resident engine of the same model is reused even if it was loaded
+        with another memory fraction, since its memory is already taken.
+
+        Args:
+            spec: Model specification of the requested engine
+
+        Returns:
+            Engine handle shared with every other stage using the same model
+
+        Raises:
+            ModelPoolException: If the engine alone exceeds the memory budget
+        """
+        if spec.key in self._engines:
+            return self._hit(spec)
+
+        self._make_room([spec])
+        return self._load(spec)
+
+    def acquire_all(self, specs: List[ModelSpec]) -> List[Any]:
+        """
+        Return engines for specs that have to be resident at the same time.
+
+        Room for all missing engines is made before loading any of them and
+        only engines outside the group are evicted, so loading one engine of
+        the group never evicts another. Resident engines of the group are
+        reused, unless one loaded with more memory than its spec keeps the
+        group from fitting; that one is loaded again with its spec's fraction.
+
+        Args:
+            specs: Model specifications of the requested engines
+
+        Returns:
+            Engine handles in the order of specs
+
+        Raises:
+            ModelPoolException: If the engines together exceed the memory budget
+        """
+        resident = [self.memory_of(spec) for spec in specs]
+        group_memory = sum(
+            spec.gpu_memory_utilization if memory is None else memory
+            for spec, memory in zip(specs, resident)
+        )
+        requested = sum(spec.gpu_memory_utilization for spec in specs)
+        if group_memory > self.memory_budget and requested <= self.memory_budget:
+            for spec, memory in zip(specs, resident):
+                if memory is not None and memory > spec.gpu_memory_utilization:
+                    self._evict(spec.key)
+
+        self._make_room(
+            [spec for spec in specs if spec.key not in self._engines],
+            keep={spec.key for spec in specs},
+        )
+        return [
+            self._hit(spec) if spec.key in self._engines else self._load(spec)
+            for spec in specs
+        ]
+
+    def release_all(self) -> None:
+        """Shut down every resident engine."""
+        while self._engines:
+            self._evict(next(iter(self._engines)))
+
+    def begin_task(self, task_id: str) -> None:
+        """Start collecting load/evict statistics for a task."""
+        self._report = PoolReport(task_id=task_id)
+
+    def end_task(self) -> PoolReport:
+        """Finish collecting statistics for the current task and return them."""
+        report = self._report
+        logger.info(
+            f"Model pool for task {report.task_id}: {report.loads} loads ({report.load_seconds:.1f}s), "
+            f"{report.hits} hits, {report.evictions} evictions, {report.load_seconds_saved:.1f}s of loading saved"
+        )
+        self._report = PoolReport(task_id=None)
+        return report
+
+
+model_pool = ModelPool(memory_budget=WatsonSettings.model_pool_memory_budget)
@@ -1,8 +1,14 @@
 import gc
-import io
+import multiprocessing
+import resource
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
 
 import torch
 from api.core.logging import logger
+from api.core.settings import WatsonSettings
 from api.exceptions.watson_exceptions import (
     FileNotFoundException,
     ProcessingException,
@@ -11,62 +17,364 @@ from api.exceptions.watson_exceptions import (
 from api.models.internal import PDFConversionResult
 from api.models.responses import UploadedFile
 from api.services.minio_service import minio_service
-from docling.datamodel.base_models import DocumentStream
+from api.worker.conversion_cache import (
+    ConversionCache,
+    conversion_cache_key,
+    file_sha256,
+    get_conversion_cache,
+    pipeline_fingerprint,
+)
 from docling.document_converter import DocumentConverter
 
+CONVERSION_PROFILES = ("full", "no_ocr", "text_layer")
+
+# Converters and cache owned by a pool worker process, created once by _init_pool_worker.
+_pool_converters: Dict[str, DocumentConverter] = {}
+_pool_cache: Optional[ConversionCache] = None
+# Pool shared by every task of this worker so that pool converters stay warm.
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _init_pool_worker() -> None:
+    global _pool_cache
+    _pool_cache = get_conversion_cache()
+
+
+def _build_converter(profile: str) -> DocumentConverter:
+    """
+    Build the docling converter of a conversion profile.
+
+    "full" runs layout, table structure and OCR, "no_ocr" skips OCR and
+    "text_layer" additionally skips table structure and reads text through
+    the lightweight pypdfium2 backend.
+    """
+    if profile == "full":
+        return DocumentConverter()
+
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.pipeline_options import PdfPipelineOptions
+    from docling.document_converter import PdfFormatOption
+
+    pipeline_options = PdfPipelineOptions(do_ocr=False)
+    if profile == "no_ocr":
+        format_option = PdfFormatOption(pipeline_options=pipeline_options)
+    else:
+        from docling.backend.pypdfium2_backend import PyPdfiumDocumentBackend
+
+        pipeline_options.do_table_structure = False
+        format_option = PdfFormatOption(
+            pipeline_options=pipeline_options, backend=PyPdfiumDocumentBackend
+        )
+    return DocumentConverter(format_options={InputFormat.PDF: format_option})
+
+
+def _get_converter(
+    converters: Dict[str, DocumentConverter], profile: str
+) -> DocumentConverter:
+    if profile not in converters:
+        logger.info(f"Loading PDF converter for profile {profile}")
+        converters[profile] = _build_converter(profile)
+    return converters[profile]
+
+
+def _cache_get(
+    cache: Optional[ConversionCache], key: str, file: UploadedFile
+) -> Optional[PDFConversionResult]:
+    if cache is None:
+        return None
+    try:
+        return cache.get(key, file.filename)
+    except Exception as e:
+        logger.warning(f"Conversion cache lookup failed for {file.filename}: {str(e)}")
+        return None
+
+
+def _cache_put(
+    cache: Optional[ConversionCache], key: str, result: PDFConversionResult
+) -> None:
+    if cache is None:
+        return
+    try:
+        cache.put(key, result)
+    except Exception as e:
+        logger.warning(
+            f"Conversion cache store failed for {result.file_name}: {str(e)}"
+        )
+
+
+def _reset_peak_rss() -> None:
+    """Reset the process' peak RSS (VmHWM) so it can be measured per file."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_bytes() -> int:
+    """Peak RSS since the last reset, or since process start where unsupported."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _probe_pdf(path: Path) -> Tuple[Optional[int], float]:
+    """
+    Cheaply inspect a PDF without running any model.
+
+    Returns:
+        Tuple of page count and average number of extractable characters on
+        the first pages, or (None, 0.0) if the PDF cannot be read
+    """
+    try:
+        import pypdfium2
+
+        document = pypdfium2.PdfDocument(path)
+        try:
+            pages = len(document)
+            probed = min(pages, WatsonSettings.text_layer_probe_pages)
+            chars = 0
+            for index in range(probed):
+                text_page = document[index].get_textpage()
+                chars += len("".join(text_page.get_text_range().split()))
+                text_page.close()
+            return pages, chars / max(probed, 1)
+        finally:
+            document.close()
+    except Exception as e:
+        logger.warning(f"Could not probe PDF, converting in one pass: {str(e)}")
+        return None, 0.0
+
+
+def _select_profile(chars_per_page: float) -> str:
+    """Pick the text-layer fast path for born-digital PDFs, else the configured profile."""
+    if (
+        WatsonSettings.text_layer_probe
+        and chars_per_page >= WatsonSettings.text_layer_min_chars_per_page
+    ):
+        return "text_layer"
+    return WatsonSettings.conversion_profile
+
+
+def _convert_pages(
+    converter: DocumentConverter,
+    path: Path,
+    file_name: str,
+    total_pages: Optional[int],
+) -> Tuple[str, int]:
+    """
+    Convert a PDF to markdown, in page-range batches for large documents.
+
+    Returns:
+        Tuple of markdown content and number of pages
+    """
+    batch_size = WatsonSettings.pdf_page_batch_size
+    if not total_pages or batch_size <= 0 or total_pages <= batch_size:
+        document = converter.convert(path).document
+        return document.export_to_markdown(), document.num_pages()
+
+    parts = []
+    for start in range(1, total_pages + 1, batch_size):
+        end = min(start + batch_size - 1, total_pages)
+        logger.info(f"Converting pages {start}-{end} of {total_pages} of {file_name}")
+        document = converter.convert(path, page_range=(start, end)).document
+        parts.append(document.export_to_markdown())
+    return "\n\n".join(parts), total_pages
+
+
+def _convert_file(
+    converters: Dict[str, DocumentConverter],
+    file: UploadedFile,
+    cache: Optional[ConversionCache] = None,
+) -> PDFConversionResult:
+    """
+    Download and convert a single PDF file.
+
+    The PDF is streamed to a temporary file rather than held in memory and
+    probed to pick its conversion profile. Conversions are looked up in the
+    cache by PDF content and pipeline fingerprint first. Failures are reported
+    in the returned result instead of being raised so that one broken file does
+    not abort the conversion of the others.
+    """
+    try:
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file:
+            logger.info(f"Downloading file from MinIO: {file.storage_path}")
+            minio_service.download_file_to_sync(file.storage_path, pdf_file)
+            path = Path(pdf_file.name)
+            total_pages, chars_per_page = _probe_pdf(path)
+            profile = _select_profile(chars_per_page)
+            converter = _get_converter(converters, profile)
+            pdf_hash = file_sha256(pdf_file.name)
+            key = conversion_cache_key(
+                pdf_hash, pipeline_fingerprint(converter, profile)
+            )
+            cached = _cache_get(cache, key, file)
+            if cached is not None:
+                logger.info(f"Using cached conversion for {file.filename}")
+                cached.profile = profile
+                cached.content_hash = pdf_hash
+                return cached
+
+            logger.info(
+                f"Converting file to Markdown with profile {profile}: {file.filename}"
+            )
+            _reset_peak_rss()
+            content, pages = _convert_pages(converter, path, file.filename, total_pages)
+            result = PDFConversionResult(
+                file_name=file.filename,
+                content=content,
+                pages=pages,
+                peak_rss_bytes=_peak_rss_bytes(),
+                profile=profile,
+                content_hash=pdf_hash,
+            )
+            logger.info(
+                f"Converted {file.filename} with profile {profile}: {pages} pages, peak RSS {result.peak_rss_bytes / 1024**2:.0f} MiB"
+            )
+
+        _cache_put(cache, key, result)
+        return result
+    except FileNotFoundException as e:
+        error = f"File not found: {file.storage_path}"
+        logger.error(f"{error}: {str(e)}")
+    except StorageException as e:
+        error = f"Storage error during PDF processing: {str(e)}"
+        logger.error(f"Storage error for {file.storage_path}: {str(e)}")
+    except Exception as e:
+        error = f"Conversion failed: {str(e)}"
+        logger.error(f"Conversion of {file.filename} failed: {str(e)}")
+
+    return PDFConversionResult(file_name=file.filename, content="", error=error)
+
+
+def _convert_in_pool(file: UploadedFile) -> PDFConversionResult:
+    return _convert_file(_pool_converters, file, _pool_cache)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=WatsonSettings.pdf_conversion_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_pool_worker,
+        )
+    return _executor
+
+
+def _reset_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
 
 class PDFConverter:
     def __init__(self, task_id: str):
         self.task_id = task_id
-        self.converter = DocumentConverter()
+        self.parallel = WatsonSettings.pdf_conversion_workers > 1
+        self.converters: Dict[str, DocumentConverter] = {}
+        if WatsonSettings.conversion_profile not in CONVERSION_PROFILES:
+            raise ProcessingException(
+                message=f"Unknown conversion profile: {WatsonSettings.conversion_profile}",
+                task_id=task_id,
+            )
+        if not self.parallel:
+            self.cache = get_conversion_cache()
 
     def __del__(self):
-        if hasattr(self, "converter"):
-            del self.converter
+        if hasattr(self, "converters"):
+            self.converters.clear()
         gc.collect()
         torch.cuda.empty_cache()
         torch.cuda.synchronize()
 
+    def _convert_parallel(
+        self, uploaded_files: list[UploadedFile]
+    ) -> list[PDFConversionResult]:
+        """Fan files out to the worker's process pool, keeping input order."""
+        try:
+            futures = [
+                _get_executor().submit(_convert_in_pool, file)
+                for file in uploaded_files
+            ]
+        except Exception as e:
+            logger.warning(
+                f"Process pool unavailable for task {self.task_id}, converting serially: {str(e)}"
+            )
+            _reset_executor()
+            self.cache = get_conversion_cache()
+            return [
+                _convert_file(self.converters, file, self.cache)
+                for file in uploaded_files
+            ]
+
+        results = []
+        broken = False
+        for file, future in zip(uploaded_files, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # A crashed pool process breaks the whole pool, recreate it next time.
+                broken = True
+                logger.error(f"Conversion of {file.filename} failed: {str(e)}")
+                results.append(
+                    PDFConversionResult(
+                        file_name=file.filename,
+                        content="",
+                        error=f"Conversion failed: {str(e)}",
+                    )
+                )
+        if broken:
+            _reset_executor()
+
+        return results
+
     def convert_pdfs_to_markdown(
         self, uploaded_files: list[UploadedFile]
     ) -> list[PDFConversionResult]:
         """
         Convert a list of PDF files to Markdown format.
 
+        Files that fail to convert are returned with their error set, in input
+        order, and only fail the task when no file could be converted.
+
         Args:
             uploaded_files: List of uploaded PDF files.
         """
-        try:
-            markdown = []
+        if self.parallel:
+            markdown = self._convert_parallel(uploaded_files)
+        else:
+            markdown = [
+                _convert_file(self.converters, file, self.cache)
+                for file in uploaded_files
+            ]
 
-            for file in uploaded_files:
-                bucket_name, object_name = file.storage_path.split("/", 1)
+        profiles = {}
+        for result in markdown:
+            if result.profile:
+                profiles[result.profile] = profiles.get(result.profile, 0) + 1
+        logger.info(f"Conversion profiles for task {self.task_id}: {profiles}")
+        hits = sum(result.cached for result in markdown)
+        logger.info(
+            f"Conversion cache for task {self.task_id}: {hits} hits, {len(markdown) - hits} misses"
+        )
 
-                logger.info(f"Downloading file from MinIO: {bucket_name}/{object_name}")
-                pdf_content = minio_service.download_file_sync(file.storage_path)
-                file_stream = io.BytesIO(pdf_content)
-                logger.info(f"Converting file to Markdown: {file.filename}")
-                markdown.append(
-                    PDFConversionResult(
-                        file_name=file.filename,
-                        content=self.converter.convert(
-                            DocumentStream(name=file.filename, stream=file_stream)
-                        ).document.export_to_markdown(),
-                    )
-                )
-
-            return markdown
-        except StorageException as e:
-            logger.error(f"Storage error for task {self.task_id}: {str(e)}")
-            raise ProcessingException(
-                message=f"Storage error during PDF processing: {str(e)}",
-                original_error=e,
-                task_id=self.task_id,
-            ) from e
-        except FileNotFoundException as e:
-            logger.error(f"File not found for task {self.task_id}: {file.storage_path}")
+        failed = [result for result in markdown if result.error]
+        if failed:
+            logger.warning(
+                f"Failed to convert {len(failed)} of {len(markdown)} files for task {self.task_id}: "
+                f"{[(result.file_name, result.error) for result in failed]}"
+            )
+        if markdown and len(failed) == len(markdown):
             raise ProcessingException(
-                message=f"File not found: {file.storage_path}",
-                original_error=e,
+                message=f"Failed to convert any file: {failed[0].error}",
                 task_id=self.task_id,
-            ) from e
+            )
+
+        return markdown
@@ -1,42 +1,86 @@
-import gc
-import uuid
+import json
+from dataclasses import replace
 from typing import List, Optional
 
-import torch
 from api.core.logging import logger
-from api.core.settings import WatsonSettings
+from api.core.settings import ReasoningMode, WatsonSettings
 from api.exceptions.watson_exceptions import ProcessingException
-from api.models.internal import ChunkingResult, PNChunk, PNGenerationResult, PNRelation
+from api.models.internal import (
+    ChunkingResult,
+    PNChunk,
+    PNGenerationResult,
+    PNRelation,
+    make_relation_id,
+)
+from api.worker.inference import (
+    GenerationParams,
+    InferenceBackend,
+    ModelRole,
+    get_backend,
+)
+from api.worker.metrics import (
+    record_parse_errors,
+    record_reasoning_capped,
+    record_retries,
+)
+
+# Appended to a reasoning trace cut at the budget, before the answer is generated.
+REASONING_END = "\n</think>\n\n"
+
+_ENTITY_FIELDS = ("substrates", "modifiers", "products")
+_ENTITY_LIST = {"type": "array", "items": {"type": "string"}}
+# Answer schema of the "json" output format, mirroring PNRelation without the ID.
+RELATIONS_SCHEMA = json.dumps(
+    {
+        "type": "object",
+        "properties": {
+            "relations": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "relation": {"type": "string", "minLength": 1},
+                        **{field: _ENTITY_LIST for field in _ENTITY_FIELDS},
+                    },
+                    "required": ["relation", *_ENTITY_FIELDS],
+                    "additionalProperties": False,
+                },
+            }
+        },
+        "required": ["relations"],
+        "additionalProperties": False,
+    },
+    sort_keys=True,
+)
 
 
 class PNGenerator:
-    def __init__(self, task_id: str):
-        from transformers import AutoTokenizer
-        from vllm import LLM, SamplingParams
-
+    def __init__(
+        self,
+        task_id: str,
+        backend: Optional[InferenceBackend] = None,
+        reasoning_mode: Optional[str] = None,
+    ):
         self.task_id = task_id
+        self.reasoning_mode = ReasoningMode(
+            reasoning_mode or WatsonSettings.reasoning_mode
+        )
+        self.structured = WatsonSettings.pn_output_format == "json"
         self.llm_model = WatsonSettings.llm_model
-        self.sampling_params = SamplingParams(
+        self.sampling_params = GenerationParams(
             temperature=WatsonSettings.temperature,
             max_tokens=WatsonSettings.max_tokens,
         )
+        # With the json format the reasoning trace is generated freely and
+        # stops at its end, then the answer is generated against the schema.
+        self.answer_params = self.sampling_params
+        if self.structured:
+            self.answer_params = replace(
+                self.sampling_params, json_schema=RELATIONS_SCHEMA
+            )
+            self.sampling_params = replace(self.sampling_params, stop=("</think>",))
         logger.info(f"Initializing {self.llm_model} LLM")
-        self.llm = LLM(
-            model=self.llm_model,
-            tensor_parallel_size=WatsonSettings.tensor_parallel_size,
-            gpu_memory_utilization=WatsonSettings.gpu_memory_utilization,
-            max_model_len=WatsonSettings.max_model_len,
-            enforce_eager=True,
-        )
-        self.tokenizer = AutoTokenizer.from_pretrained(self.llm_model)
-
-    def __del__(self):
-        if hasattr(self, "llm"):
-            self.llm.llm_engine.engine_core.shutdown()
-            del self.llm
-        gc.collect()
-        torch.cuda.empty_cache()
-        torch.cuda.synchronize()
+        self.backend = backend or get_backend(ModelRole.relation_extraction)
 
     def _prepare_prompts(self, nodes: list[ChunkingResult]) -> list[str]:
         """
@@ -44,33 +88,341 @@ class PNGenerator:
 
         Args:
             nodes: List of ChunkingResult objects containing the input text
-            tokenizer: AutoTokenizer instance for text tokenization
 
         Returns:
             List of formatted prompts for the LLM
         """
+        answer_format = (
+            " Answer with a JSON object listing the relations with their substrates, modifiers and products."
+            if self.structured
+            else ""
+        )
         prompts = []
         for node in nodes:
             for chunk in node.chunks:
                 messages = [
                     {
                         "role": "user",
-                        "content": f"Your task is to analyze the provided biomedical/biochemical text and extract all relations relevant for Petri net modeling. Each relation includes a biomedical or biochemical reaction, transformation, or interaction and should be represented by a short phrase that captures the interaction. Do not speculate, extract only those relations that clearly appear in the text.\n{chunk.text}",
+                        "content": f"Your task is to analyze the provided biomedical/biochemical text and extract all relations relevant for Petri net modeling. Each relation includes a biomedical or biochemical reaction, transformation, or interaction and should be represented by a short phrase that captures the interaction. Do not speculate, extract only those relations that clearly appear in the text.{answer_format}\n{chunk.text}",
                     }
                 ]
-                prompt = self.tokenizer.apply_chat_template(
-                    messages, tokenize=False, add_generation_prompt=True
-                )
-                prompts.append(prompt)
+                prompts.append(self.backend.render_chat(messages))
 
         return prompts
 
+    @staticmethod
+    def _max_budget(prompt_tokens: int) -> int:
+        """Largest output budget that fits the prompt into the model context."""
+        return max(
+            1,
+            min(
+                WatsonSettings.max_tokens, WatsonSettings.max_model_len - prompt_tokens
+            ),
+        )
+
+    def _output_budget(self, prompt_tokens: int) -> int:
+        """Output token budget of a prompt, scaled to its length."""
+        budget = max(
+            WatsonSettings.pn_min_max_tokens,
+            round(prompt_tokens * WatsonSettings.pn_max_tokens_per_prompt_token),
+        )
+        return min(budget, self._max_budget(prompt_tokens))
+
+    @staticmethod
+    def _answer_budget(tokens: int) -> int:
+        """Output budget of an answer generated after a prompt and trace of tokens."""
+        return max(
+            1,
+            min(
+                WatsonSettings.reasoning_answer_tokens,
+                WatsonSettings.max_model_len - tokens,
+            ),
+        )
+
+    def _continue_answers(
+        self,
+        prompts: list[str],
+        relations: list[str],
+        continued: list[int],
+        budgets: list[int],
+    ) -> list[bool]:
+        """
+        Generate the answers after the reasoning traces of the continued prompts.
+
+        Traces not closed yet are closed with REASONING_END first. The answers
+        are appended to relations in place.
+
+        Returns:
+            List of whether each continued answer is truncated
+        """
+        for i in continued:
+            if "</think>" not in relations[i]:
+                relations[i] += REASONING_END
+        answers = self.backend.generate(
+            [prompts[i] + relations[i] for i in continued],
+            [replace(self.answer_params, max_tokens=budget) for budget in budgets],
+        )
+        for i, answer in zip(continued, answers):
+            relations[i] += answer.text
+        return [answer.finish_reason == "length" for answer in answers]
+
     def _run_llm(self, prompts) -> list[str]:
-        outputs = self.llm.generate(prompts, self.sampling_params)
-        relations = [output.outputs[0].text for output in outputs]
+        """Generate relations for every prompt, returned in prompt order."""
+        return self._generate(prompts)[0]
+
+    def _generate(self, prompts: list[str]) -> tuple[list[str], list[bool], list[int]]:
+        """
+        Generate relations for every prompt, returned in prompt order.
+
+        With length scheduling, prompts are submitted longest first, each with
+        an output budget scaled to its length. Outputs that exhaust their budget
+        before closing the reasoning trace are resubmitted with twice the
+        budget, up to WatsonSettings.pn_truncation_retries times. With the json
+        output format generation stops at the end of the trace and every
+        answer is then generated against the schema, with up to
+        WatsonSettings.reasoning_answer_tokens tokens.
+
+        Returns:
+            Tuple of (list of responses, list of whether each response is
+            truncated, list of resubmissions of each prompt)
+        """
+        unretried = [0] * len(prompts)
+        if self.reasoning_mode == ReasoningMode.budget:
+            relations, cut = self._run_budgeted(prompts)
+            return relations, cut, unretried
+        if not WatsonSettings.pn_length_scheduling:
+            outputs = self.backend.generate(prompts, self.sampling_params)
+            relations = [output.text for output in outputs]
+            cut = [output.finish_reason == "length" for output in outputs]
+            if self.structured:
+                cut = self._continue_answers(
+                    prompts,
+                    relations,
+                    list(range(len(prompts))),
+                    [
+                        self._answer_budget(length + output.completion_tokens)
+                        for length, output in zip(
+                            self.backend.prompt_lengths(prompts), outputs
+                        )
+                    ],
+                )
+            return relations, cut, unretried
+
+        lengths = self.backend.prompt_lengths(prompts)
+        budgets = [self._output_budget(length) for length in lengths]
+        pending = sorted(range(len(prompts)), key=lambda i: -lengths[i])
+        relations = [""] * len(prompts)
+        cut = [False] * len(prompts)
+        used = [0] * len(prompts)
+        resubmitted = list(unretried)
+        truncated = 0
+        retried = 0
+        for attempt in range(WatsonSettings.pn_truncation_retries + 1):
+            if not pending:
+                break
+            if attempt:
+                retried += len(pending)
+                record_retries(len(pending))
+                logger.info(
+                    f"Resubmitting {len(pending)} prompts truncated while reasoning"
+                )
+            outputs = self.backend.generate(
+                [prompts[i] for i in pending],
+                [replace(self.sampling_params, max_tokens=budgets[i]) for i in pending],
+            )
+            retry = []
+            for i, output in zip(pending, outputs):
+                relations[i] = output.text
+                used[i] = output.completion_tokens
+                cut[i] = output.finish_reason == "length"
+                if not cut[i]:
+                    continue
+                truncated += 1
+                max_budget = self._max_budget(lengths[i])
+                if "</think>" not in output.text and budgets[i] < max_budget:
+                    budgets[i] = min(budgets[i] * 2, max_budget)
+                    resubmitted[i] += 1
+                    retry.append(i)
+            pending = retry
+
+        logger.info(
+            f"Relation extraction for task {self.task_id}: {truncated} outputs hit their token budget, {retried} resubmitted, {len(pending)} still truncated"
+        )
+        if self.structured:
+            order = sorted(range(len(prompts)), key=lambda i: -lengths[i])
+            cut = [False] * len(prompts)
+            answers_cut = self._continue_answers(
+                prompts,
+                relations,
+                order,
+                [self._answer_budget(lengths[i] + used[i]) for i in order],
+            )
+            for i, answer_cut in zip(order, answers_cut):
+                cut[i] = answer_cut
+        return relations, cut, resubmitted
+
+    def _run_budgeted(self, prompts: list[str]) -> tuple[list[str], list[bool]]:
+        """
+        Generate in two phases with the reasoning capped at a token budget.
+
+        Prompts are first generated with WatsonSettings.reasoning_budget_tokens.
+        Outputs cut inside the reasoning trace are closed with REASONING_END,
+        and every cut output is continued with up to
+        WatsonSettings.reasoning_answer_tokens tokens for the answer. With the
+        json output format the first phase stops at the end of the trace and
+        every answer is generated against the schema.
+        """
+        budget = WatsonSettings.reasoning_budget_tokens
+        lengths = self.backend.prompt_lengths(prompts)
+        order = sorted(range(len(prompts)), key=lambda i: -lengths[i])
+        outputs = self.backend.generate(
+            [prompts[i] for i in order],
+            [
+                replace(
+                    self.sampling_params,
+                    max_tokens=min(budget, self._max_budget(lengths[i])),
+                )
+                for i in order
+            ],
+        )
+
+        relations = [""] * len(prompts)
+        cut = [False] * len(prompts)
+        continued = []
+        capped = 0
+        for i, output in zip(order, outputs):
+            relations[i] = output.text
+            truncated = output.finish_reason == "length"
+            if not (truncated or self.structured):
+                continue
+            continued.append(i)
+            if "</think>" not in output.text:
+                capped += truncated
+        record_reasoning_capped(capped)
+
+        if continued:
+            answers_cut = self._continue_answers(
+                prompts,
+                relations,
+                continued,
+                [self._answer_budget(lengths[i] + budget) for i in continued],
+            )
+            for i, answer_cut in zip(continued, answers_cut):
+                cut[i] = answer_cut
+
+        logger.info(
+            f"Relation extraction for task {self.task_id} with a reasoning budget of {budget} tokens: "
+            f"{capped} traces capped, {len(continued) - capped} answers continued"
+        )
+        return relations, cut
+
+    def _retry_request(
+        self, prompt: str, response: str, prompt_tokens: int, seed: int
+    ) -> tuple[str, str, GenerationParams]:
+        """
+        Build the retry of a failed response.
 
+        A closed reasoning trace is kept and only the answer is generated
+        again, with up to WatsonSettings.reasoning_answer_tokens tokens;
+        otherwise the whole response is, with the largest output budget.
+
+        Returns:
+            Tuple of (retry prompt, kept response prefix, generation params)
+        """
+        if "</think>" in response:
+            prefix = response[: response.index("</think>") + len("</think>")] + "\n\n"
+            trace_tokens = self.backend.prompt_lengths([prefix])[0]
+            params = replace(
+                self.answer_params,
+                max_tokens=self._answer_budget(prompt_tokens + trace_tokens),
+            )
+        else:
+            prefix = ""
+            params = replace(
+                self.sampling_params, max_tokens=self._max_budget(prompt_tokens)
+            )
+        params = replace(
+            params, temperature=WatsonSettings.pn_retry_temperature, seed=seed
+        )
+        return prompt + prefix, prefix, params
+
+    def _retry_failed(
+        self,
+        prompts: list[str],
+        relations: list[str],
+        truncated: list[bool],
+        resubmitted: Optional[list[int]] = None,
+    ) -> list[str]:
+        """
+        Regenerate only the responses that failed to parse or were truncated.
+
+        Each round sends all failed prompts in one generate call, sampled at
+        WatsonSettings.pn_retry_temperature (greedy by default) with
+        WatsonSettings.pn_retry_seed plus the round as seed. A retry replaces a
+        response only if it parses better. Runs at most
+        WatsonSettings.pn_retry_rounds rounds. Truncation resubmissions and
+        retries together are capped at WatsonSettings.pn_max_extra_generations
+        per prompt.
+
+        Returns:
+            List of responses in prompt order
+        """
+        relations = list(relations)
+        extra = list(resubmitted or [0] * len(prompts))
+        scores = [
+            self._failure_score(response, cut)
+            for response, cut in zip(relations, truncated)
+        ]
+        lengths = None
+        retried = 0
+        for round_index in range(WatsonSettings.pn_retry_rounds):
+            failed = [
+                i
+                for i, score in enumerate(scores)
+                if score[0] and extra[i] < WatsonSettings.pn_max_extra_generations
+            ]
+            if not failed:
+                break
+            if lengths is None:
+                lengths = self.backend.prompt_lengths(prompts)
+            retried += len(failed)
+            record_retries(len(failed))
+            logger.info(
+                f"Retry round {round_index + 1} for task {self.task_id}: regenerating {len(failed)} responses"
+            )
+            requests = [
+                self._retry_request(
+                    prompts[i],
+                    relations[i],
+                    lengths[i],
+                    WatsonSettings.pn_retry_seed + round_index,
+                )
+                for i in failed
+            ]
+            outputs = self.backend.generate(
+                [prompt for prompt, _, _ in requests],
+                [params for _, _, params in requests],
+            )
+            for i, (_, prefix, _), output in zip(failed, requests, outputs):
+                extra[i] += 1
+                response = prefix + output.text
+                score = self._failure_score(response, output.finish_reason == "length")
+                if score < scores[i]:
+                    relations[i] = response
+                    scores[i] = score
+
+        if retried:
+            logger.info(
+                f"Retries for task {self.task_id}: {retried} responses regenerated, "
+                f"{sum(1 for score in scores if score[0])} still failing"
+            )
         return relations
 
+    def _failure_score(self, response: str, truncated: bool) -> tuple[int, int]:
+        """Discarded blocks plus truncation, then fewer relations, lower is better."""
+        parsed, discarded = self._process_response_data(response)
+        return len(discarded) + truncated, -len(parsed)
+
     @staticmethod
     def _parse_relation_text(relation_text: str) -> Optional[PNRelation]:
         """
@@ -127,8 +479,9 @@ class PNGenerator:
                 if product.strip()
             ]
 
+            # The ID is derived from the chunk in _format_relations.
             return PNRelation(
-                id=str(uuid.uuid4()),
+                id="",
                 relation=relation_name,
                 substrates=substrates,
                 modifiers=modifiers,
@@ -141,9 +494,61 @@ class PNGenerator:
             )
             return None
 
+    @staticmethod
+    def _is_valid_relation(item) -> bool:
+        return (
+            isinstance(item, dict)
+            and isinstance(item.get("relation"), str)
+            and bool(item["relation"].strip())
+            and all(
+                isinstance(item.get(field), list)
+                and all(isinstance(value, str) for value in item[field])
+                for field in _ENTITY_FIELDS
+            )
+        )
+
+    def _validate_relations(self, items: list) -> tuple[List[PNRelation], List[str]]:
+        """
+        Check each decoded relation against the schema and convert the valid ones.
+
+        Args:
+            items: Decoded items of the relations list
+
+        Returns:
+            Tuple of (list of valid relations, list of invalid items as JSON)
+        """
+        valid = [self._is_valid_relation(item) for item in items]
+        relations = [
+            PNRelation(
+                id="",
+                relation=item["relation"].strip(),
+                **{
+                    field: [value.strip() for value in item[field] if value.strip()]
+                    for field in _ENTITY_FIELDS
+                },
+            )
+            for item, ok in zip(items, valid)
+            if ok
+        ]
+        invalid = [json.dumps(item) for item, ok in zip(items, valid) if not ok]
+        return relations, invalid
+
+    def _parse_json_relations(
+        self, response_text: str
+    ) -> tuple[List[PNRelation], List[str]]:
+        """Decode a schema-guided answer; an undecodable answer is discarded whole."""
+        try:
+            items = json.loads(response_text)["relations"]
+            if not isinstance(items, list):
+                raise TypeError("relations is not a list")
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Failed to decode relations with error: {str(e)}")
+            return [], [response_text]
+        return self._validate_relations(items)
+
     def _process_response_data(
         self, response_text: str
-    ) -> tuple[List[PNRelation], int]:
+    ) -> tuple[List[PNRelation], List[str]]:
         """
         Process a response text containing multiple relations.
 
@@ -151,7 +556,7 @@ class PNGenerator:
             response_text: Raw response text containing relation data
 
         Returns:
-            Tuple of (list of parsed relations, number of parsing errors)
+            Tuple of (list of parsed relations, list of discarded relation texts)
         """
         # reasoning model case
         if "\n\n**\nFinal Answer:\n" in response_text:
@@ -163,16 +568,19 @@ class PNGenerator:
                 "</answer>", ""
             )
 
+        if self.structured:
+            return self._parse_json_relations(response_text)
+
         # Skip responses that explicitly state no relations
         if response_text == "There are no relations in this text.":
-            return [], 0
+            return [], []
 
         # Clean the response text and split into individual relation blocks
         cleaned_response = response_text.strip()
         relation_blocks = cleaned_response.split("\n\n")
 
         parsed_relations = []
-        parsing_errors = 0
+        discarded = []
 
         for relation_block in relation_blocks:
             parsed_relation = self._parse_relation_text(relation_block)
@@ -180,9 +588,9 @@ class PNGenerator:
             if parsed_relation is not None:
                 parsed_relations.append(parsed_relation)
             else:
-                parsing_errors += 1
+                discarded.append(relation_block)
 
-        return parsed_relations, parsing_errors
+        return parsed_relations, discarded
 
     def _format_relations(
         self, relations: List[str], nodes: list[ChunkingResult]
@@ -197,17 +605,20 @@ class PNGenerator:
         Returns:
             List of PNGenerationResult objects containing formatted relations
         """
-        total_errors = 0
+        discarded = []
         all_parsed_relations = []
 
         for scope in relations:
-            relations_for_item, errors_for_item = self._process_response_data(scope)
+            relations_for_item, discarded_for_item = self._process_response_data(scope)
 
             all_parsed_relations.append(relations_for_item)
-            total_errors += errors_for_item
+            discarded.extend(discarded_for_item)
 
+        wasted_tokens = sum(self.backend.prompt_lengths(discarded)) if discarded else 0
+        record_parse_errors(len(discarded), wasted_tokens)
         logger.info(
-            f"Generated {sum([len(relations) for relations in all_parsed_relations])} Petri net relations with {total_errors} parsing errors."
+            f"Generated {sum([len(relations) for relations in all_parsed_relations])} Petri net relations with {len(discarded)} parsing errors "
+            f"({wasted_tokens} tokens wasted)."
         )
 
         index = 0
@@ -220,6 +631,10 @@ class PNGenerator:
                     if index < len(all_parsed_relations)
                     else []
                 )
+                for position, relation in enumerate(relations):
+                    relation.id = make_relation_id(
+                        chunk.id, position, relation.relation
+                    )
                 annotated_chunks.append(
                     PNChunk(
                         chunk=chunk,
@@ -252,7 +667,8 @@ class PNGenerator:
             prompts = self._prepare_prompts(nodes)
 
             logger.info("Extracting relations")
-            relations = self._run_llm(prompts)
+            relations, truncated, resubmitted = self._generate(prompts)
+            relations = self._retry_failed(prompts, relations, truncated, resubmitted)
 
             logger.info("Formatting extracted relations")
             png_results = self._format_relations(relations, nodes)
@@ -0,0 +1,195 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, TypeVar
+
+from api.core.logging import logger
+from api.core.settings import WatsonSettings
+from api.worker.inference import (
+    Completion,
+    GenerationParams,
+    ParamsArg,
+    load_tokenizer,
+    per_prompt_params,
+)
+from api.worker.metrics import record_usage
+from openai import AsyncOpenAI
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Replica:
+    url: str
+    client: AsyncOpenAI
+    slots: asyncio.Semaphore
+    outstanding: int = 0
+
+
+class RemoteBackend:
+    """
+    Inference backend sending requests to OpenAI-compatible servers such as vLLM.
+
+    Requests are sent concurrently to the replica with the fewest outstanding
+    requests, at most WatsonSettings.remote_max_concurrency at a time per
+    replica. A failed request is retried on another replica, up to
+    WatsonSettings.remote_max_attempts attempts. Prompts are rendered and
+    counted with the model's tokenizer, like in the in-process backend.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        endpoints: List[str],
+        revision: Optional[str] = None,
+        max_concurrency: int = WatsonSettings.remote_max_concurrency,
+        max_attempts: int = WatsonSettings.remote_max_attempts,
+    ):
+        if not endpoints:
+            raise ValueError(f"No remote endpoints configured for {model}")
+        if max_attempts < 1:
+            raise ValueError(
+                f"max_attempts for {model} must be at least 1, got {max_attempts}"
+            )
+        self.model = model
+        self.revision = revision
+        self.endpoints = endpoints
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+
+    @property
+    def tokenizer(self):
+        return load_tokenizer(self.model, self.revision)
+
+    def render_chat(self, messages: List[dict]) -> str:
+        return self.tokenizer.apply_chat_template(
+            messages, tokenize=False, add_generation_prompt=True
+        )
+
+    def prompt_lengths(self, prompts: List[str]) -> List[int]:
+        encoded = self.tokenizer(prompts, add_special_tokens=False)["input_ids"]
+        return [len(ids) for ids in encoded]
+
+    def _replicas(self) -> List[_Replica]:
+        # Clients are bound to the event loop of one call, so they are per call.
+        return [
+            _Replica(
+                url=url,
+                client=AsyncOpenAI(
+                    base_url=url,
+                    api_key=WatsonSettings.remote_api_key,
+                    timeout=WatsonSettings.remote_timeout_seconds,
+                    max_retries=0,
+                ),
+                slots=asyncio.Semaphore(self.max_concurrency),
+            )
+            for url in self.endpoints
+        ]
+
+    async def _send(
+        self,
+        replicas: List[_Replica],
+        request: Callable[[AsyncOpenAI], Awaitable[T]],
+    ) -> T:
+        """Send a request to the least loaded replica, retrying on other replicas."""
+        failed = set()
+        error: Optional[Exception] = None
+        for _ in range(self.max_attempts):
+            candidates = [r for r in replicas if r.url not in failed] or replicas
+            replica = min(candidates, key=lambda r: r.outstanding)
+            replica.outstanding += 1
+            try:
+                async with replica.slots:
+                    return await request(replica.client)
+            except Exception as e:
+                error = e
+                failed.add(replica.url)
+                logger.warning(
+                    f"Request to {replica.url} for {self.model} failed: {str(e)}"
+                )
+            finally:
+                replica.outstanding -= 1
+        raise error
+
+    async def _gather(self, requests: List[Callable[[AsyncOpenAI], Awaitable[T]]]):
+        replicas = self._replicas()
+        try:
+            return await asyncio.gather(
+                *(self._send(replicas, request) for request in requests)
+            )
+        finally:
+            for replica in replicas:
+                await replica.client.close()
+
+    def _completion_request(self, prompt: str, params: GenerationParams):
+        extra_body = {}
+        if params.json_schema:
+            extra_body["structured_outputs"] = {"json": params.json_schema}
+
+        async def request(client: AsyncOpenAI):
+            return await client.completions.create(
+                model=self.model,
+                prompt=prompt,
+                temperature=params.temperature,
+                max_tokens=params.max_tokens,
+                stop=list(params.stop) or None,
+                seed=params.seed,
+                extra_body=extra_body or None,
+            )
+
+        return request
+
+    def generate(self, prompts: List[str], params: ParamsArg) -> List[Completion]:
+        requests = [
+            self._completion_request(prompt, prompt_params)
+            for prompt, prompt_params in zip(
+                prompts, per_prompt_params(params, len(prompts))
+            )
+        ]
+        responses = asyncio.run(self._gather(requests))
+
+        completions = []
+        for response in responses:
+            usage = response.usage
+            details = getattr(usage, "prompt_tokens_details", None)
+            completions.append(
+                Completion(
+                    text=response.choices[0].text,
+                    prompt_tokens=usage.prompt_tokens if usage else 0,
+                    completion_tokens=usage.completion_tokens if usage else 0,
+                    finish_reason=response.choices[0].finish_reason,
+                    cached_tokens=getattr(details, "cached_tokens", None) or 0,
+                )
+            )
+        record_usage(
+            prompts=len(completions),
+            prompt_tokens=sum(c.prompt_tokens for c in completions),
+            completion_tokens=sum(c.completion_tokens for c in completions),
+            cached_prompt_tokens=sum(c.cached_tokens for c in completions),
+        )
+        return completions
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        size = WatsonSettings.remote_embedding_batch_size
+        batches = [texts[i : i + size] for i in range(0, len(texts), size)]
+
+        def embedding_request(batch: List[str]):
+            async def request(client: AsyncOpenAI):
+                return await client.embeddings.create(model=self.model, input=batch)
+
+            return request
+
+        responses = asyncio.run(
+            self._gather([embedding_request(batch) for batch in batches])
+        )
+        record_usage(
+            prompts=len(texts),
+            prompt_tokens=sum(
+                response.usage.prompt_tokens if response.usage else 0
+                for response in responses
+            ),
+        )
+        return [
+            item.embedding
+            for response in responses
+            for item in sorted(response.data, key=lambda item: item.index)
+        ]
@@ -0,0 +1,140 @@
+import hashlib
+import json
+from dataclasses import asdict
+from typing import List, Optional
+
+from api.core.logging import logger
+from api.core.settings import WatsonSettings
+from api.services.postgres_service import get_cached_responses, save_cached_responses
+from api.worker.inference import (
+    Completion,
+    GenerationParams,
+    InferenceBackend,
+    ParamsArg,
+    per_prompt_params,
+)
+from api.worker.metrics import record_cache
+
+
+def response_cache_key(
+    model: str, revision: Optional[str], prompt: str, params: GenerationParams
+) -> str:
+    """Hash everything that determines a model response."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "revision": revision or "main",
+            "prompt": prompt,
+            "params": asdict(params),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CachedBackend:
+    """
+    Inference backend that serves repeated prompts from the Postgres response cache.
+
+    Only cache misses are sent to the wrapped backend and the responses are
+    merged back in prompt order. Unseeded sampling with a temperature above
+    zero is not cached unless WatsonSettings.llm_cache_stochastic is set, since
+    repeated samples are expected to differ. This includes relation extraction
+    at the default temperature; skipped calls are logged.
+    """
+
+    def __init__(self, backend: InferenceBackend, role: str):
+        self.backend = backend
+        self.model = backend.model
+        self.revision = getattr(backend, "revision", None)
+        self.role = role
+
+    def render_chat(self, messages: List[dict]) -> str:
+        return self.backend.render_chat(messages)
+
+    def prompt_lengths(self, prompts: List[str]) -> List[int]:
+        return self.backend.prompt_lengths(prompts)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.backend.embed(texts)
+
+    def _cacheable(self, params: GenerationParams) -> bool:
+        if self.role in WatsonSettings.llm_cache_bypass:
+            return False
+        if params.temperature == 0 or params.seed is not None:
+            return True
+        return WatsonSettings.llm_cache_stochastic
+
+    def generate(self, prompts: List[str], params: ParamsArg) -> List[Completion]:
+        prompt_params = per_prompt_params(params, len(prompts))
+        uncacheable = [p for p in set(prompt_params) if not self._cacheable(p)]
+        if uncacheable:
+            if self.role not in WatsonSettings.llm_cache_bypass:
+                logger.info(
+                    f"Response cache skipped for {len(prompts)} prompts to {self.model}: "
+                    f"unseeded sampling at temperature {uncacheable[0].temperature} "
+                    "is only cached with llm_cache_stochastic"
+                )
+            return self.backend.generate(prompts, params)
+
+        keys = [
+            response_cache_key(self.model, self.revision, prompt, p)
+            for prompt, p in zip(prompts, prompt_params)
+        ]
+        try:
+            cached = get_cached_responses(list(set(keys)))
+        except Exception as e:
+            logger.warning(f"Response cache lookup failed for {self.model}: {str(e)}")
+            cached = {}
+
+        completions: List[Optional[Completion]] = [
+            Completion(
+                text=cached[key].text,
+                prompt_tokens=cached[key].prompt_tokens,
+                completion_tokens=cached[key].completion_tokens,
+                finish_reason=cached[key].finish_reason,
+            )
+            if key in cached
+            else None
+            for key in keys
+        ]
+        misses = [i for i, completion in enumerate(completions) if completion is None]
+        record_cache(hits=len(prompts) - len(misses), misses=len(misses))
+        logger.info(
+            f"Response cache for {self.model}: {len(prompts) - len(misses)} hits, {len(misses)} misses"
+        )
+        if not misses:
+            return completions
+
+        # Prompts repeated within the call are generated once.
+        first_miss = {}
+        for i in misses:
+            first_miss.setdefault(keys[i], i)
+        generated = dict(
+            zip(
+                first_miss,
+                self.backend.generate(
+                    [prompts[i] for i in first_miss.values()],
+                    [prompt_params[i] for i in first_miss.values()],
+                ),
+            )
+        )
+        for i in misses:
+            completions[i] = generated[keys[i]]
+        rows = [
+            {
+                "key": key,
+                "model": self.model,
+                "text": completion.text,
+                "prompt_tokens": completion.prompt_tokens,
+                "completion_tokens": completion.completion_tokens,
+                "finish_reason": completion.finish_reason,
+            }
+            for key, completion in generated.items()
+        ]
+        try:
+            save_cached_responses(rows, WatsonSettings.llm_cache_max_entries)
+        except Exception as e:
+            logger.warning(f"Response cache store failed for {self.model}: {str(e)}")
+
+        return completions
@@ -1,84 +1,517 @@
+from typing import Callable, List, Optional, Tuple
+
 from api.core.logging import logger
-from api.core.settings import TaskStage, TaskStatus
+from api.core.settings import CelerySettings, TaskStage, TaskStatus, WatsonSettings
 from api.exceptions.watson_exceptions import ProcessingException
 from api.models.responses import UploadedFile
 from api.services.postgres_service import (
+    save_conversion_profiles,
+    save_stage_metrics,
     save_task_results,
     update_task_error,
     update_task_stage,
     update_task_status,
 )
+from api.worker.batching import BatchJob, drain_pending_jobs, plan_batches
 from api.worker.celery_app import celery_app
+from api.worker.checkpoints import CheckpointStore
 from api.worker.chunk_summarizer import ChunkSummarizer
 from api.worker.chunker import Chunker
+from api.worker.deduplication import ChunkClusters, ChunkDeduplicator, fan_out
 from api.worker.embeddings import EmbeddingsWorker
 from api.worker.evidence_finder import EvidenceFinder
+from api.worker.evidence_summary import EvidenceSummaryStage
+from api.worker.metrics import StageMetrics, record_stage, split_metrics
+from api.worker.model_pool import model_pool
 from api.worker.pdf_converter import PDFConverter
 from api.worker.pn_generator import PNGenerator
+from celery import chain
+from celery.exceptions import SoftTimeLimitExceeded
 
 
-@celery_app.task
-def create_pn_from_pdfs_task(task_id: str, uploaded_files: list[dict]):
+def _convert(task_id: str, uploaded_files: List[UploadedFile]) -> list:
+    markdown = PDFConverter(task_id).convert_pdfs_to_markdown(uploaded_files)
+    failed = [result for result in markdown if result.error]
+    if failed:
+        update_task_error(
+            task_id,
+            "; ".join(f"{result.file_name}: {result.error}" for result in failed),
+        )
+    save_conversion_profiles(
+        task_id,
+        {result.file_name: result.profile for result in markdown if result.profile},
+    )
+    return markdown
+
+
+def _chunk(task_id: str, markdown: list) -> list:
+    return Chunker(task_id).chunk_documents(markdown)
+
+
+def _deduplicate(task_id: str, chunking: list) -> Tuple[ChunkClusters, StageMetrics]:
+    update_task_stage(task_id, TaskStage.deduplicating_chunks.value)
+    with record_stage(TaskStage.deduplicating_chunks) as metrics:
+        clusters = ChunkDeduplicator().deduplicate(chunking)
+    logger.info(
+        f"Found {len(clusters.duplicates)} duplicate chunks of {clusters.chunks} for task {task_id} "
+        f"({clusters.exact_duplicates} exact, {clusters.near_duplicates} near)"
+    )
+    return clusters, metrics
+
+
+def _fan_out(
+    task_id: str,
+    chunking: list,
+    results: list,
+    clusters: ChunkClusters,
+    metrics: StageMetrics,
+) -> list:
+    """Copy results to duplicate chunks and save the deduplication metrics."""
+    results, prompts_saved = fan_out(chunking, results, clusters)
+    metrics.chunks = clusters.chunks
+    metrics.duplicate_chunks = len(clusters.duplicates)
+    metrics.prompts_saved = prompts_saved
+    logger.info(
+        f"Deduplication for task {task_id}: {clusters.duplicate_rate:.1%} duplicate chunks, "
+        f"{prompts_saved} prompts saved"
+    )
+    try:
+        save_stage_metrics(task_id, metrics.to_dict())
+    except Exception as e:
+        logger.warning(f"Failed to save stage metrics for task {task_id}: {str(e)}")
+    return results
+
+
+def _generate(task_id: str, nodes: list, reasoning_mode: Optional[str] = None) -> list:
+    return PNGenerator(task_id, reasoning_mode=reasoning_mode).generate_pns(nodes)
+
+
+def _find_evidence(task_id: str, nodes: list) -> list:
+    return EvidenceFinder(task_id).find_evidence(nodes)
+
+
+def _summarize(task_id: str, nodes: list) -> list:
+    return ChunkSummarizer(task_id).summarize_chunks(nodes)
+
+
+def _find_evidence_and_summarize(task_id: str, nodes: list) -> list:
+    return EvidenceSummaryStage(task_id).run(nodes)
+
+
+def _embed(task_id: str, nodes: list) -> list:
+    return EmbeddingsWorker(task_id).generate_embeddings(nodes)
+
+
+def _save_metrics(task_id: str, metrics: StageMetrics, results: list) -> None:
+    metrics.count_items(results)
+    logger.info(f"Stage metrics for task {task_id}: {metrics.to_dict()}")
+    try:
+        save_stage_metrics(task_id, metrics.to_dict())
+    except Exception as e:
+        logger.warning(f"Failed to save stage metrics for task {task_id}: {str(e)}")
+
+
+def _fail_job(job: BatchJob, error: Exception) -> None:
+    logger.error(f"Error in processing for task {job.task_id}: {str(error)}")
+    job.error = error
+    update_task_status(job.task_id, TaskStatus.failed.value)
+    update_task_error(job.task_id, str(error))
+
+
+def _run_job_stage(
+    jobs: List[BatchJob], stage: TaskStage, run: Callable[[BatchJob], list]
+) -> None:
+    """Run a stage separately for every job that has not failed or checkpointed it yet."""
+    for job in jobs:
+        if not job.needs(stage):
+            continue
+        try:
+            update_task_stage(job.task_id, stage.value)
+            with record_stage(stage) as metrics:
+                results = run(job)
+            job.complete_stage(stage, results)
+            _save_metrics(job.task_id, metrics, results)
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception as e:
+            _fail_job(job, e)
+
+
+def _run_batched_stage(
+    jobs: List[BatchJob], stage: TaskStage, run: Callable[[str, list], list]
+) -> None:
+    """
+    Run a stage once over the combined results of every job that still needs it.
+
+    Each stage returns one output per input node in input order, which is used
+    to split the combined output back per task. If the combined call fails, the
+    stage is retried for each job on its own so that one task cannot fail the
+    rest of the batch, unless the task ran out of time. Shared costs of the
+    combined call are apportioned to the tasks by their number of input chunks.
+    """
+    active = [job for job in jobs if job.needs(stage)]
+    if not active:
+        return
+
+    for job in active:
+        update_task_stage(job.task_id, stage.value)
+
+    batch_id = ",".join(job.task_id for job in active)
+    try:
+        with record_stage(stage) as metrics:
+            outputs = run(batch_id, [node for job in active for node in job.results])
+        shares = split_metrics(metrics, [job.prompt_count for job in active])
+        offset = 0
+        for job, job_metrics in zip(active, shares):
+            count = len(job.results)
+            job.complete_stage(stage, outputs[offset : offset + count])
+            _save_metrics(job.task_id, job_metrics, job.results)
+            offset += count
+        return
+    except SoftTimeLimitExceeded:
+        raise
+    except Exception as e:
+        if len(active) == 1:
+            _fail_job(active[0], e)
+            return
+        logger.warning(
+            f"Stage {stage.value} failed for batch {batch_id}, retrying tasks separately: {str(e)}"
+        )
+
+    _run_job_stage(active, stage, lambda job: run(job.task_id, job.results))
+
+
+def _deduplicate_job(job: BatchJob) -> None:
+    """Replace a freshly chunked job's chunks by their cluster representatives."""
+    if job.checkpointed == TaskStage.chunking_documents:
+        job.chunking = job.results
+    else:
+        job.chunking = job.checkpoints.load(TaskStage.chunking_documents)
+    job.clusters, job.dedup_metrics = _deduplicate(job.task_id, job.chunking)
+    if job.checkpointed == TaskStage.chunking_documents:
+        job.results = job.clusters.representatives
+
+
+def _process_jobs(jobs: List[BatchJob]) -> None:
+    for job in jobs:
+        logger.info(f"Starting PDF processing for task {job.task_id}")
+        update_task_status(job.task_id, TaskStatus.in_progress.value)
+        job.resume()
+
+    _run_job_stage(
+        jobs,
+        TaskStage.converting_pdfs,
+        lambda job: _convert(job.task_id, job.uploaded_files),
+    )
+    _run_job_stage(
+        jobs,
+        TaskStage.chunking_documents,
+        lambda job: _chunk(job.task_id, job.results),
+    )
+
+    if WatsonSettings.deduplication_enabled:
+        for job in jobs:
+            if job.error is not None:
+                continue
+            try:
+                _deduplicate_job(job)
+            except SoftTimeLimitExceeded:
+                raise
+            except Exception as e:
+                _fail_job(job, e)
+
+    chunked = [job for job in jobs if job.error is None]
+    # Tasks are only batched with tasks of the same reasoning mode.
+    batches = [
+        batch
+        for mode in dict.fromkeys(job.reasoning_mode for job in chunked)
+        for batch in plan_batches(
+            [job for job in chunked if job.reasoning_mode == mode],
+            WatsonSettings.batch_max_prompts,
+        )
+    ]
+    for batch in batches:
+        logger.info(
+            f"Running LLM stages for {len(batch)} tasks with {sum(job.prompt_count for job in batch)} chunks"
+        )
+        reasoning_mode = batch[0].reasoning_mode
+        _run_batched_stage(
+            batch,
+            TaskStage.pn_generation,
+            lambda task_id, nodes: _generate(task_id, nodes, reasoning_mode),
+        )
+        if WatsonSettings.fused_evidence_summary:
+            # Completes summarization for every task that still needs evidence.
+            _run_batched_stage(
+                [job for job in batch if job.needs(TaskStage.evidence_finding)],
+                TaskStage.summarization,
+                _find_evidence_and_summarize,
+            )
+        _run_batched_stage(batch, TaskStage.evidence_finding, _find_evidence)
+        _run_batched_stage(batch, TaskStage.summarization, _summarize)
+        _run_batched_stage(batch, TaskStage.embedding, _embed)
+
+    for job in jobs:
+        if job.error is not None:
+            continue
+        try:
+            results = job.results
+            if job.clusters is not None:
+                results = _fan_out(
+                    job.task_id, job.chunking, results, job.clusters, job.dedup_metrics
+                )
+            update_task_stage(job.task_id, TaskStage.persisting.value)
+            with record_stage(TaskStage.persisting) as metrics:
+                save_task_results(job.task_id, results)
+            _save_metrics(job.task_id, metrics, results)
+            update_task_status(job.task_id, TaskStatus.completed.value)
+            job.completed = True
+            job.checkpoints.clear()
+            logger.info(f"Processing completed successfully for task {job.task_id}")
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception as e:
+            _fail_job(job, e)
+
+
+# A task processes up to batch_max_tasks tasks, so its time limits scale with them.
+_BATCH_SOFT_TIME_LIMIT = (
+    CelerySettings.task_soft_time_limit * WatsonSettings.batch_max_tasks
+)
+_BATCH_TIME_LIMIT = CelerySettings.task_time_limit * WatsonSettings.batch_max_tasks
+
+
+@celery_app.task(soft_time_limit=_BATCH_SOFT_TIME_LIMIT, time_limit=_BATCH_TIME_LIMIT)
+def create_pn_from_pdfs_task(
+    task_id: str, uploaded_files: list[dict], reasoning_mode: Optional[str] = None
+):
     """
-    Process PDF file and convert to markdown.
+    Process uploaded PDF files into Petri net relations.
+
+    Other pending tasks are drained from the queue and processed together with
+    this one, sharing a single generate call per stage. If the time limit is
+    reached, drained tasks that did not finish are requeued to resume from
+    their checkpoints instead of failing with this one.
 
     Args:
         task_id: Unique task identifier
-        file_path: Path to file in MinIO (bucket/object_name format)
+        uploaded_files: Uploaded files of the task as UploadedFile dictionaries
+        reasoning_mode: ReasoningMode of relation extraction, defaults to
+            WatsonSettings.reasoning_mode
+    """
+    job = BatchJob(
+        task_id=task_id,
+        uploaded_files=[UploadedFile(**file) for file in uploaded_files],
+        reasoning_mode=reasoning_mode,
+    )
+
+    model_pool.begin_task(task_id)
+    try:
+        with drain_pending_jobs(
+            create_pn_from_pdfs_task.name,
+            WatsonSettings.batch_max_tasks - 1,
+            WatsonSettings.batch_wait_seconds,
+        ) as drained:
+            jobs = [job] + drained
+            try:
+                _process_jobs(jobs)
+            except SoftTimeLimitExceeded as e:
+                for pending_job in drained:
+                    if pending_job.error is None and not pending_job.completed:
+                        update_task_status(
+                            pending_job.task_id, TaskStatus.created.value
+                        )
+                        pending_job.requeue()
+                if job.error is None and not job.completed:
+                    _fail_job(job, e)
+            except Exception as e:
+                for pending_job in jobs:
+                    if pending_job.error is None and not pending_job.completed:
+                        _fail_job(pending_job, e)
+    finally:
+        model_pool.end_task()
+        if not WatsonSettings.model_pool_enabled:
+            model_pool.release_all()
+
+    if job.error is not None:
+        raise ProcessingException(
+            message=f"Processing failed: {str(job.error)}",
+            original_error=job.error,
+            task_id=task_id,
+        ) from job.error
+
+
+def _run_stage_task(
+    task_id: str,
+    stage: TaskStage,
+    input_stage: Optional[TaskStage],
+    input_key: Optional[str],
+    run: Callable[[str, list], list],
+) -> str:
     """
+    Run one pipeline stage of the staged pipeline.
+
+    The stage input is read from and its output written to object storage, so
+    only object names travel through the broker.
+
+    Returns:
+        Object name of the stage output
+    """
+    store = CheckpointStore(task_id)
     try:
-        logger.info(f"Starting PDF processing for task {task_id}")
-        update_task_status(task_id, TaskStatus.in_progress.value)
-        update_task_stage(task_id, TaskStage.converting_pdfs.value)
-
-        uploaded_files = [UploadedFile(**file) for file in uploaded_files]
-        pdf_converter = PDFConverter(task_id)
-        markdown = pdf_converter.convert_pdfs_to_markdown(uploaded_files)
-        del pdf_converter
-        logger.info(f"PDF processing completed for task {task_id}")
-
-        logger.info(f"Chunking documents for task {task_id}")
-        update_task_stage(task_id, TaskStage.chunking_documents.value)
-        chunker = Chunker(task_id)
-        nodes = chunker.chunk_documents(markdown)
-        logger.info(f"Chunking completed for task {task_id}")
-
-        logger.info(f"Generating Petri nets for task {task_id}")
+        update_task_stage(task_id, stage.value)
+        results = store.read(input_stage, input_key) if input_stage else None
+        with record_stage(stage) as metrics:
+            results = run(task_id, results)
+        _save_metrics(task_id, metrics, results)
+        return store.write(stage, results)
+    except Exception as e:
+        logger.error(f"Error in {stage.value} stage for task {task_id}: {str(e)}")
+        update_task_status(task_id, TaskStatus.failed.value)
+        update_task_error(task_id, str(e))
+        raise ProcessingException(
+            message=f"Processing failed: {str(e)}",
+            original_error=e,
+            task_id=task_id,
+        ) from e
+
+
+def _run_gpu_stage_task(
+    task_id: str,
+    stage: TaskStage,
+    input_stage: TaskStage,
+    input_key: str,
+    run: Callable[[str, list], list],
+) -> str:
+    model_pool.begin_task(task_id)
+    try:
+        return _run_stage_task(task_id, stage, input_stage, input_key, run)
+    finally:
+        model_pool.end_task()
+        if not WatsonSettings.model_pool_enabled:
+            model_pool.release_all()
+
+
+@celery_app.task
+def convert_stage_task(task_id: str, uploaded_files: list[dict]) -> str:
+    """Convert the task's PDF files to markdown."""
+    update_task_status(task_id, TaskStatus.in_progress.value)
+    files = [UploadedFile(**file) for file in uploaded_files]
+    return _run_stage_task(
+        task_id,
+        TaskStage.converting_pdfs,
+        None,
+        None,
+        lambda task_id, _: _convert(task_id, files),
+    )
+
+
+@celery_app.task
+def chunk_stage_task(input_key: str, task_id: str) -> str:
+    """Chunk the converted markdown documents."""
+    return _run_stage_task(
+        task_id,
+        TaskStage.chunking_documents,
+        TaskStage.converting_pdfs,
+        input_key,
+        _chunk,
+    )
+
+
+def _generate_representatives(
+    task_id: str, nodes: list, reasoning_mode: Optional[str] = None
+) -> list:
+    if WatsonSettings.deduplication_enabled:
+        nodes = _deduplicate(task_id, nodes)[0].representatives
         update_task_stage(task_id, TaskStage.pn_generation.value)
-        pn_generator = PNGenerator(task_id)
-        pn_generation_result = pn_generator.generate_pns(nodes)
-        del pn_generator
-        logger.info(f"Petri net generation completed for task {task_id}")
-
-        logger.info(f"Finding evidence for task {task_id}")
-        update_task_stage(task_id, TaskStage.evidence_finding.value)
-        evidence_finder = EvidenceFinder(task_id)
-        evidence_results = evidence_finder.find_evidence(pn_generation_result)
-        del evidence_finder
-        logger.info(f"Evidence finding completed for task {task_id}")
-
-        logger.info(f"Summarizing chunks for task {task_id}")
-        update_task_stage(task_id, TaskStage.summarization.value)
-        summarizer = ChunkSummarizer(task_id)
-        summarized_results = summarizer.summarize_chunks(evidence_results)
-        del summarizer
-        logger.info(f"Chunk summarization completed for task {task_id}")
-
-        logger.info(f"Generating embeddings for task {task_id}")
-        update_task_stage(task_id, TaskStage.embedding.value)
-        embeddings_worker = EmbeddingsWorker(task_id)
-        embedded_output = embeddings_worker.generate_embeddings(summarized_results)
-        del embeddings_worker
+    return _generate(task_id, nodes, reasoning_mode)
 
-        logger.info(f"Processing completed successfully for task {task_id}")
 
-        save_task_results(task_id, embedded_output)
+@celery_app.task
+def generate_stage_task(
+    input_key: str, task_id: str, reasoning_mode: Optional[str] = None
+) -> str:
+    """Generate Petri net relations for the chunks."""
+    return _run_gpu_stage_task(
+        task_id,
+        TaskStage.pn_generation,
+        TaskStage.chunking_documents,
+        input_key,
+        lambda task_id, nodes: _generate_representatives(
+            task_id, nodes, reasoning_mode
+        ),
+    )
 
-        update_task_status(task_id, TaskStatus.completed.value)
 
+@celery_app.task
+def evidence_stage_task(input_key: str, task_id: str) -> str:
+    """Find evidence for the generated relations."""
+    return _run_gpu_stage_task(
+        task_id,
+        TaskStage.evidence_finding,
+        TaskStage.pn_generation,
+        input_key,
+        _find_evidence,
+    )
+
+
+@celery_app.task
+def summarize_stage_task(input_key: str, task_id: str) -> str:
+    """Summarize the chunks with relations."""
+    return _run_gpu_stage_task(
+        task_id,
+        TaskStage.summarization,
+        TaskStage.evidence_finding,
+        input_key,
+        _summarize,
+    )
+
+
+@celery_app.task
+def evidence_summary_stage_task(input_key: str, task_id: str) -> str:
+    """Find evidence and summarize the chunks with co-resident models."""
+    return _run_gpu_stage_task(
+        task_id,
+        TaskStage.summarization,
+        TaskStage.pn_generation,
+        input_key,
+        _find_evidence_and_summarize,
+    )
+
+
+@celery_app.task
+def embed_stage_task(input_key: str, task_id: str) -> str:
+    """Embed the relations."""
+    return _run_gpu_stage_task(
+        task_id,
+        TaskStage.embedding,
+        TaskStage.summarization,
+        input_key,
+        _embed,
+    )
+
+
+@celery_app.task
+def persist_stage_task(input_key: str, task_id: str) -> None:
+    """Persist the embedded results and mark the task as completed."""
+    store = CheckpointStore(task_id)
+    try:
+        update_task_stage(task_id, TaskStage.persisting.value)
+        results = store.read(TaskStage.embedding, input_key)
+        if WatsonSettings.deduplication_enabled:
+            # Recompute the clusters the generate stage processed from the chunking.
+            chunking = store.load(TaskStage.chunking_documents)
+            clusters, metrics = _deduplicate(task_id, chunking)
+            results = _fan_out(task_id, chunking, results, clusters, metrics)
+            update_task_stage(task_id, TaskStage.persisting.value)
+        with record_stage(TaskStage.persisting) as metrics:
+            save_task_results(task_id, results)
+        _save_metrics(task_id, metrics, results)
+        update_task_status(task_id, TaskStatus.completed.value)
+        store.clear()
         logger.info(f"Processing completed successfully for task {task_id}")
     except Exception as e:
-        logger.error(f"Error in processing for task {task_id}: {str(e)}")
+        logger.error(f"Error persisting results for task {task_id}: {str(e)}")
         update_task_status(task_id, TaskStatus.failed.value)
         update_task_error(task_id, str(e))
         raise ProcessingException(
@@ -86,3 +519,33 @@ def create_pn_from_pdfs_task(task_id: str, uploaded_files: list[dict]):
             original_error=e,
             task_id=task_id,
         ) from e
+
+
+def start_pipeline(
+    task_id: str, uploaded_files: list[dict], reasoning_mode: Optional[str] = None
+) -> None:
+    """
+    Enqueue processing of an uploaded task.
+
+    In the staged pipeline mode every stage is a separate task routed to the CPU
+    or GPU queue, otherwise the whole pipeline runs as one batched task.
+    """
+    if WatsonSettings.pipeline_mode != "staged":
+        create_pn_from_pdfs_task.delay(task_id, uploaded_files, reasoning_mode)
+        return
+
+    if WatsonSettings.fused_evidence_summary:
+        evidence_and_summary = [evidence_summary_stage_task.s(task_id)]
+    else:
+        evidence_and_summary = [
+            evidence_stage_task.s(task_id),
+            summarize_stage_task.s(task_id),
+        ]
+    chain(
+        convert_stage_task.si(task_id, uploaded_files),
+        chunk_stage_task.s(task_id),
+        generate_stage_task.s(task_id, reasoning_mode),
+        *evidence_and_summary,
+        embed_stage_task.s(task_id),
+        persist_stage_task.s(task_id),
+    ).delay()
@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+sys.path.insert(0, str(BACKEND_DIR))
+# Settings read backend/.env relative to the working directory.
+os.chdir(BACKEND_DIR)
@@ -0,0 +1,228 @@
+import pytest
+from api.core.settings import TaskStage, WatsonSettings
+from api.models.internal import (
+    Chunk,
+    ChunkingResult,
+    EvidencePNChunk,
+    EvidencePNGenerationResult,
+    EvidencePNRelation,
+    PDFConversionResult,
+    PNChunk,
+    PNGenerationResult,
+)
+from api.services.minio_service import minio_service
+from api.worker.batching import BatchJob
+from api.worker.checkpoints import (
+    CheckpointStore,
+    deserialize_results,
+    serialize_results,
+)
+
+EVIDENCE_RESULTS = [
+    EvidencePNGenerationResult(
+        "a.pdf",
+        [
+            EvidencePNChunk(
+                Chunk("c0", "Hexokinase phosphorylates glucose.", summary="summary"),
+                [
+                    EvidencePNRelation(
+                        id="r0",
+                        relation="glucose phosphorylation",
+                        evidence="Hexokinase phosphorylates glucose.",
+                        substrates=[("glucose", "CHEBI:17234")],
+                        modifiers=[],
+                        products=None,
+                        embedding=[0.25, 0.5],
+                        evidence_start=0,
+                        evidence_end=34,
+                    )
+                ],
+            )
+        ],
+    )
+]
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    """In-memory object storage in place of MinIO."""
+    objects = {}
+    monkeypatch.setattr(
+        minio_service,
+        "upload_file_sync",
+        lambda name, payload, content_type: objects.__setitem__(name, payload),
+    )
+    monkeypatch.setattr(minio_service, "download_file_sync", lambda name: objects[name])
+    monkeypatch.setattr(minio_service, "file_exists_sync", lambda name: name in objects)
+    monkeypatch.setattr(
+        minio_service,
+        "delete_prefix_sync",
+        lambda prefix: [
+            objects.pop(name) for name in list(objects) if name.startswith(prefix)
+        ],
+    )
+    monkeypatch.setattr(WatsonSettings, "checkpoints_enabled", True)
+    return objects
+
+
+def test_results_round_trip():
+    payload = serialize_results(EVIDENCE_RESULTS)
+
+    assert deserialize_results(TaskStage.embedding, payload) == EVIDENCE_RESULTS
+
+
+def test_latest_returns_the_most_advanced_stage(storage):
+    store = CheckpointStore("task")
+    chunking = [ChunkingResult("a.pdf", [Chunk("c0", "text")])]
+    store.save(TaskStage.chunking_documents, chunking)
+    store.save(TaskStage.evidence_finding, EVIDENCE_RESULTS)
+
+    assert store.latest() == (TaskStage.evidence_finding, EVIDENCE_RESULTS)
+
+
+def test_latest_skips_unreadable_checkpoints(storage):
+    store = CheckpointStore("task")
+    chunking = [ChunkingResult("a.pdf", [Chunk("c0", "text")])]
+    store.save(TaskStage.chunking_documents, chunking)
+    storage[store.write(TaskStage.pn_generation, [])] = b"not gzip"
+
+    assert store.latest() == (TaskStage.chunking_documents, chunking)
+
+
+def test_nothing_is_resumed_without_checkpoints(storage, monkeypatch):
+    store = CheckpointStore("task")
+    assert store.latest() is None
+
+    store.save(TaskStage.chunking_documents, [])
+    monkeypatch.setattr(WatsonSettings, "checkpoints_enabled", False)
+    assert store.latest() is None
+
+
+def test_clear_removes_only_the_task_checkpoints(storage):
+    CheckpointStore("task").save(TaskStage.embedding, EVIDENCE_RESULTS)
+    CheckpointStore("other").save(TaskStage.embedding, EVIDENCE_RESULTS)
+
+    CheckpointStore("task").clear()
+
+    assert list(storage) == ["other/checkpoints/embedding.json.gz"]
+
+
+class Stages:
+    """Stage stubs of the batched pipeline that record their calls."""
+
+    def __init__(self, fail_at=None, error=RuntimeError):
+        self.fail_at = fail_at
+        self.error = error
+        self.calls = []
+        self.saved = None
+
+    def _call(self, stage):
+        self.calls.append(stage)
+        if stage == self.fail_at:
+            raise self.error(f"{stage} failed")
+
+    def convert(self, task_id, uploaded_files):
+        self._call("convert")
+        return [PDFConversionResult("a.pdf", "Hexokinase phosphorylates glucose.")]
+
+    def chunk(self, task_id, conversions):
+        self._call("chunk")
+        return [
+            ChunkingResult(result.file_name, [Chunk("c0", result.content)])
+            for result in conversions
+        ]
+
+    def generate(self, task_id, nodes, reasoning_mode=None):
+        self._call("generate")
+        return [
+            PNGenerationResult(
+                node.file_name, [PNChunk(chunk, []) for chunk in node.chunks]
+            )
+            for node in nodes
+        ]
+
+    def evidence(self, task_id, nodes):
+        self._call("evidence")
+        return [
+            EvidencePNGenerationResult(
+                node.file_name,
+                [EvidencePNChunk(chunk.chunk, []) for chunk in node.annotated_chunks],
+            )
+            for node in nodes
+        ]
+
+    def summarize(self, task_id, nodes):
+        self._call("summarize")
+        return nodes
+
+    def embed(self, task_id, nodes):
+        self._call("embed")
+        return nodes
+
+    def install(self, tasks, monkeypatch):
+        monkeypatch.setattr(tasks, "_convert", self.convert)
+        monkeypatch.setattr(tasks, "_chunk", self.chunk)
+        monkeypatch.setattr(tasks, "_generate", self.generate)
+        monkeypatch.setattr(tasks, "_find_evidence", self.evidence)
+        monkeypatch.setattr(tasks, "_summarize", self.summarize)
+        monkeypatch.setattr(tasks, "_embed", self.embed)
+        monkeypatch.setattr(
+            tasks,
+            "save_task_results",
+            lambda task_id, results: setattr(self, "saved", results),
+        )
+
+
+@pytest.fixture
+def pipeline(storage, monkeypatch):
+    # The worker tasks import the model runtimes.
+    tasks = pytest.importorskip("api.worker.tasks")
+    for name in (
+        "update_task_stage",
+        "update_task_status",
+        "update_task_error",
+        "save_stage_metrics",
+    ):
+        monkeypatch.setattr(tasks, name, lambda *args: None)
+    monkeypatch.setattr(WatsonSettings, "fused_evidence_summary", False)
+
+    def run(stages, jobs=None):
+        stages.install(tasks, monkeypatch)
+        jobs = jobs or [BatchJob(task_id="task", uploaded_files=[])]
+        tasks._process_jobs(jobs)
+        return jobs[0]
+
+    return run
+
+
+def test_failed_task_resumes_after_its_last_checkpoint(pipeline, storage):
+    failed = pipeline(Stages(fail_at="evidence"))
+    assert failed.error is not None
+    assert failed.checkpointed == TaskStage.pn_generation
+
+    stages = Stages()
+    resumed = pipeline(stages)
+
+    assert resumed.error is None
+    assert stages.calls == ["evidence", "summarize", "embed"]
+    assert [
+        [annotated.chunk.id for annotated in result.annotated_chunks]
+        for result in stages.saved
+    ] == [["c0"]]
+    # Checkpoints are removed once the task is persisted.
+    assert storage == {}
+
+
+def test_soft_time_limit_stops_the_batch_without_failing_tasks(pipeline):
+    from celery.exceptions import SoftTimeLimitExceeded
+
+    stages = Stages(fail_at="evidence", error=SoftTimeLimitExceeded)
+    jobs = [BatchJob(task_id=task_id, uploaded_files=[]) for task_id in ("a", "b")]
+
+    with pytest.raises(SoftTimeLimitExceeded):
+        pipeline(stages, jobs)
+
+    # The batch is not retried task by task and stays resumable.
+    assert stages.calls.count("evidence") == 1
+    assert [job.error for job in jobs] == [None, None]
+    assert [job.checkpointed for job in jobs] == [TaskStage.pn_generation] * 2
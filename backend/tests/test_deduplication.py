@@ -0,0 +1,146 @@
+from api.models.internal import (
+    Chunk,
+    ChunkingResult,
+    EvidencePNChunk,
+    EvidencePNGenerationResult,
+    EvidencePNRelation,
+)
+from api.worker.deduplication import ChunkDeduplicator, fan_out
+
+EVIDENCE = "Hexokinase converts glucose to glucose-6-phosphate."
+
+
+def _text(seed: int, words: int = 200) -> str:
+    """Long chunk text whose words depend on the seed."""
+    return " ".join(f"w{(seed * 7919 + i * 104729) % 100003}" for i in range(words))
+
+
+BASE = f"{EVIDENCE} {_text(1)}"
+NEAR = f"{EVIDENCE} {_text(1, words=199)} changed"
+OTHER = f"Lactate accumulated in hypoxic cells. {_text(2)}"
+
+
+def _chunking():
+    return [
+        ChunkingResult("a.pdf", [Chunk("a0", BASE), Chunk("a1", OTHER)]),
+        ChunkingResult(
+            "b.pdf",
+            [
+                Chunk("b0", "  " + BASE.upper().replace(" ", "\n ")),
+                Chunk("b1", NEAR),
+            ],
+        ),
+        ChunkingResult("c.pdf", [Chunk("c0", OTHER)]),
+    ]
+
+
+def _processed(chunk: Chunk) -> EvidencePNChunk:
+    return EvidencePNChunk(
+        chunk=Chunk(chunk.id, chunk.text, summary=f"summary of {chunk.id}"),
+        annotated_relations=[
+            EvidencePNRelation(
+                id=f"{chunk.id}-relation",
+                relation="glucose phosphorylation",
+                evidence=EVIDENCE,
+                evidence_start=0,
+                evidence_end=len(EVIDENCE),
+            )
+        ],
+    )
+
+
+def test_exact_and_near_duplicates_map_to_the_first_chunk():
+    clusters = ChunkDeduplicator().deduplicate(_chunking())
+
+    assert clusters.duplicates == {"b0": "a0", "b1": "a0", "c0": "a1"}
+    assert (clusters.chunks, clusters.exact_duplicates, clusters.near_duplicates) == (
+        5,
+        2,
+        1,
+    )
+    assert clusters.duplicate_rate == 3 / 5
+
+
+def test_files_without_representatives_are_dropped():
+    clusters = ChunkDeduplicator().deduplicate(_chunking())
+
+    assert [
+        (result.file_name, [chunk.id for chunk in result.chunks])
+        for result in clusters.representatives
+    ] == [("a.pdf", ["a0", "a1"])]
+
+
+def test_distinct_chunks_are_kept():
+    chunking = [ChunkingResult("a.pdf", [Chunk(str(i), _text(i)) for i in range(10)])]
+
+    clusters = ChunkDeduplicator().deduplicate(chunking)
+
+    assert clusters.duplicates == {}
+    assert [chunk.id for chunk in clusters.representatives[0].chunks] == [
+        str(i) for i in range(10)
+    ]
+
+
+def test_fan_out_copies_results_to_every_duplicate():
+    chunking = _chunking()
+    clusters = ChunkDeduplicator().deduplicate(chunking)
+    results = [
+        EvidencePNGenerationResult(
+            result.file_name, [_processed(chunk) for chunk in result.chunks]
+        )
+        for result in clusters.representatives
+    ]
+
+    fanned_out, prompts_saved = fan_out(chunking, results, clusters)
+
+    assert [
+        (
+            result.file_name,
+            [annotated.chunk.id for annotated in result.annotated_chunks],
+        )
+        for result in fanned_out
+    ] == [("a.pdf", ["a0", "a1"]), ("b.pdf", ["b0", "b1"]), ("c.pdf", ["c0"])]
+    copies = {
+        annotated.chunk.id: annotated
+        for result in fanned_out
+        for annotated in result.annotated_chunks
+    }
+    for chunk_id in ("b0", "b1", "c0"):
+        copy = copies[chunk_id]
+        source = copies[clusters.duplicates[chunk_id]]
+        assert copy.chunk.summary == source.chunk.summary
+        assert copy.annotated_relations[0].id != source.annotated_relations[0].id
+
+    # Spans are found again in the duplicate's own text.
+    relation = copies["b0"].annotated_relations[0]
+    text = copies["b0"].chunk.text
+    covered = text[relation.evidence_start : relation.evidence_end]
+    assert " ".join(covered.lower().split()) == EVIDENCE.lower()
+    ids = [
+        relation.id
+        for annotated in copies.values()
+        for relation in annotated.annotated_relations
+    ]
+    assert len(ids) == len(set(ids))
+    # Relation extraction, summary, evidence and embedding for each duplicate.
+    assert prompts_saved == 3 * (1 + 1 + 2)
+
+
+def test_fan_out_skips_representatives_without_results():
+    """Chunks without relations are dropped by the evidence stage."""
+    chunking = _chunking()
+    clusters = ChunkDeduplicator().deduplicate(chunking)
+    results = [
+        EvidencePNGenerationResult(
+            "a.pdf", [_processed(clusters.representatives[0].chunks[0])]
+        )
+    ]
+
+    fanned_out, prompts_saved = fan_out(chunking, results, clusters)
+
+    assert [
+        [annotated.chunk.id for annotated in result.annotated_chunks]
+        for result in fanned_out
+    ] == [["a0"], ["b0", "b1"], []]
+    # Only relation extraction is saved for the duplicate of a1.
+    assert prompts_saved == 2 * (1 + 1 + 2) + 1
@@ -0,0 +1,73 @@
+from api.worker.evidence_alignment import align_evidence, sentence_spans
+
+TEXT = (
+    "Glucose uptake was measured in all samples.  Hexokinase converts glucose "
+    "to glucose-6-phosphate in the presence of ATP. The product is then "
+    "isomerized by phosphoglucose isomerase. Lactate accumulated in hypoxic "
+    "cells after 24 hours."
+)
+
+
+def _covered(span):
+    start, end = span
+    return TEXT[start:end]
+
+
+def test_sentence_spans_exclude_surrounding_whitespace():
+    spans = sentence_spans(TEXT)
+
+    assert [_covered(span) for span in spans] == [
+        "Glucose uptake was measured in all samples.",
+        "Hexokinase converts glucose to glucose-6-phosphate in the presence of ATP.",
+        "The product is then isomerized by phosphoglucose isomerase.",
+        "Lactate accumulated in hypoxic cells after 24 hours.",
+    ]
+
+
+def test_exact_evidence_maps_to_its_offsets():
+    evidence = "converts glucose to glucose-6-phosphate"
+
+    assert _covered(align_evidence(TEXT, evidence)) == evidence
+
+
+def test_evidence_ignoring_case_and_whitespace():
+    span = align_evidence(TEXT, "  all SAMPLES.\n\nHexokinase  converts ")
+
+    assert _covered(span) == "all samples.  Hexokinase converts"
+
+
+def test_quoted_evidence_drops_the_quotes():
+    span = align_evidence(TEXT, '"lactate accumulated in hypoxic cells..."')
+
+    assert _covered(span) == "Lactate accumulated in hypoxic cells"
+
+
+def test_paraphrased_evidence_maps_to_the_closest_sentence():
+    span = align_evidence(
+        TEXT, "Hexokinase converted glucose into glucose-6-phosphate with ATP."
+    )
+
+    assert _covered(span) == (
+        "Hexokinase converts glucose to glucose-6-phosphate in the presence of ATP."
+    )
+
+
+def test_paraphrase_spanning_sentences_maps_to_the_run():
+    span = align_evidence(
+        TEXT,
+        "Hexokinase converts glucose to glucose-6-phosphate with ATP, and the "
+        "product is isomerized by phosphoglucose isomerase.",
+    )
+
+    assert _covered(span).startswith("Hexokinase")
+    assert _covered(span).endswith("isomerase.")
+
+
+def test_unrelated_evidence_is_not_aligned():
+    assert align_evidence(TEXT, "Mitochondrial fission requires DRP1.") is None
+    assert align_evidence(TEXT, "The relation is supported by the text.") is None
+
+
+def test_empty_evidence_is_not_aligned():
+    assert align_evidence(TEXT, None) is None
+    assert align_evidence(TEXT, "   ") is None
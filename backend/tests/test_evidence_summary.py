@@ -0,0 +1,142 @@
+import api.worker.chunk_summarizer as chunk_summarizer
+import api.worker.inference as inference
+import pytest
+from api.benchmarks.pipeline import build_corpus
+from api.core.settings import WatsonSettings
+from api.worker.chunk_summarizer import ChunkSummarizer
+from api.worker.evidence_finder import EvidenceFinder
+from api.worker.evidence_summary import EvidenceSummaryStage
+from api.worker.inference import ModelRole, StubBackend, coresident_model_specs
+from api.worker.model_pool import ModelPool
+from api.worker.pn_generator import PNGenerator
+
+
+@pytest.fixture
+def summary_cache(monkeypatch):
+    """In-memory summary cache in place of Postgres."""
+    cache = {}
+    monkeypatch.setattr(
+        chunk_summarizer,
+        "get_cached_summaries",
+        lambda model, version, text_hashes: {
+            text_hash: cache[text_hash]
+            for text_hash in text_hashes
+            if text_hash in cache
+        },
+    )
+    monkeypatch.setattr(
+        chunk_summarizer,
+        "save_cached_summaries",
+        lambda rows, max_entries, max_age_days: cache.update(
+            (row["text_hash"], row["summary"]) for row in rows
+        ),
+    )
+    return cache
+
+
+def _pn_results(size: int = 12):
+    generator = PNGenerator(
+        "test", backend=StubBackend("relation", ModelRole.relation_extraction)
+    )
+    nodes = build_corpus(size)
+    return generator._format_relations(
+        generator._run_llm(generator._prepare_prompts(nodes)), nodes
+    )
+
+
+def _annotations(results):
+    return [
+        (
+            chunk.chunk.id,
+            chunk.chunk.summary,
+            [
+                (
+                    relation.id,
+                    relation.evidence,
+                    relation.evidence_start,
+                    relation.evidence_end,
+                )
+                for relation in chunk.annotated_relations
+            ],
+        )
+        for node in results
+        for chunk in node.annotated_chunks
+    ]
+
+
+def test_fused_stage_matches_separate_stages(summary_cache):
+    evidence_results = EvidenceFinder(
+        "test", backend=StubBackend("evidence", ModelRole.evidence)
+    ).find_evidence(_pn_results())
+    separate = ChunkSummarizer(
+        "test", backend=StubBackend("summary", ModelRole.summarization)
+    ).summarize_chunks(evidence_results)
+    summary_cache.clear()
+
+    fused = EvidenceSummaryStage(
+        "test",
+        evidence_backend=StubBackend("evidence", ModelRole.evidence),
+        summary_backend=StubBackend("summary", ModelRole.summarization),
+    ).run(_pn_results())
+
+    assert _annotations(fused) == _annotations(separate)
+    assert all(summary for _, summary, _ in _annotations(fused))
+
+
+def test_fused_stage_serves_summaries_from_cache(summary_cache):
+    summary_backend = StubBackend("summary", ModelRole.summarization)
+    first = EvidenceSummaryStage(
+        "test",
+        evidence_backend=StubBackend("evidence", ModelRole.evidence),
+        summary_backend=summary_backend,
+    ).run(_pn_results())
+    issued = len(summary_backend.prompts)
+
+    second = EvidenceSummaryStage(
+        "test",
+        evidence_backend=StubBackend("evidence", ModelRole.evidence),
+        summary_backend=summary_backend,
+    ).run(_pn_results())
+
+    assert issued
+    assert len(summary_backend.prompts) == issued
+    assert _annotations(second) == _annotations(first)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Model pool with fake engines behind the vLLM backend."""
+    pool = ModelPool(
+        memory_budget=WatsonSettings.model_pool_memory_budget,
+        engine_factory=lambda spec: object(),
+        engine_shutdown=lambda engine: None,
+    )
+    monkeypatch.setattr(inference, "model_pool", pool)
+    monkeypatch.setattr(WatsonSettings, "inference_backend", "vllm")
+    monkeypatch.setattr(WatsonSettings, "llm_cache_enabled", False)
+    return pool
+
+
+def _shares():
+    return coresident_model_specs(
+        [ModelRole.evidence, ModelRole.summarization],
+        WatsonSettings.fused_gpu_memory_utilization,
+    )
+
+
+def test_all_cached_path_reuses_the_coresident_evidence_engine(pool):
+    evidence, _ = EvidenceSummaryStage("first")._backends(summarize=True)
+    reused, summary = EvidenceSummaryStage("second")._backends(summarize=False)
+
+    assert summary is None
+    assert reused.llm is evidence.llm
+    assert set(pool.resident) == {spec.key for spec in _shares().values()}
+
+
+def test_all_cached_path_loads_evidence_with_its_share(pool):
+    EvidenceSummaryStage("task")._backends(summarize=False)
+
+    share = _shares()[ModelRole.evidence]
+    assert pool.resident == [share.key]
+    assert pool.memory_of(share) == share.gpu_memory_utilization
+    assert share.gpu_memory_utilization < WatsonSettings.fused_gpu_memory_utilization
@@ -0,0 +1,114 @@
+from api.core.settings import WatsonSettings
+from api.models.internal import Chunk, PNChunk, PNGenerationResult, PNRelation
+from api.worker.evidence_finder import EvidenceFinder
+from api.worker.inference import ModelRole, StubBackend
+from api.worker.lexical_evidence import LexicalEvidenceMatcher
+
+TEXT = (
+    "Hexokinase phosphorylates glucose to glucose-6-phosphate using ATP. "
+    "Lactate dehydrogenase reduces pyruvate to lactate in hypoxic muscle. "
+    "Samples were stored at minus eighty degrees before analysis."
+)
+AMBIGUOUS = (
+    "Insulin stimulates glucose uptake in adipocytes. "
+    "Insulin stimulates glucose uptake in myocytes."
+)
+
+
+def _relation(relation, substrates=(), modifiers=(), products=()):
+    return PNRelation(
+        id=relation,
+        relation=relation,
+        substrates=list(substrates),
+        modifiers=list(modifiers),
+        products=list(products),
+    )
+
+
+def _nodes():
+    return [
+        PNGenerationResult(
+            "a.pdf",
+            [
+                PNChunk(
+                    Chunk("a0", TEXT),
+                    [
+                        _relation(
+                            "glucose phosphorylation",
+                            ["glucose", "ATP"],
+                            ["hexokinase"],
+                            ["glucose-6-phosphate"],
+                        ),
+                        _relation(
+                            "pyruvate reduction",
+                            ["pyruvate"],
+                            ["lactate dehydrogenase"],
+                            ["lactate"],
+                        ),
+                        _relation("apoptosis", ["caspase-3"], [], ["cleaved PARP"]),
+                    ],
+                ),
+                PNChunk(Chunk("a1", "A chunk without relations."), []),
+            ],
+        ),
+        PNGenerationResult(
+            "b.pdf",
+            [
+                PNChunk(
+                    Chunk("b0", AMBIGUOUS),
+                    [_relation("glucose uptake", ["glucose"], ["insulin"])],
+                )
+            ],
+        ),
+    ]
+
+
+def test_clear_cut_relations_take_their_sentence():
+    evidence = LexicalEvidenceMatcher().resolve(_nodes())
+
+    assert evidence[:2] == [
+        "Hexokinase phosphorylates glucose to glucose-6-phosphate using ATP.",
+        "Lactate dehydrogenase reduces pyruvate to lactate in hypoxic muscle.",
+    ]
+
+
+def test_relations_not_covered_by_any_sentence_are_left_to_the_model():
+    assert LexicalEvidenceMatcher().resolve(_nodes())[2] is None
+
+
+def test_ambiguous_relations_are_left_to_the_model():
+    evidence = LexicalEvidenceMatcher().resolve(_nodes())
+
+    assert len(evidence) == 4
+    assert evidence[3] is None
+
+
+def test_chunks_without_sentences_resolve_nothing():
+    nodes = [
+        PNGenerationResult(
+            "a.pdf", [PNChunk(Chunk("a0", ""), [_relation("glucose uptake")])]
+        )
+    ]
+
+    assert LexicalEvidenceMatcher().resolve(nodes) == [None]
+
+
+def test_evidence_finder_sends_only_unresolved_relations_to_the_model(monkeypatch):
+    monkeypatch.setattr(WatsonSettings, "be_lexical_enabled", True)
+    backend = StubBackend("evidence", ModelRole.evidence)
+
+    results = EvidenceFinder("test", backend=backend, mode="single").find_evidence(
+        _nodes()
+    )
+
+    relations = [
+        relation
+        for node in results
+        for chunk in node.annotated_chunks
+        for relation in chunk.annotated_relations
+    ]
+    assert len(backend.prompts) == 2
+    assert relations[0].evidence == (
+        "Hexokinase phosphorylates glucose to glucose-6-phosphate using ATP."
+    )
+    assert (relations[0].evidence_start, relations[0].evidence_end) == (0, 67)
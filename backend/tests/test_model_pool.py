@@ -0,0 +1,161 @@
+import pytest
+from api.exceptions.watson_exceptions import ModelPoolException
+from api.worker.model_pool import ModelPool, ModelSpec
+
+
+class FakeEngines:
+    """Engine factory and shutdown hooks that record what the pool does."""
+
+    def __init__(self):
+        self.loaded = []
+        self.shut_down = []
+
+    def factory(self, spec: ModelSpec) -> dict:
+        self.loaded.append(spec.model)
+        return {"model": spec.model}
+
+    def shutdown(self, engine: dict) -> None:
+        self.shut_down.append(engine["model"])
+
+
+@pytest.fixture
+def engines():
+    return FakeEngines()
+
+
+@pytest.fixture
+def pool(engines):
+    return ModelPool(
+        memory_budget=0.85,
+        engine_factory=engines.factory,
+        engine_shutdown=engines.shutdown,
+    )
+
+
+RELATION = ModelSpec("relation", 0.5)
+EVIDENCE = ModelSpec("evidence", 0.08)
+SUMMARY = ModelSpec("summary", 0.18)
+LARGE = ModelSpec("large", 0.4)
+
+
+def test_acquire_reuses_resident_engine(pool, engines):
+    pool.begin_task("a")
+    first = pool.acquire(RELATION)
+    second = pool.acquire(RELATION)
+    report = pool.end_task()
+
+    assert first is second
+    assert engines.loaded == ["relation"]
+    assert (report.loads, report.hits, report.evictions) == (1, 1, 0)
+
+
+def test_acquire_keeps_engines_across_tasks(pool, engines):
+    pool.begin_task("a")
+    pool.acquire(RELATION)
+    pool.acquire(EVIDENCE)
+    pool.end_task()
+
+    pool.begin_task("b")
+    pool.acquire(RELATION)
+    pool.acquire(EVIDENCE)
+    report = pool.end_task()
+
+    assert engines.loaded == ["relation", "evidence"]
+    assert (report.loads, report.hits) == (0, 2)
+
+
+def test_acquire_evicts_least_recently_used(pool, engines):
+    first, second, third = (ModelSpec(name, 0.3) for name in ("a", "b", "c"))
+    pool.acquire(first)
+    pool.acquire(second)
+    pool.acquire(first)
+    pool.acquire(third)
+
+    assert engines.shut_down == ["b"]
+    assert pool.resident == [first.key, third.key]
+    assert pool.used_memory <= pool.memory_budget
+
+
+def test_acquire_reloads_evicted_engine(pool, engines):
+    pool.acquire(RELATION)
+    pool.acquire(LARGE)
+    pool.acquire(RELATION)
+
+    assert engines.loaded == ["relation", "large", "relation"]
+    assert engines.shut_down == ["relation", "large"]
+
+
+def test_acquire_rejects_engine_larger_than_budget(pool, engines):
+    pool.acquire(EVIDENCE)
+
+    with pytest.raises(ModelPoolException):
+        pool.acquire(ModelSpec("huge", 0.9))
+
+    assert engines.loaded == ["evidence"]
+    assert pool.resident == [EVIDENCE.key]
+
+
+def test_acquire_all_keeps_group_resident(pool, engines):
+    pool.acquire(EVIDENCE)
+    pool.acquire(RELATION)
+    engines_ = pool.acquire_all([EVIDENCE, SUMMARY, LARGE])
+
+    assert [engine["model"] for engine in engines_] == [
+        "evidence",
+        "summary",
+        "large",
+    ]
+    assert engines.shut_down == ["relation"]
+    assert set(pool.resident) == {EVIDENCE.key, SUMMARY.key, LARGE.key}
+
+
+def test_acquire_all_rejects_group_larger_than_budget(pool, engines):
+    with pytest.raises(ModelPoolException):
+        pool.acquire_all([RELATION, LARGE])
+
+    assert engines.loaded == []
+
+
+def test_acquire_reuses_engine_loaded_with_another_fraction(pool, engines):
+    first = pool.acquire(EVIDENCE)
+    second = pool.acquire(ModelSpec("evidence", 0.26))
+
+    assert first is second
+    assert engines.loaded == ["evidence"]
+    assert pool.memory_of(ModelSpec("evidence", 0.26)) == 0.08
+
+
+def test_acquire_all_reuses_engines_of_a_split_budget(pool, engines):
+    pool.acquire(RELATION)
+    pool.acquire(EVIDENCE)
+    pool.acquire_all([ModelSpec("evidence", 0.0799), ModelSpec("summary", 0.1801)])
+
+    assert engines.loaded == ["relation", "evidence", "summary"]
+    assert engines.shut_down == []
+
+
+def test_acquire_all_reloads_oversized_engine_that_keeps_group_from_fitting(
+    pool, engines
+):
+    pool.acquire(ModelSpec("evidence", 0.5))
+    pool.acquire_all([EVIDENCE, ModelSpec("summary", 0.5)])
+
+    assert engines.loaded == ["evidence", "evidence", "summary"]
+    assert engines.shut_down == ["evidence"]
+    assert pool.memory_of(EVIDENCE) == 0.08
+
+
+def test_engines_differing_beyond_memory_are_separate(pool, engines):
+    pool.acquire(EVIDENCE)
+    pool.acquire(ModelSpec("evidence", 0.08, enable_prefix_caching=True))
+
+    assert engines.loaded == ["evidence", "evidence"]
+
+
+def test_release_all_shuts_down_every_engine(pool, engines):
+    pool.acquire(RELATION)
+    pool.acquire(EVIDENCE)
+    pool.release_all()
+
+    assert engines.shut_down == ["relation", "evidence"]
+    assert pool.resident == []
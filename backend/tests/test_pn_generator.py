@@ -0,0 +1,51 @@
+import pytest
+from api.core.settings import WatsonSettings
+from api.worker.inference import ModelRole, StubBackend, per_prompt_params
+from api.worker.pn_generator import REASONING_END, PNGenerator
+
+
+class RecordingBackend(StubBackend):
+    """Stub backend that also keeps the generation params of every prompt."""
+
+    def __init__(self):
+        super().__init__("relation", ModelRole.relation_extraction)
+        self.params = []
+
+    def generate(self, prompts, params):
+        self.params.extend(per_prompt_params(params, len(prompts)))
+        return super().generate(prompts, params)
+
+
+@pytest.fixture
+def budgeted(monkeypatch):
+    monkeypatch.setattr(WatsonSettings, "pn_output_format", "text")
+    monkeypatch.setattr(WatsonSettings, "pn_retry_rounds", 0)
+    monkeypatch.setattr(WatsonSettings, "reasoning_answer_tokens", 64)
+
+    def run(budget_tokens):
+        monkeypatch.setattr(WatsonSettings, "reasoning_budget_tokens", budget_tokens)
+        backend = RecordingBackend()
+        generator = PNGenerator("test", backend=backend, reasoning_mode="budget")
+        prompt = backend.render_chat(
+            [{"role": "user", "content": "Hexokinase phosphorylates glucose."}]
+        )
+        return backend, prompt, generator._run_llm([prompt])[0]
+
+    return run
+
+
+def test_capped_trace_is_continued_with_the_answer_budget(budgeted):
+    backend, prompt, relations = budgeted(3)
+
+    trace = "<think>\nThe text describes"
+    assert backend.prompts == [prompt, prompt + trace + REASONING_END]
+    assert [params.max_tokens for params in backend.params] == [3, 64]
+    assert relations.startswith(trace + REASONING_END)
+    assert len(relations) > len(trace + REASONING_END)
+
+
+def test_trace_closed_within_budget_is_not_continued(budgeted):
+    backend, prompt, relations = budgeted(256)
+
+    assert backend.prompts == [prompt]
+    assert "</think>" in relations
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+from api.worker.remote_backend import RemoteBackend, _Replica
+
+
+def _replicas(*urls):
+    # The replica url stands in for its client.
+    return [_Replica(url=url, client=url, slots=asyncio.Semaphore(1)) for url in urls]
+
+
+def _request(calls, failing=()):
+    async def request(client):
+        calls.append(client)
+        if client in failing:
+            raise ConnectionError(f"{client} is down")
+        return client
+
+    return request
+
+
+def test_failed_request_is_retried_on_another_replica():
+    backend = RemoteBackend("model", ["a", "b"], max_attempts=2)
+    calls = []
+
+    result = asyncio.run(backend._send(_replicas("a", "b"), _request(calls, {"a"})))
+
+    assert result == "b"
+    assert calls == ["a", "b"]
+
+
+def test_request_goes_to_the_least_outstanding_replica():
+    backend = RemoteBackend("model", ["a", "b", "c"])
+    replicas = _replicas("a", "b", "c")
+    replicas[0].outstanding = 2
+    replicas[1].outstanding = 1
+    replicas[2].outstanding = 3
+    calls = []
+
+    assert asyncio.run(backend._send(replicas, _request(calls))) == "b"
+    assert [replica.outstanding for replica in replicas] == [2, 1, 3]
+
+
+def test_last_error_is_raised_when_every_attempt_fails():
+    backend = RemoteBackend("model", ["a", "b"], max_attempts=3)
+    calls = []
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(backend._send(_replicas("a", "b"), _request(calls, {"a", "b"})))
+    assert calls == ["a", "b", "a"]
+
+
+def test_at_least_one_attempt_is_required():
+    with pytest.raises(ValueError):
+        RemoteBackend("model", ["a"], max_attempts=0)
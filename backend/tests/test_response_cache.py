@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import api.worker.response_cache as response_cache
+import pytest
+from api.worker.inference import GenerationParams, ModelRole, StubBackend
+from api.worker.response_cache import CachedBackend, response_cache_key
+
+PARAMS = GenerationParams(temperature=0, max_tokens=64)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """In-memory response cache in place of Postgres."""
+    rows = {}
+    monkeypatch.setattr(
+        response_cache,
+        "get_cached_responses",
+        lambda keys: {key: rows[key] for key in keys if key in rows},
+    )
+    monkeypatch.setattr(
+        response_cache,
+        "save_cached_responses",
+        lambda new_rows, max_entries: rows.update(
+            (row["key"], SimpleNamespace(**row)) for row in new_rows
+        ),
+    )
+    return rows
+
+
+def test_cache_key_is_deterministic():
+    assert response_cache_key("m", "r", "prompt", PARAMS) == response_cache_key(
+        "m", "r", "prompt", GenerationParams(temperature=0, max_tokens=64)
+    )
+
+
+@pytest.mark.parametrize(
+    "other",
+    [
+        ("other", "r", "prompt", PARAMS),
+        ("m", "other", "prompt", PARAMS),
+        ("m", "r", "other", PARAMS),
+        ("m", "r", "prompt", GenerationParams(temperature=0, max_tokens=65)),
+        ("m", "r", "prompt", GenerationParams(temperature=0, max_tokens=64, seed=1)),
+    ],
+)
+def test_cache_key_covers_model_revision_prompt_and_params(other):
+    assert response_cache_key("m", "r", "prompt", PARAMS) != response_cache_key(*other)
+
+
+def test_missing_revision_is_main():
+    assert response_cache_key("m", None, "prompt", PARAMS) == response_cache_key(
+        "m", "main", "prompt", PARAMS
+    )
+
+
+def test_only_misses_reach_the_backend(store):
+    stub = StubBackend("summary", ModelRole.summarization)
+    backend = CachedBackend(stub, ModelRole.summarization)
+
+    first = backend.generate(["a", "b", "a"], PARAMS)
+    second = backend.generate(["b", "c"], PARAMS)
+
+    assert stub.prompts == ["a", "b", "c"]
+    assert len(store) == 3
+    assert [completion.text for completion in first] == [
+        completion.text for completion in stub.generate(["a", "b", "a"], PARAMS)
+    ]
+    assert second[0].text == first[1].text
+
+
+def test_unseeded_sampling_skips_the_cache(store):
+    stub = StubBackend("summary", ModelRole.summarization)
+    backend = CachedBackend(stub, ModelRole.summarization)
+    params = GenerationParams(temperature=0.6, max_tokens=64)
+
+    backend.generate(["a"], params)
+    backend.generate(["a"], params)
+
+    assert stub.prompts == ["a", "a"]
+    assert store == {}
+
+
+def test_seeded_sampling_is_cached(store):
+    stub = StubBackend("summary", ModelRole.summarization)
+    backend = CachedBackend(stub, ModelRole.summarization)
+    params = GenerationParams(temperature=0.6, max_tokens=64, seed=0)
+
+    backend.generate(["a"], params)
+    backend.generate(["a"], params)
+
+    assert stub.prompts == ["a"]